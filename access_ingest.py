@@ -0,0 +1,455 @@
+"""
+Event-driven access capture for the metadata store.
+
+Without this service, accesses reach the DB only when `analyzer.py` re-reads
+access_log.csv. The service lets the engine's promotion rules (7-day window
+counts and last access time) react within seconds. It accepts access records
+from any mix of:
+
+- a Unix datagram socket (`--socket`). Each datagram holds one or more
+  newline-separated records, `<file_id>` or `<file_id>\\t<timestamp>`.
+  `send_accesses()` is a small client for it;
+- a named pipe (`--fifo`) with the same line format, for writers that can only
+  append to a file;
+- inotify on tier directories (`--watch`, Linux only). A file that was opened
+  read-only and then closed counts as one access. Paths are mapped to
+  file_ids in one indexed query per flush. fanotify is not used because it
+  needs CAP_SYS_ADMIN.
+
+inotify cannot tell which process read a file, so the engine registers the
+source path of every planned move in the store's mover_activity table before
+it hashes or copies anything, and closes each window when the run ends.
+Reads of a registered path inside its window (plus MOVER_SLACK_SECONDS) are
+dropped at flush time, from the counters and from co-access mining. The same
+applies to an application read of a file while it is being moved. Reads
+followed by a delete or a move-out within the same batch are dropped as well.
+
+Events update in-memory counters only: per-file hourly counts and the latest
+timestamp. No disk I/O happens per event. Every `flush_interval` seconds a
+flusher thread, which owns the MetadataStore, writes the batch in one
+transaction with `record_access_counts_many`. It then marks prefetch hits and
+mines co-access pairs from a bounded sample of the batch's events, together
+with the previous batches' events from the last co-access window. The
+association table is pruned to its bound every COACCESS_PRUNE_SECONDS.
+Records for file_ids not in the catalog are dropped.
+
+The analyzer adds access_log.csv to the same hourly windows and the two are
+not deduplicated: a read must be reported here or logged to the CSV, not both.
+
+Run with:
+
+    python access_ingest.py --socket access.sock --watch-tiers --flush-interval 2
+"""
+import argparse
+import collections
+import ctypes
+import ctypes.util
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+import coaccess
+import metrics
+from access_window import BUCKET_SECONDS
+from metadata_store import MetadataStore
+
+DEFAULT_SOCKET = 'access.sock'
+DEFAULT_FLUSH_INTERVAL = 2.0
+# Events kept per flush for co-access mining (counters themselves are unbounded)
+COACCESS_SAMPLE_EVENTS = 10000
+# The association table is cut back to its bound at most this often
+COACCESS_PRUNE_SECONDS = 300
+MAX_DATAGRAM = 65000
+# Events are stamped when the service reads them, slightly after the mover's read
+MOVER_SLACK_SECONDS = 1.0
+POLL_SECONDS = 0.5
+
+# inotify(7) constants
+IN_CLOSE_NOWRITE = 0x00000010
+IN_MOVED_FROM = 0x00000040
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def parse_record(line, now=None):
+    """Parses `<file_id>[\\t<timestamp>]`. Returns (file_id, timestamp) or None for blank/bad lines."""
+    fields = line.strip().split('\t')
+    if not fields[0]:
+        return None
+    if len(fields) == 1:
+        return fields[0], time.time() if now is None else now
+    try:
+        return fields[0], float(fields[1])
+    except ValueError:
+        return None
+
+
+def send_accesses(records, socket_path=DEFAULT_SOCKET):
+    """
+    Sends access records to a running service. `records` are file_ids or
+    (file_id, timestamp) pairs. They are packed into as few datagrams as possible.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        batch = b''
+        for record in records:
+            line = (record if isinstance(record, str) else f"{record[0]}\t{record[1]}").encode('utf-8') + b'\n'
+            if batch and len(batch) + len(line) > MAX_DATAGRAM:
+                sock.sendto(batch, socket_path)
+                batch = b''
+            batch += line
+        if batch:
+            sock.sendto(batch, socket_path)
+    finally:
+        sock.close()
+
+
+class AccessAggregator:
+    """Thread-safe in-memory access counters, drained by each flush."""
+
+    def __init__(self, sample_events=COACCESS_SAMPLE_EVENTS):
+        self._lock = threading.Lock()
+        self._sample_events = sample_events
+        self._reset()
+        # Owned by the flusher and kept across drains: the last co-access window
+        # of resolved (timestamp, file_id) events, and when the pairs were last pruned
+        self.coaccess_tail = collections.deque(maxlen=sample_events)
+        self.last_prune = None
+
+    def _reset(self):
+        self._by_id = {}    # file_id -> [last timestamp, {hour timestamp: n}]
+        self._by_path = {}  # path -> same plus the first timestamp, resolved to file_ids at flush time
+        self._sample = collections.deque(maxlen=self._sample_events)
+        self.events = 0
+
+    @staticmethod
+    def _count(table, key, ts):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [ts, {}]
+        elif ts > entry[0]:
+            entry[0] = ts
+        hour = ts - ts % BUCKET_SECONDS
+        entry[1][hour] = entry[1].get(hour, 0) + 1
+
+    def add(self, file_id, ts):
+        with self._lock:
+            self._count(self._by_id, file_id, ts)
+            self._sample.append((ts, file_id, False))
+            self.events += 1
+
+    def add_path(self, path, ts):
+        with self._lock:
+            self._count(self._by_path, path, ts)
+            entry = self._by_path[path]
+            if len(entry) == 2:
+                entry.append(ts)
+            elif ts < entry[2]:
+                entry[2] = ts
+            self._sample.append((ts, path, True))
+            self.events += 1
+
+    def forget_path(self, path):
+        """Drops pending reads of a path that was deleted or moved away (e.g. by the mover)."""
+        with self._lock:
+            self._by_path.pop(path, None)
+
+    def drain(self):
+        """Returns and resets (by_id, by_path, sample events, event count)."""
+        with self._lock:
+            drained = (self._by_id, self._by_path, list(self._sample), self.events)
+            self._reset()
+        return drained
+
+
+def _moving(activity, path, first, last):
+    """True if reads of `path` between `first` and `last` overlap the mover's activity window."""
+    window = activity.get(path)
+    if window is None:
+        return False
+    started, ended = window
+    return started <= last and (ended is None or first <= ended + MOVER_SLACK_SECONDS)
+
+
+def flush(aggregator, store, coaccess_window=coaccess.DEFAULT_WINDOW_SECONDS):
+    """Writes everything `aggregator` has collected to `store`. Returns the number of files updated."""
+    by_id, by_path, sample, events = aggregator.drain()
+    if not events:
+        return 0
+    with metrics.span('ingest_flush'):
+        resolved = {}
+        activity = {}
+        if by_path:
+            activity = store.get_mover_activity(by_path)
+            live = [path for path, (last, _, first) in by_path.items()
+                    if not _moving(activity, path, first, last) and os.path.exists(path)]
+            resolved = store.get_file_ids_by_path(live)
+            for path, file_id in resolved.items():
+                last, hours, _ = by_path[path]
+                entry = by_id.setdefault(file_id, [last, {}])
+                entry[0] = max(entry[0], last)
+                for hour, n in hours.items():
+                    entry[1][hour] = entry[1].get(hour, 0) + n
+
+        known = store.get_tiers(by_id)
+        counts = {fid: by_id[fid][1] for fid in known}
+        last_access = {fid: by_id[fid][0] for fid in known}
+        updated = store.record_access_counts_many(counts, last_access)
+
+        hits = store.mark_prefetch_hits({fid: [ts] for fid, ts in last_access.items()},
+                                        coaccess.PREFETCH_HIT_HORIZON_SECONDS)
+        ordered = []
+        for ts, key, is_path in sorted(sample):
+            file_id = resolved.get(key) if is_path else key
+            if file_id in known and not (is_path and _moving(activity, key, ts, ts)):
+                ordered.append((ts, file_id))
+        # Pairs that straddle the previous flush are found through the kept tail
+        tail = aggregator.coaccess_tail
+        pair_counts, support_counts = coaccess.mine_pairs(ordered, window_seconds=coaccess_window, context=tail)
+        tail.extend(ordered)
+        while tail and tail[-1][0] - tail[0][0] > coaccess_window:
+            tail.popleft()
+        now = time.monotonic()
+        prune = aggregator.last_prune is None or now - aggregator.last_prune >= COACCESS_PRUNE_SECONDS
+        if pair_counts or prune:
+            store.add_coaccess_many(pair_counts, support_counts,
+                                    max_pairs=coaccess.DEFAULT_MAX_PAIRS if prune else None,
+                                    max_age_seconds=coaccess.MAX_PAIR_AGE_SECONDS if prune else None)
+        if prune:
+            aggregator.last_prune = now
+
+    metrics.inc('ingest_events_total', events)
+    metrics.inc('ingest_files_updated_total', updated)
+    metrics.inc('prefetch_hits_total', hits)
+    return updated
+
+
+# --- Sources ---
+
+class SocketSource:
+    """Unix datagram socket receiving newline-separated access records."""
+
+    def __init__(self, path, aggregator):
+        self.path = path
+        self.aggregator = aggregator
+        if os.path.exists(path):
+            os.remove(path)  # stale socket from an earlier run
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        self.sock.settimeout(POLL_SECONDS)
+
+    def run(self, stop):
+        while not stop.is_set():
+            try:
+                data = self.sock.recv(MAX_DATAGRAM + 1024)
+            except socket.timeout:
+                continue
+            now = time.time()
+            for line in data.decode('utf-8', errors='replace').splitlines():
+                record = parse_record(line, now)
+                if record:
+                    self.aggregator.add(*record)
+
+    def close(self):
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class FifoSource:
+    """Named pipe receiving newline-separated access records."""
+
+    def __init__(self, path, aggregator):
+        self.path = path
+        self.aggregator = aggregator
+        if not os.path.exists(path):
+            os.mkfifo(path)
+        # Read-write open never blocks and never sees EOF when writers come and go
+        self.fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+
+    def run(self, stop):
+        pending = b''
+        while not stop.is_set():
+            ready, _, _ = select.select([self.fd], [], [], POLL_SECONDS)
+            if not ready:
+                continue
+            try:
+                pending += os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                continue
+            *lines, pending = pending.split(b'\n')
+            now = time.time()
+            for line in lines:
+                record = parse_record(line.decode('utf-8', errors='replace'), now)
+                if record:
+                    self.aggregator.add(*record)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def inotify_available():
+    return sys.platform.startswith('linux') and bool(ctypes.util.find_library('c'))
+
+
+class InotifySource:
+    """Counts read-only opens of files under the watched directories (recursively)."""
+
+    WATCH_MASK = IN_CLOSE_NOWRITE | IN_DELETE | IN_MOVED_FROM | IN_CREATE
+
+    def __init__(self, roots, aggregator):
+        self.aggregator = aggregator
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}  # watch descriptor -> directory
+        for root in roots:
+            self._watch_tree(root)
+
+    def _watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            print(f"Warning: cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self.dirs[wd] = directory
+
+    def _watch_tree(self, root):
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            self._watch(directory)
+            try:
+                with os.scandir(directory) as entries:
+                    stack.extend(e.path for e in entries if e.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+
+    def handle(self, data, now=None):
+        """Parses a buffer of inotify events and feeds the aggregator."""
+        now = time.time() if now is None else now
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & IN_CREATE:
+                    self._watch_tree(path)  # new hashed-layout bucket
+            elif mask & IN_CLOSE_NOWRITE:
+                self.aggregator.add_path(path, now)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.aggregator.forget_path(path)
+
+    def run(self, stop):
+        while not stop.is_set():
+            ready, _, _ = select.select([self.fd], [], [], POLL_SECONDS)
+            if ready:
+                try:
+                    self.handle(os.read(self.fd, 1 << 16))
+                except BlockingIOError:
+                    continue
+
+    def close(self):
+        os.close(self.fd)
+
+
+class AccessIngestService:
+    """Runs the configured sources and flushes their counters to the DB on an interval."""
+
+    def __init__(self, db_name='tiering_metadata.db', flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 socket_path=None, fifo_path=None, watch_dirs=()):
+        self.db_name = db_name
+        self.flush_interval = flush_interval
+        self.aggregator = AccessAggregator()
+        self.sources = []
+        if socket_path:
+            self.sources.append(SocketSource(socket_path, self.aggregator))
+        if fifo_path:
+            self.sources.append(FifoSource(fifo_path, self.aggregator))
+        if watch_dirs:
+            if inotify_available():
+                self.sources.append(InotifySource(watch_dirs, self.aggregator))
+            else:
+                print("Warning: inotify is not available on this platform; directory capture disabled.")
+        self._stop = threading.Event()
+        self._threads = []
+        self.files_updated = 0
+
+    def _flush_loop(self):
+        # The flusher thread owns the store (SQLite connections are per thread)
+        store = MetadataStore(self.db_name)
+        try:
+            while not self._stop.wait(self.flush_interval):
+                self.files_updated += flush(self.aggregator, store)
+            self.files_updated += flush(self.aggregator, store)  # final flush on shutdown
+        finally:
+            store.close()
+
+    def start(self):
+        for source in self.sources:
+            thread = threading.Thread(target=source.run, args=(self._stop,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        flusher = threading.Thread(target=self._flush_loop, name='ingest-flush', daemon=True)
+        flusher.start()
+        self._threads.append(flusher)
+
+    def stop(self):
+        """Stops the sources and waits for the final flush."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        for source in self.sources:
+            source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture file accesses and flush them to the metadata store')
+    parser.add_argument('--db', type=str, default='tiering_metadata.db', help='Metadata DB path')
+    parser.add_argument('--socket', type=str, help=f'Unix datagram socket to listen on (e.g. {DEFAULT_SOCKET})')
+    parser.add_argument('--fifo', type=str, help='Named pipe to read access records from')
+    parser.add_argument('--watch', type=str, action='append', default=[],
+                        help='Directory to capture reads from with inotify (repeatable)')
+    parser.add_argument('--watch-tiers', action='store_true', help='Watch the Hot and Warm tier directories')
+    parser.add_argument('--config', type=str, help='Path to config.json (for --watch-tiers)')
+    parser.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL,
+                        help='Seconds between batched DB flushes')
+    args = parser.parse_args()
+
+    watch = list(args.watch)
+    if args.watch_tiers:
+        import tiering_engine as te
+        te.load_config(args.config)
+        watch += [te.HOT_TIER_PATH, te.WARM_TIER_PATH]
+    if not (args.socket or args.fifo or watch):
+        args.socket = DEFAULT_SOCKET
+
+    service = AccessIngestService(args.db, args.flush_interval, args.socket, args.fifo, watch)
+    service.start()
+    print(f"Access ingest running (socket={args.socket}, fifo={args.fifo}, watching {len(watch)} dirs, "
+          f"flush every {args.flush_interval}s). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        print(f"Stopped; wrote access stats for {service.files_updated} files.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Time-bucketed access counters for sliding-window access counts.
+
+Each file keeps WINDOW_HOURS hourly buckets in a ring buffer that is stored as a
+compact BLOB (4 bytes per bucket, 672 bytes for 7 days) together with the
+absolute hour of the newest bucket. Ingest adds events incrementally, so
+window counts never require rescanning old logs. Buckets that fall out of the
+window are zeroed lazily when the ring advances, and a running total keeps the
+full 7-day count available without summing.
+"""
+from array import array
+
+BUCKET_SECONDS = 3600
+WINDOW_HOURS = 7 * 24
+
+# Named windows exposed to callers (hours)
+WINDOWS = {'1h': 1, '24h': 24, '7d': WINDOW_HOURS}
+
+
+def hour_of(timestamp):
+    """Absolute hour index (hours since the epoch) for a time.time() timestamp."""
+    return int(timestamp // BUCKET_SECONDS)
+
+
+class HourlyWindow:
+    """Ring buffer of hourly access counts covering the last WINDOW_HOURS hours."""
+
+    def __init__(self, head_hour=0, buckets=None):
+        self.head_hour = head_hour
+        self.buckets = buckets if buckets is not None else array('I', [0] * WINDOW_HOURS)
+        self.total = sum(self.buckets)
+
+    @classmethod
+    def from_blob(cls, blob, head_hour):
+        """Rebuilds a window from the BLOB and head hour stored in the DB."""
+        buckets = array('I')
+        if blob:
+            buckets.frombytes(blob)
+        if len(buckets) != WINDOW_HOURS:
+            buckets = array('I', [0] * WINDOW_HOURS)
+        return cls(head_hour or 0, buckets)
+
+    def to_blob(self):
+        return self.buckets.tobytes()
+
+    def advance(self, hour):
+        """Moves the head forward to `hour`, expiring buckets that leave the window."""
+        if hour <= self.head_hour:
+            return
+        if hour - self.head_hour >= WINDOW_HOURS:
+            for i in range(WINDOW_HOURS):
+                self.buckets[i] = 0
+            self.total = 0
+        else:
+            for h in range(self.head_hour + 1, hour + 1):
+                idx = h % WINDOW_HOURS
+                self.total -= self.buckets[idx]
+                self.buckets[idx] = 0
+        self.head_hour = hour
+
+    def add(self, timestamp, n=1):
+        """Records `n` accesses at `timestamp`. Events older than the window are dropped."""
+        hour = hour_of(timestamp)
+        if hour > self.head_hour:
+            self.advance(hour)
+        elif hour <= self.head_hour - WINDOW_HOURS:
+            return
+        self.buckets[hour % WINDOW_HOURS] += n
+        self.total += n
+
+    def count(self, hours, now):
+        """
+        Accesses within the last `hours` hours (including the current hour) as of
+        `now`. The full window is answered from the running total; shorter
+        windows sum at most `hours` buckets.
+        """
+        now_hour = hour_of(now)
+        # Buckets newer than the head do not exist yet; those older than the
+        # requested window are excluded.
+        oldest = now_hour - hours + 1
+        if hours >= WINDOW_HOURS and now_hour == self.head_hour:
+            return self.total
+        start = max(oldest, self.head_hour - WINDOW_HOURS + 1)
+        end = min(now_hour, self.head_hour)
+        return sum(self.buckets[h % WINDOW_HOURS] for h in range(start, end + 1))
+
+    def counts(self, now):
+        """Returns the standard {'1h', '24h', '7d'} window counts."""
+        return {name: self.count(hours, now) for name, hours in WINDOWS.items()}
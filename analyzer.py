@@ -1,11 +1,19 @@
 import argparse
-import pandas as pd
+import coaccess
+import csv
 import time
+from access_window import BUCKET_SECONDS, WINDOW_HOURS
 from metadata_store import MetadataStore
+import metrics
+import profiling
 import os
+from sketches import SketchState
 
 LOG_FILE = "access_log.csv"
 DB_NAME = "tiering_metadata.db"
+SKETCH_STATE_FILE = "access_sketch.json"
+# Events per tier-lookup batch in sketch mode
+SKETCH_CHUNK_SIZE = 10000
 
 
 def compute_ewma(previous_score, new_sample, alpha=0.3):
@@ -15,7 +23,19 @@ def compute_ewma(previous_score, new_sample, alpha=0.3):
     return alpha * new_sample + (1 - alpha) * previous_score
 
 
-def analyze_patterns(alpha=0.3):
+def compute_sample(last_access, access_count, max_count, now):
+    """Pattern-score sample for one file from its recency and relative frequency."""
+    # recency_score: linear decay over 7 days
+    seconds_since = now - float(last_access)
+    recency_score = max(0.0, 1.0 - (seconds_since / (7 * 24 * 3600)))  # 7-day window
+
+    frequency_score = float(access_count) / float(max_count) if max_count > 0 else 0.0
+
+    # New sample is a combination of recency and frequency
+    return 0.4 * recency_score + 0.6 * frequency_score
+
+
+def analyze_patterns(alpha=0.3, coaccess_window=coaccess.DEFAULT_WINDOW_SECONDS):
     """
     Reads the access log, aggregates access counts, and updates the database.
     """
@@ -23,80 +43,232 @@ def analyze_patterns(alpha=0.3):
         print(f"FATAL ERROR: Log file '{LOG_FILE}' not found. Please run workload_sim.py first.")
         return
 
+    # pandas is imported lazily so `--help` and the other CLI paths start quickly
+    import pandas as pd
+
     print("--- 1. Reading Access Log and Calculating Counts ---")
     
     # 1. Read the CSV log using pandas
     # The 'timestamp' column is crucial here
-    try:
-        df = pd.read_csv(LOG_FILE)
-    except pd.errors.EmptyDataError:
-        print("Log file is empty. Skipping analysis.")
-        return
+    with profiling.phase('parse'), metrics.span('analyzer_parse_log'):
+        try:
+            df = pd.read_csv(LOG_FILE)
+        except pd.errors.EmptyDataError:
+            print("Log file is empty. Skipping analysis.")
+            return
 
-    # Convert timestamp column to numeric (it should be REAL from time.time())
-    df['timestamp'] = pd.to_numeric(df['timestamp'])
-    
-    # 2. Aggregate Data: Count accesses per file_id
-    access_counts = df.groupby('file_id').size().reset_index(name='access_count')
-    
-    # 3. Aggregate Data: Find the most recent access time per file_id
-    last_accesses = df.groupby('file_id')['timestamp'].max().reset_index(name='last_access_time')
+        # Convert timestamp column to numeric (it should be REAL from time.time())
+        df['timestamp'] = pd.to_numeric(df['timestamp'])
+    metrics.inc('log_events_total', len(df))
 
-    # 4. Merge the two aggregates into a single table for processing
-    analysis_df = pd.merge(access_counts, last_accesses, on='file_id')
+    with profiling.phase('parse'), metrics.span('analyzer_aggregate'):
+        # 2. Aggregate Data: Find the most recent access time per file_id
+        analysis_df = df.groupby('file_id')['timestamp'].max().reset_index(name='last_access_time')
 
     print(f"Found {len(analysis_df)} unique files in the log to analyze.")
     
-    # --- 5. Update Database ---
+    # --- 3. Update Database ---
     print("--- 2. Updating Metadata Store with Analysis Results (EWMA pattern scoring) ---")
     store = MetadataStore(DB_NAME)
 
     update_count = 0
-
-    # Parameters for pattern scoring
     now = time.time()
-    MAX_COUNT = analysis_df['access_count'].max() if not analysis_df['access_count'].empty else 1
 
     # Fetch existing scores to apply EWMA
     existing = {r[0]: r[5] for r in store.get_all_files()}  # file_id -> access_pattern_score
 
-    # Iterate through the analysis results and update the database
-    for index, row in analysis_df.iterrows():
-        file_id = row['file_id']
-        access_count = row['access_count']
-        last_access = row['last_access_time']
+    # 4. Incremental ingest: only events newer than the stored watermark are added
+    # to the hourly access windows, so re-running over the same log never double counts.
+    # The log and access_ingest.py both add to these windows and are not deduplicated
+    # against each other: each read must reach the store through only one of them.
+    # Events for files not yet in the catalog are parked in the store and retried on
+    # later runs (until they leave the 7-day window), so the watermark can pass them.
+    with metrics.span('analyzer_ingest_windows'):
+        watermark = store.get_ingest_watermark(LOG_FILE)
+        logged = df[df['timestamp'] > watermark]
+        parked = pd.DataFrame(
+            [(ts, fid) for fid, timestamps in store.get_pending_accesses().items() for ts in timestamps],
+            columns=['timestamp', 'file_id'])
+        candidates = pd.concat([logged[['timestamp', 'file_id']], parked], ignore_index=True)
+        matched = candidates['file_id'].isin(existing)
+        new_events = candidates[matched]
+        unmatched = candidates[~matched & (candidates['timestamp'] > now - WINDOW_HOURS * BUCKET_SECONDS)]
+        events_by_file = new_events.groupby('file_id')['timestamp'].apply(list).to_dict()
+        store.record_accesses_many(events_by_file)
+        if len(unmatched) or len(parked):
+            store.set_pending_accesses(unmatched.groupby('file_id')['timestamp'].apply(list).to_dict())
+        if not logged.empty:
+            store.set_ingest_watermark(LOG_FILE, float(logged['timestamp'].max()))
+    print(f"Ingested {len(new_events)} new access events into sliding windows "
+          f"({len(unmatched)} for files not yet in the catalog kept for later runs).")
+
+    # 5. Co-access mining and prefetch feedback over the same new events
+    with metrics.span('analyzer_coaccess'):
+        ordered = new_events.sort_values('timestamp')
+        pair_counts, support_counts = coaccess.mine_pairs(
+            zip(ordered['timestamp'].tolist(), ordered['file_id'].tolist()),
+            window_seconds=coaccess_window)
+        store.add_coaccess_many(pair_counts, support_counts, max_pairs=coaccess.DEFAULT_MAX_PAIRS,
+                                max_age_seconds=coaccess.MAX_PAIR_AGE_SECONDS)
+        hits = store.mark_prefetch_hits(events_by_file, coaccess.PREFETCH_HIT_HORIZON_SECONDS)
+    metrics.inc('prefetch_hits_total', hits)
+    prefetched, total_hits = store.get_prefetch_stats()
+    print(f"Recorded {len(pair_counts)} co-access pairs.")
+    if prefetched:
+        print(f"Prefetch hit rate: {total_hits}/{prefetched} ({100.0 * total_hits / prefetched:.1f}%)")
 
-        # recency_score: linear decay over 7 days
-        seconds_since = now - float(last_access)
-        recency_score = max(0.0, 1.0 - (seconds_since / (7 * 24 * 3600)))  # 7-day window
+    # True 7-day counts from the windows (not lifetime log totals), read for the logged files only
+    window_counts = store.get_access_counts(now=now, file_ids=analysis_df['file_id'].tolist())
+    analysis_df['access_count'] = analysis_df['file_id'].map(lambda fid: window_counts.get(fid, 0))
+
+    # Parameters for pattern scoring
+    MAX_COUNT = analysis_df['access_count'].max() if not analysis_df['access_count'].empty else 1
 
-        frequency_score = float(access_count) / float(MAX_COUNT) if MAX_COUNT > 0 else 0.0
+    # Iterate through the analysis results and update the database
+    # The span covers scoring plus the per-file DB updates; store_* spans break out the SQLite share
+    with profiling.phase('score'), metrics.span('analyzer_score'):
+        for index, row in analysis_df.iterrows():
+            file_id = row['file_id']
+            access_count = row['access_count']
+            last_access = row['last_access_time']
 
-        # New sample is a combination of recency and frequency
-        new_sample = 0.4 * recency_score + 0.6 * frequency_score
+            new_sample = compute_sample(last_access, access_count, MAX_COUNT, now)
 
-        prev_score = existing.get(file_id, 0.0)
-        pattern_score = compute_ewma(prev_score, new_sample, alpha=alpha)
+            prev_score = existing.get(file_id, 0.0)
+            pattern_score = compute_ewma(prev_score, new_sample, alpha=alpha)
 
-        # Store the computed pattern score in the DB
-        if store.update_file_stats(file_id, last_access, access_count, pattern_score):
-            update_count += 1
+            # Store the computed pattern score in the DB
+            if store.update_file_stats(file_id, last_access, access_count, pattern_score):
+                update_count += 1
+                metrics.inc('files_scored_total')
 
     store.close()
 
     print(f"\n--- DONE: Successfully updated statistics (including EWMA pattern scores) for {update_count} files. ---")
 
 
+def analyze_patterns_sketch(alpha=0.3, state_path=SKETCH_STATE_FILE, top_k=1000):
+    """
+    Memory-bounded variant of analyze_patterns for very large logs.
+
+    Streams the log row by row into the sketches in sketches.py instead of a
+    pandas groupby: a Space-Saving top-k tracker for promotion candidates and
+    one HyperLogLog per tier for distinct-file counts. Memory depends on
+    `top_k` and the sketch sizes, not on the number of distinct files: scores
+    and counts are only read for the top-k ids. No count-min sketch is kept,
+    since no per-file estimate outside the top-k is used. Sketches are cumulative across runs and
+    live in `state_path`; delete that file to start a fresh period.
+
+    The sketches only pick the top-k heavy hitters whose stats and pattern
+    scores are updated. Their `access_count_last_7_days` comes from the
+    per-file hourly windows, which are fed chunk by chunk as in exact mode, so
+    it is a real 7-day count rather than the cumulative sketch count. The
+    windows share exact mode's ingest watermark in the store, so the two modes
+    can be alternated over the same log.
+    """
+    if not os.path.exists(LOG_FILE):
+        print(f"FATAL ERROR: Log file '{LOG_FILE}' not found. Please run workload_sim.py first.")
+        return None
+
+    state = SketchState.load(state_path, top_k=top_k)
+    store = MetadataStore(DB_NAME)
+    # The sketches and the hourly windows each resume from their own watermark. The
+    # windows use the store's, shared with exact mode, so switching modes never
+    # ingests an event into the windows twice.
+    sketch_from = state.watermark
+    window_from = store.get_ingest_watermark(LOG_FILE)
+    start_watermark = min(sketch_from, window_from)
+    newest = window_from
+
+    print("--- 1. Streaming Access Log into Sketches ---")
+    ingested = 0
+    with profiling.phase('parse'), metrics.span('analyzer_sketch_ingest'):
+        with open(LOG_FILE, 'r', newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            chunk = []
+            for row in reader:
+                ts = float(row[0])
+                if ts <= start_watermark:
+                    continue
+                chunk.append((ts, row[1]))
+                newest = max(newest, ts)
+                if len(chunk) >= SKETCH_CHUNK_SIZE:
+                    ingested += _ingest_sketch_chunk(state, store, chunk, sketch_from, window_from)
+                    chunk = []
+            if chunk:
+                ingested += _ingest_sketch_chunk(state, store, chunk, sketch_from, window_from)
+        if newest > window_from:
+            store.set_ingest_watermark(LOG_FILE, newest)
+    metrics.inc('log_events_total', ingested)
+    print(f"Ingested {ingested} new access events.")
+
+    print("--- 2. Updating Heavy Hitters in Metadata Store ---")
+    now = time.time()
+    # Scores and 7-day counts are read for the top-k ids only, in batched queries
+    top = [(file_id, last_ts) for file_id, _, _, last_ts in state.heavy_hitters.top() if last_ts is not None]
+    scores = store.get_scores(file_id for file_id, _ in top)
+    candidates = [(file_id, last_ts) for file_id, last_ts in top if file_id in scores]
+    window_counts = store.get_access_counts(now=now, file_ids=[file_id for file_id, _ in candidates])
+    max_count = max(window_counts.values(), default=0) or 1
+    update_count = 0
+    with profiling.phase('score'), metrics.span('analyzer_score'):
+        for file_id, last_ts in candidates:
+            access_count = window_counts.get(file_id, 0)
+            new_sample = compute_sample(last_ts, access_count, max_count, now)
+            pattern_score = compute_ewma(scores[file_id], new_sample, alpha=alpha)
+            if store.update_file_stats(file_id, last_ts, access_count, pattern_score):
+                update_count += 1
+                metrics.inc('files_scored_total')
+    store.close()
+    state.save(state_path)
+
+    distinct = state.distinct_files_per_tier()
+    print("Approximate distinct files accessed per tier:")
+    for tier, n in sorted(distinct.items()):
+        print(f"  {tier}: ~{n:.0f}")
+    print(f"\n--- DONE: Updated {update_count} heavy-hitter files from sketches (state saved to {state_path}). ---")
+    return state
+
+
+def _ingest_sketch_chunk(state, store, chunk, sketch_from, window_from):
+    """
+    Adds a chunk of (timestamp, file_id) events to the sketches (if newer than
+    `sketch_from`) and to the hourly windows of cataloged files (if newer than
+    `window_from`); tiers are looked up once per chunk.
+    """
+    tiers = store.get_tiers({file_id for _, file_id in chunk})
+    events_by_file = {}
+    for ts, file_id in chunk:
+        tier = tiers.get(file_id)
+        if ts > sketch_from:
+            state.add(file_id, tier or 'Unknown', ts)
+        if tier is not None and ts > window_from:
+            events_by_file.setdefault(file_id, []).append(ts)
+    store.record_accesses_many(events_by_file)
+    return len(chunk)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Analyze access logs and update pattern scores')
     parser.add_argument('--alpha', type=float, default=0.3, help='EWMA alpha for pattern score updates')
+    parser.add_argument('--metrics-out', type=str, help='Write timing metrics to this file (.json for JSON, otherwise Prometheus text)')
+    parser.add_argument('--coaccess-window', type=float, default=coaccess.DEFAULT_WINDOW_SECONDS, help='Seconds within which two reads count as co-accessed')
+    parser.add_argument('--sketch', action='store_true', help='Use memory-bounded sketches instead of exact per-file aggregation')
+    parser.add_argument('--sketch-state', type=str, default=SKETCH_STATE_FILE, help='File holding sketches between runs (with --sketch)')
+    parser.add_argument('--top-k', type=int, default=1000, help='Heavy hitters to track and update (with --sketch)')
+    profiling.add_arguments(parser)
     args = parser.parse_args()
-    analyze_patterns(alpha=args.alpha)
+    if args.metrics_out:
+        metrics.enable()
+    with profiling.session(args, 'analyzer'):
+        if args.sketch:
+            analyze_patterns_sketch(alpha=args.alpha, state_path=args.sketch_state, top_k=args.top_k)
+        else:
+            analyze_patterns(alpha=args.alpha, coaccess_window=args.coaccess_window)
+    if args.metrics_out:
+        metrics.write(args.metrics_out)
 
 
 if __name__ == '__main__':
     main()
-
-
-if __name__ == '__main__':
-    analyze_patterns()
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Co-access mining and predictive prefetch (TODO.md "Predictive Prefetching").
+
+The analyzer mines pairs of files read within `window_seconds` of each other
+and adds them to a bounded association table in MetadataStore. When the
+engine recalls a Cold file, `prefetch_moves()` turns its strongly associated
+Cold peers into Cold->Warm moves, appended after the regular plan. Their
+`prefetch_for` key marks them as prefetches, which move_selection values at
+PREFETCH_WEIGHT of a regular promotion. Pairs that are not seen again age out
+of the table after MAX_PAIR_AGE_SECONDS.
+Prefetches are logged so that the analyzer can later measure how many of them
+were actually read (the prefetch hit rate).
+"""
+from collections import deque
+
+# Pairs closer together than this (seconds) count as co-accessed
+DEFAULT_WINDOW_SECONDS = 300
+# Upper bound on rows kept in the association table
+DEFAULT_MAX_PAIRS = 100000
+# Pairs and support counts not updated for this long are dropped when the table is pruned
+MAX_PAIR_AGE_SECONDS = 30 * 24 * 60 * 60
+# Most recent distinct files each event is paired with, so bursts stay O(n)
+MAX_FANOUT = 20
+
+# Prefetch a peer when P(peer read | file read) is at least this
+DEFAULT_MIN_CONFIDENCE = 0.5
+DEFAULT_MAX_PEERS = 5
+# A prefetched file read within this many seconds counts as a hit
+PREFETCH_HIT_HORIZON_SECONDS = 24 * 60 * 60
+
+
+def mine_pairs(events, window_seconds=DEFAULT_WINDOW_SECONDS, max_pairs=DEFAULT_MAX_PAIRS, context=()):
+    """
+    Counts co-accessed file pairs in a time-ordered stream of (timestamp, file_id).
+    `context` holds earlier (timestamp, file_id) events, such as the tail of the
+    previous batch. They pair with `events` but are not counted themselves.
+
+    :return: (pair_counts, support_counts) where pair_counts maps an ordered
+             (file_a, file_b) tuple with file_a < file_b to the number of
+             windows they shared, and support_counts maps file_id to its
+             number of accesses.
+    """
+    pair_counts = {}
+    support_counts = {}
+    recent = deque(context)  # (ts, file_id), oldest first
+
+    for ts, file_id in events:
+        support_counts[file_id] = support_counts.get(file_id, 0) + 1
+        while recent and ts - recent[0][0] > window_seconds:
+            recent.popleft()
+
+        seen = set()
+        for _, other in reversed(recent):
+            if other == file_id or other in seen:
+                continue
+            seen.add(other)
+            pair = (other, file_id) if other < file_id else (file_id, other)
+            pair_counts[pair] = pair_counts.get(pair, 0) + 1
+            if len(seen) >= MAX_FANOUT:
+                break
+        recent.append((ts, file_id))
+
+        if len(pair_counts) > 2 * max_pairs:
+            pair_counts = _prune(pair_counts, max_pairs)
+
+    if len(pair_counts) > max_pairs:
+        pair_counts = _prune(pair_counts, max_pairs)
+    return pair_counts, support_counts
+
+
+def _prune(pair_counts, max_pairs):
+    """Keeps the `max_pairs` strongest pairs."""
+    ranked = sorted(pair_counts.items(), key=lambda kv: kv[1], reverse=True)
+    return dict(ranked[:max_pairs])
+
+
+def prefetch_moves(store, recall_moves, file_rows, planned_ids,
+                   min_confidence=DEFAULT_MIN_CONFIDENCE, max_peers=DEFAULT_MAX_PEERS):
+    """
+    Builds Cold->Warm prefetch moves for the peers of recalled files.
+
+    :param recall_moves: Cold->Warm moves already in the plan.
+    :param file_rows: dict of file_id -> get_all_files() row, used to find each peer's tier and path.
+    :param planned_ids: ids already in the plan; they are never prefetched twice.
+    """
+    moves = []
+    queued = set(planned_ids)
+    for recall in recall_moves:
+        for peer_id, _, confidence in store.get_coaccess_peers(recall['id'], min_confidence, max_peers):
+            row = file_rows.get(peer_id)
+            if row is None or row[2] != 'Cold' or peer_id in queued:
+                continue
+            queued.add(peer_id)
+            moves.append({
+                'id': peer_id,
+                'from': 'Cold',
+                'to': 'Warm',
+                'path': row[1],
+                'prefetch_for': recall['id'],
+                'reason': f"Prefetch: co-accessed with {recall['id']} (confidence {confidence:.2f})."
+            })
+    return moves
@@ -0,0 +1,198 @@
+"""
+Optional compression of files demoted to the Cold tier.
+
+A codec is chosen per file extension (CODECS_BY_EXTENSION; text formats use
+zstd and everything else uses gzip). zstd needs the optional `zstandard`
+package. Without it, zstd falls back to gzip, which only needs the standard
+library. Data that is already compressed is stored raw. It is recognised by
+extension, by magic bytes, or by a quick zlib pass over a sample of the file
+(head and middle) that does not shrink it enough.
+
+Compression and decompression stream in content_hash.HASH_CHUNK_SIZE chunks.
+Decompression hashes the restored bytes in the same pass so that recalls can
+fill the warm cache without reading the file again. CPU time and byte counters
+are accumulated in this module (see `totals()`) and mirrored to `metrics`.
+"""
+import hashlib
+import os
+import time
+import zlib
+
+import metrics
+from content_hash import HASH_CHUNK_SIZE
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+SUFFIXES = {GZIP: '.gz', ZSTD: '.zst'}
+
+CODECS_BY_EXTENSION = {
+    '.log': ZSTD, '.txt': ZSTD, '.csv': ZSTD, '.json': ZSTD,
+    '.xml': ZSTD, '.md': ZSTD, '.html': ZSTD,
+}
+DEFAULT_CODEC = GZIP
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Extensions of formats that are already compressed
+COMPRESSED_EXTENSIONS = frozenset({
+    '.gz', '.tgz', '.zst', '.bz2', '.xz', '.lz4', '.zip', '.7z', '.rar',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.avi',
+    '.mov', '.ogg', '.flac', '.parquet',
+})
+MAGIC_PREFIXES = (
+    b'\x1f\x8b',          # gzip
+    b'\x28\xb5\x2f\xfd',  # zstd
+    b'PK\x03\x04',        # zip
+    b'\xfd7zXZ\x00',      # xz
+    b'BZh',               # bzip2
+    b'\x89PNG',
+    b'\xff\xd8\xff',      # JPEG
+)
+
+SAMPLE_BYTES = 64 * 1024
+# A sample must shrink below this fraction of its size to be worth compressing
+MAX_SAMPLE_RATIO = 0.9
+MIN_COMPRESS_BYTES = 512
+
+_totals = {
+    'files_compressed': 0,
+    'files_skipped': 0,
+    'raw_bytes': 0,
+    'stored_bytes': 0,
+    'compress_cpu_seconds': 0.0,
+    'decompress_cpu_seconds': 0.0,
+}
+
+
+def totals():
+    """Counters accumulated since the last `reset_totals()`."""
+    result = dict(_totals)
+    result['bytes_saved'] = result['raw_bytes'] - result['stored_bytes']
+    return result
+
+
+def reset_totals():
+    for name in _totals:
+        _totals[name] = 0
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _compressor(codec):
+    if codec == GZIP:
+        # wbits 31 = deflate with a gzip header and trailer
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    if codec == ZSTD:
+        return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def _decompressor(codec):
+    if codec == GZIP:
+        return zlib.decompressobj(31)
+    if codec == ZSTD:
+        return _zstd().ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def _sample(path):
+    """Reads the head of the file, plus a chunk from the middle of large files."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        sample = f.read(SAMPLE_BYTES)
+        if size > 2 * SAMPLE_BYTES:
+            f.seek(size // 2)
+            sample += f.read(SAMPLE_BYTES)
+    return sample
+
+
+def looks_compressible(path):
+    """True if a sample of `path` compresses well enough to be worth compressing."""
+    if os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return False
+    sample = _sample(path)
+    if len(sample) < MIN_COMPRESS_BYTES or sample.startswith(MAGIC_PREFIXES):
+        return False
+    return len(zlib.compress(sample, 1)) < len(sample) * MAX_SAMPLE_RATIO
+
+
+def choose_codec(path, codecs=None, default=DEFAULT_CODEC):
+    """
+    Codec to store `path` with on Cold, or None to store it raw. `codecs` maps
+    lower-case extensions to a codec name ('none' disables compression for
+    that type). Unlisted extensions use `default`.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    codec = (CODECS_BY_EXTENSION if codecs is None else codecs).get(ext, default)
+    if codec in (None, 'none'):
+        return None
+    if codec not in SUFFIXES:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    if codec == ZSTD and _zstd() is None:
+        codec = GZIP
+    if not looks_compressible(path):
+        _totals['files_skipped'] += 1
+        metrics.inc('compression_skipped_total')
+        return None
+    return codec
+
+
+def compress_file(src, dst, codec):
+    """Streams `src` into `dst` compressed with `codec`. Returns (raw_size, stored_size)."""
+    cpu_start = time.thread_time()
+    compressor = _compressor(codec)
+    raw_size = stored_size = 0
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        for chunk in iter(lambda: fin.read(HASH_CHUNK_SIZE), b''):
+            raw_size += len(chunk)
+            out = compressor.compress(chunk)
+            if out:
+                fout.write(out)
+                stored_size += len(out)
+        out = compressor.flush()
+        fout.write(out)
+        stored_size += len(out)
+    cpu = time.thread_time() - cpu_start
+
+    _totals['files_compressed'] += 1
+    _totals['raw_bytes'] += raw_size
+    _totals['stored_bytes'] += stored_size
+    _totals['compress_cpu_seconds'] += cpu
+    metrics.inc('compression_files_total')
+    metrics.inc('compression_raw_bytes_total', raw_size)
+    metrics.inc('compression_stored_bytes_total', stored_size)
+    metrics.inc('compression_bytes_saved_total', raw_size - stored_size)
+    metrics.inc('compression_cpu_seconds_total', cpu)
+    return raw_size, stored_size
+
+
+def decompress_file(src, dst, codec):
+    """Streams `src` decompressed into `dst`. Returns (hex SHA-256 of the restored bytes, raw size)."""
+    cpu_start = time.thread_time()
+    decompressor = _decompressor(codec)
+    digest = hashlib.sha256()
+    raw_size = 0
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        for chunk in iter(lambda: fin.read(HASH_CHUNK_SIZE), b''):
+            out = decompressor.decompress(chunk)
+            if out:
+                digest.update(out)
+                fout.write(out)
+                raw_size += len(out)
+        flush = getattr(decompressor, 'flush', None)
+        out = flush() if flush else b''
+        if out:
+            digest.update(out)
+            fout.write(out)
+            raw_size += len(out)
+    cpu = time.thread_time() - cpu_start
+
+    _totals['decompress_cpu_seconds'] += cpu
+    metrics.inc('decompression_cpu_seconds_total', cpu)
+    return digest.hexdigest(), raw_size
@@ -0,0 +1,58 @@
+"""
+Streaming content hashing for files moved between tiers.
+
+Files are read in HASH_CHUNK_SIZE chunks, so memory stays flat for large
+files. hashlib releases the GIL while hashing large buffers, so
+`hash_files_parallel` gets real parallelism from a thread pool when a plan
+demotes many files at once.
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_HASH_WORKERS = 4
+
+
+def hash_file(path):
+    """Streams `path` through SHA-256. Returns (hex digest, size in bytes)."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def copy_with_hash(src, dst):
+    """Copies `src` to `dst` while hashing it in the same pass. Returns (hex digest, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        for chunk in iter(lambda: fin.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            fout.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def hash_files_parallel(paths, max_workers=DEFAULT_HASH_WORKERS):
+    """
+    Hashes many files concurrently.
+
+    :return: dict of path -> (hex digest, size). Unreadable paths are omitted
+             (the move itself will report the error).
+    """
+    results = {}
+
+    def _safe_hash(path):
+        try:
+            return path, hash_file(path)
+        except OSError:
+            return path, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for path, result in pool.map(_safe_hash, paths):
+            if result is not None:
+                results[path] = result
+    return results
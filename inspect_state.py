@@ -1,6 +1,18 @@
+import argparse
+import bisect
+import contextlib
+import hashlib
+import heapq
+import itertools
+import json
 import os
-import sqlite3
-from pprint import pprint
+import sys
+import time
+from array import array
+
+import profiling
+import tier_layout
+from metadata_store import MetadataStore
 
 BASE = os.path.dirname(__file__)
 SSD = os.path.join(BASE, 'mnt_ssd')
@@ -8,84 +20,266 @@ HDD = os.path.join(BASE, 'mnt_hdd')
 CLOUD = os.path.join(BASE, 'mnt_cloud')
 DB = os.path.join(BASE, 'tiering_metadata.db')
 
-def list_dir(path):
+# (DB tier, directory label, directory)
+TIER_DIRS = (('Hot', 'SSD', SSD), ('Warm', 'HDD', HDD), ('Cold', 'CLOUD', CLOUD))
+SCORE_BINS = 10
+AGE_EDGES_DAYS = (1, 7, 30, 90, 365)
+DEFAULT_SAMPLES = 10
+DAY = 24 * 60 * 60
+
+
+def _age_labels():
+    bounds = (0,) + AGE_EDGES_DAYS
+    labels = [f'{lo}-{hi}d' for lo, hi in zip(bounds, AGE_EDGES_DAYS)]
+    return labels + [f'>{AGE_EDGES_DAYS[-1]}d', 'never']
+
+
+def _name_hash(name):
+    return int.from_bytes(hashlib.blake2b(os.fsencode(name), digest_size=8).digest(), 'little')
+
+
+def _add_sample(samples, item, limit):
+    """Keeps `samples` as the `limit` smallest items seen so far, in order."""
+    if len(samples) < limit or (samples and item < samples[-1]):
+        bisect.insort(samples, item)
+        del samples[limit:]
+
+
+def scan_dir(path, samples=DEFAULT_SAMPLES):
+    """
+    Walks `path` once with os.scandir (including hashed layout subdirectories).
+    Returns {'files', 'bytes', 'dirs', 'samples'} or {'error'}.
+
+    Memory stays at about 8 bytes per file at the 10M-file scale: instead of
+    path strings, `dirs` maps each directory to the sorted 64-bit hashes of
+    its file names. `samples` holds the smallest `samples` paths.
+    """
+    dirs = {}
+    smallest = []
+    files = total = 0
+    stack = [path]
     try:
-        return sorted(os.listdir(path))
-    except Exception as e:
-        return f'Error reading {path}: {e}'
+        with profiling.phase('scan'):
+            while stack:
+                current = stack.pop()
+                hashes = array('Q')
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        hashes.append(_name_hash(entry.name))
+                        total += entry.stat(follow_symlinks=False).st_size
+                        _add_sample(smallest, entry.path, samples)
+                if hashes:
+                    files += len(hashes)
+                    # Keyed like os.path.dirname() of the entries' paths, so recorded paths split to the same key
+                    dirs[os.path.dirname(os.path.join(current, ''))] = array('Q', sorted(hashes))
+    except OSError as e:
+        return {'error': f'Error reading {path}: {e}'}
+    return {'files': files, 'bytes': total, 'dirs': dirs, 'samples': smallest}
+
+
+def _file_names(directory, wanted):
+    """Names of the files in `directory` whose name hash is in `wanted` (a directory re-read for samples)."""
+    with os.scandir(directory) as entries:
+        return [entry.name for entry in entries
+                if not entry.is_dir(follow_symlinks=False) and _name_hash(entry.name) in wanted]
+
+
+def verify(store, scans, samples):
+    """
+    Checks recorded local paths against the directory scans in one pass over
+    the catalog. Returns missing records (recorded path not on disk) and
+    unreferenced files (on disk but not any file's current path). Found
+    files are marked in a per-directory bitmap next to the name hashes; only
+    directories holding unreferenced files are re-read to name samples.
+    """
+    local_roots = tuple(os.path.join(d, '') for _, _, d in TIER_DIRS)
+    dirs = {}
+    for scan in scans.values():
+        dirs.update(scan.get('dirs', {}))
+    seen = {directory: bytearray(len(hashes)) for directory, hashes in dirs.items()}
+
+    def mark(path):
+        directory, name = os.path.split(path)
+        hashes = dirs.get(directory)
+        if hashes is None:
+            return False
+        h = _name_hash(name)
+        i = bisect.bisect_left(hashes, h)
+        if i < len(hashes) and hashes[i] == h:
+            seen[directory][i] = 1
+            return True
+        return False
+
+    for path in store.get_cache_cold_paths():
+        mark(path)
+
+    missing = 0
+    missing_samples = []
+    for file_id, path, tier in store.iter_file_locations():
+        if not path or not path.startswith(local_roots):
+            continue  # S3 and out-of-tree paths are not checked against the local scan
+        if not mark(path):
+            missing += 1
+            if len(missing_samples) < samples:
+                # Only sampled records are probed for a copy elsewhere (by file_id, not by basename search)
+                _, found_at = tier_layout.resolve(
+                    file_id, tier_layout.original_name(path, file_id), [(t, d) for t, _, d in TIER_DIRS])
+                missing_samples.append({'file_id': file_id, 'path': path, 'tier': tier, 'found_at': found_at})
+
+    unreferenced = 0
+    unreferenced_samples = []
+    for directory, hashes in dirs.items():
+        flags = seen[directory]
+        left = len(flags) - sum(flags)
+        if not left:
+            continue
+        unreferenced += left
+        wanted = {h for h, flag in zip(hashes, flags) if not flag}
+        for name in _file_names(directory, wanted):
+            _add_sample(unreferenced_samples, os.path.join(directory, name), samples)
+    return {
+        'missing_records': missing,
+        'missing_samples': missing_samples,
+        'unreferenced_files': unreferenced,
+        'unreferenced_samples': unreferenced_samples,
+    }
+
+
+def collisions(scans, samples):
+    """
+    Basenames present in more than one tier root. Only flat-layout files
+    (directly in a tier root) can collide; the roots' sorted name hashes are
+    merged without building a set of names.
+    """
+    roots = {label: scan['dirs'].get(os.path.dirname(os.path.join(path, '')), array('Q'))
+             for _, label, path in TIER_DIRS for scan in (scans[label],) if 'dirs' in scan}
+    colliding = {}
+    run_hash, run_labels = None, []
+    for h, label in heapq.merge(*(zip(hashes, itertools.repeat(label)) for label, hashes in roots.items())):
+        if h != run_hash:
+            if len(run_labels) > 1:
+                colliding[run_hash] = run_labels
+            run_hash, run_labels = h, []
+        if label not in run_labels:
+            run_labels.append(label)
+    if len(run_labels) > 1:
+        colliding[run_hash] = run_labels
+
+    found = []
+    for _, label, path in TIER_DIRS:
+        # Each colliding name is read back from the first root it appears in
+        wanted = {h for h, labels in colliding.items() if labels[0] == label}
+        if wanted:
+            for name in _file_names(path, wanted):
+                _add_sample(found, (name, colliding[_name_hash(name)]), samples)
+    return {'count': len(colliding), 'samples': [{'name': n, 'tiers': t} for n, t in found]}
+
+
+def collect(db_path=DB, samples=DEFAULT_SAMPLES, now=None, verify_paths=True):
+    """
+    Builds the full inspection report as a JSON-serialisable dict. Without
+    `verify_paths`, the per-record DB vs filesystem check is skipped.
+    """
+    now = time.time() if now is None else now
+    scans = {label: scan_dir(path, samples) for _, label, path in TIER_DIRS}
+    report = {
+        'generated_at': now,
+        'directories': {
+            label: ({'path': path, 'files': scans[label]['files'], 'bytes': scans[label]['bytes'],
+                     'samples': scans[label]['samples']}
+                    if 'error' not in scans[label] else {'path': path, 'error': scans[label]['error']})
+            for _, label, path in TIER_DIRS
+        },
+        'collisions': collisions(scans, samples),
+    }
 
-def read_db(db_path):
     if not os.path.exists(db_path):
-        return 'DB not found'
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
+        report['db'] = {'error': 'DB not found'}
+        return report
+
+    # Keep stdout clean for --json: schema upgrade messages go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        store = MetadataStore(db_path)
     try:
-        cur.execute('SELECT file_id, current_path, current_tier, access_pattern_score FROM files;')
-        rows = cur.fetchall()
-    except Exception as e:
-        rows = f'Error querying DB: {e}'
-    conn.close()
-    return rows
+        with profiling.phase('db'):
+            summary = store.get_tier_summary(SCORE_BINS, [d * DAY for d in AGE_EDGES_DAYS], now=now)
+        report['db'] = {
+            'tiers': {tier: {k: info[k] for k in ('files', 'known_bytes', 'files_with_size')}
+                      for tier, info in sorted(summary.items())},
+            'score_bins': [f'{i / SCORE_BINS:.1f}-{(i + 1) / SCORE_BINS:.1f}' for i in range(SCORE_BINS)],
+            'score_histogram': {tier: info['scores'] for tier, info in sorted(summary.items())},
+            'age_buckets': _age_labels(),
+            'age_histogram': {tier: info['ages'] for tier, info in sorted(summary.items())},
+        }
+        if verify_paths:
+            with profiling.phase('reconcile'):
+                report['verification'] = verify(store, scans, samples)
+    finally:
+        store.close()
+    return report
 
-if __name__ == '__main__':
+
+def print_report(report):
     print('--- Files in tiers ---')
-    print('SSD count:', len(list_dir(SSD)) if isinstance(list_dir(SSD), list) else list_dir(SSD))
-    print('HDD count:', len(list_dir(HDD)) if isinstance(list_dir(HDD), list) else list_dir(HDD))
-    print('CLOUD count:', len(list_dir(CLOUD)) if isinstance(list_dir(CLOUD), list) else list_dir(CLOUD))
-    print('\nSSD sample:', list_dir(SSD)[:20])
-    print('HDD sample:', list_dir(HDD)[:20])
-    print('CLOUD sample:', list_dir(CLOUD)[:20])
-
-    print('\n--- DB records ---')
-    rows = read_db(DB)
-    pprint(rows)
-    # Build sets of names per tier to use for verification and collision detection
-    ssd = set(list_dir(SSD)) if isinstance(list_dir(SSD), list) else set()
-    hdd = set(list_dir(HDD)) if isinstance(list_dir(HDD), list) else set()
-    cloud = set(list_dir(CLOUD)) if isinstance(list_dir(CLOUD), list) else set()
-
-    # For each DB record, verify the physical file exists at the recorded path
-    print('\n--- DB vs FS verification ---')
-    issues = []
-    for r in rows:
-        try:
-            file_id, recorded_path, tier, score = r
-        except Exception:
-            continue
-        exists = os.path.exists(recorded_path)
-        basename = os.path.basename(recorded_path)
-        found_elsewhere = None
-        if not exists:
-            # look for basename in SSD/HDD/CLOUD sets
-            if basename in ssd:
-                found_elsewhere = ('SSD', os.path.join(SSD, basename))
-            elif basename in hdd:
-                found_elsewhere = ('HDD', os.path.join(HDD, basename))
-            elif basename in cloud:
-                found_elsewhere = ('CLOUD', os.path.join(CLOUD, basename))
-        if not exists and found_elsewhere:
-            issues.append((file_id, recorded_path, tier, found_elsewhere))
-        elif not exists and not found_elsewhere:
-            issues.append((file_id, recorded_path, tier, None))
-
-    print('Records with missing physical file or located elsewhere:')
-    pprint(issues)
-
-    # Detect filename collisions across tiers
+    for label, info in report['directories'].items():
+        if 'error' in info:
+            print(f'{label}: {info["error"]}')
+        else:
+            print(f'{label}: {info["files"]} files, {info["bytes"]} bytes')
+            print(f'  sample: {info["samples"]}')
+
+    db = report['db']
+    print('\n--- DB summary ---')
+    if 'error' in db:
+        print(db['error'])
+    else:
+        for tier, info in db['tiers'].items():
+            print(f'{tier}: {info["files"]} files, {info["known_bytes"]} bytes known '
+                  f'({info["files_with_size"]} files with a recorded size)')
+        print('\nPattern score histogram (' + ', '.join(db['score_bins']) + '):')
+        for tier, counts in db['score_histogram'].items():
+            print(f'  {tier}: {counts}')
+        print('\nTime since last access (' + ', '.join(db['age_buckets']) + '):')
+        for tier, counts in db['age_histogram'].items():
+            print(f'  {tier}: {counts}')
+
+    check = report.get('verification')
+    if check:
+        print('\n--- DB vs FS verification ---')
+        print(f'Records whose file is missing: {check["missing_records"]}')
+        for item in check['missing_samples']:
+            where = f' (found at {item["found_at"]})' if item['found_at'] else ''
+            print(f'  {item["file_id"]} ({item["tier"]}): {item["path"]}{where}')
+        print(f'Files on disk not referenced by the DB: {check["unreferenced_files"]}')
+        for path in check['unreferenced_samples']:
+            print(f'  {path}')
+
     print('\n--- Filename collisions ---')
-    ssd = set(list_dir(SSD)) if isinstance(list_dir(SSD), list) else set()
-    hdd = set(list_dir(HDD)) if isinstance(list_dir(HDD), list) else set()
-    cloud = set(list_dir(CLOUD)) if isinstance(list_dir(CLOUD), list) else set()
-    all_names = ssd | hdd | cloud
-    collisions = []
-    for name in all_names:
-        locations = []
-        if name in ssd:
-            locations.append('SSD')
-        if name in hdd:
-            locations.append('HDD')
-        if name in cloud:
-            locations.append('CLOUD')
-        if len(locations) > 1:
-            collisions.append((name, locations))
-    pprint(collisions)
\ No newline at end of file
+    print(f'Basenames present on more than one tier: {report["collisions"]["count"]}')
+    for item in report['collisions']['samples']:
+        print(f'  {item["name"]}: {item["tiers"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise tier directories and DB vs filesystem consistency')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON (for dashboards)')
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES, help='Example entries shown per section')
+    parser.add_argument('--db', type=str, default=DB, help='Metadata DB path')
+    parser.add_argument('--no-verify', action='store_true',
+                        help='Skip the per-record DB vs filesystem check (aggregates and scans only)')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    with profiling.session(args, 'inspect_state'):
+        report = collect(args.db, args.samples, verify_paths=not args.no_verify)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        print_report(report)
+
+if __name__ == '__main__':
+    main()
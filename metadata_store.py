@@ -1,6 +1,15 @@
+import os
 import sqlite3
 import time
 
+import metrics
+from access_window import HourlyWindow, WINDOW_HOURS
+
+# Bump when the schema changes and add the matching migration to _create_table
+SCHEMA_VERSION = 10
+# Mover activity rows older than this are pruned when a new run registers its paths
+MOVER_ACTIVITY_RETENTION_SECONDS = 24 * 60 * 60
+
 class MetadataStore:
     def insert_new_file(self, file_id, current_path, current_tier="Hot", backdate_seconds=0):
         """
@@ -21,15 +30,17 @@ class MetadataStore:
         """
         try:
             # The '?' placeholders prevent SQL injection and map to the tuple of values below
-            self.cursor.execute(sql_insert, (
-                file_id, 
-                current_path, 
-                current_tier, 
-                current_time, 
-                0,      # Initial access count is 0
-                current_time # Creation time is now
-            ))
-            self.conn.commit()
+            with metrics.span('store_query'):
+                self.cursor.execute(sql_insert, (
+                    file_id, 
+                    current_path, 
+                    current_tier, 
+                    current_time, 
+                    0,      # Initial access count is 0
+                    current_time # Creation time is now
+                ))
+            with metrics.span('store_commit'):
+                self.conn.commit()
             return True
         except sqlite3.IntegrityError:
             # Handles the case where we try to insert a file that already exists (file_id is PRIMARY KEY)
@@ -39,7 +50,16 @@ class MetadataStore:
             return False
     """
     Manages the SQLite database for tracking file metadata and access patterns.
+
+    If `db_name` is a directory, it holds a sharded catalog, and a
+    sharded_store.ShardedMetadataStore with the same API is returned instead.
     """
+    def __new__(cls, db_name='tiering_metadata.db'):
+        if cls is MetadataStore and os.path.isdir(db_name):
+            from sharded_store import ShardedMetadataStore
+            return ShardedMetadataStore(db_name)
+        return super().__new__(cls)
+
     def __init__(self, db_name='tiering_metadata.db'):
         # 1. Store the database file name
         self.db_name = db_name
@@ -63,7 +83,20 @@ class MetadataStore:
         """
         Creates the 'files' table with all the required fields.
         This defines what data we track for each file.
+
+        The schema check and migrations run only when the DB's `user_version`
+        stamp is older than SCHEMA_VERSION, so opening an up-to-date DB costs a
+        single PRAGMA read.
         """
+        try:
+            self.cursor.execute("PRAGMA user_version;")
+            version = self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error reading schema version: {e}")
+            return
+        if version >= SCHEMA_VERSION:
+            return
+
         sql_create_table = """
         CREATE TABLE IF NOT EXISTS files (
             file_id TEXT PRIMARY KEY,
@@ -76,21 +109,150 @@ class MetadataStore:
         );
         """
         try:
-            # Create table if missing
-            self.cursor.execute(sql_create_table)
-            self.conn.commit()
+            if version < 1:
+                # Create table if missing
+                self.cursor.execute(sql_create_table)
+
+                # Migration: ensure access_pattern_score column exists in older DBs
+                self.cursor.execute("PRAGMA table_info(files);")
+                cols = [row[1] for row in self.cursor.fetchall()]
+                if 'access_pattern_score' not in cols:
+                    try:
+                        self.cursor.execute("ALTER TABLE files ADD COLUMN access_pattern_score REAL DEFAULT 0.0;")
+                        print("Added missing column 'access_pattern_score' to files table.")
+                    except sqlite3.Error as e:
+                        print(f"Warning: could not add access_pattern_score column: {e}")
+
+            if version < 2:
+                # v2: hourly access-count ring buffers (see access_window.py) and
+                # per-source ingest watermarks for incremental log ingest
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS access_windows (
+                    file_id TEXT PRIMARY KEY,
+                    head_hour INTEGER NOT NULL,
+                    buckets BLOB NOT NULL
+                );
+                """)
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_state (
+                    source TEXT PRIMARY KEY,
+                    watermark REAL NOT NULL
+                );
+                """)
 
-            # Migration: ensure access_pattern_score column exists in older DBs
-            self.cursor.execute("PRAGMA table_info(files);")
-            cols = [row[1] for row in self.cursor.fetchall()]
-            if 'access_pattern_score' not in cols:
-                try:
-                    self.cursor.execute("ALTER TABLE files ADD COLUMN access_pattern_score REAL DEFAULT 0.0;")
-                    self.conn.commit()
-                    print("Added missing column 'access_pattern_score' to files table.")
-                except sqlite3.Error as e:
-                    print(f"Warning: could not add access_pattern_score column: {e}")
+            if version < 3:
+                # v3: co-access association table and prefetch log (see coaccess.py)
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS coaccess (
+                    file_a TEXT NOT NULL,
+                    file_b TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (file_a, file_b)
+                );
+                """)
+                self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_coaccess_b ON coaccess (file_b);")
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS coaccess_support (
+                    file_id TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL
+                );
+                """)
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS prefetches (
+                    file_id TEXT PRIMARY KEY,
+                    source_id TEXT,
+                    prefetched_at REAL NOT NULL,
+                    hit_at REAL
+                );
+                """)
 
+            if version < 4:
+                # v4: warm-tier read cache of recalled Cold objects (see warm_cache.py)
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS warm_cache (
+                    file_id TEXT PRIMARY KEY,
+                    cold_path TEXT NOT NULL,
+                    cached_path TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                """)
+                self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_warm_cache_lru ON warm_cache (last_access);")
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                """)
+
+            if version < 5:
+                # v5: content hashes and the deduplicated Cold object catalog
+                self.cursor.execute("PRAGMA table_info(files);")
+                cols = [row[1] for row in self.cursor.fetchall()]
+                for col, col_type in (('content_hash', 'TEXT'), ('size_bytes', 'INTEGER'),
+                                      ('cold_hash', 'TEXT'), ('local_name', 'TEXT')):
+                    if col not in cols:
+                        self.cursor.execute(f"ALTER TABLE files ADD COLUMN {col} {col_type};")
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS cold_objects (
+                    content_hash TEXT PRIMARY KEY,
+                    location TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL
+                );
+                """)
+
+            if version < 6:
+                # v6: codec and stored (compressed) size of Cold copies
+                self.cursor.execute("PRAGMA table_info(files);")
+                cols = [row[1] for row in self.cursor.fetchall()]
+                for col, col_type in (('cold_codec', 'TEXT'), ('stored_bytes', 'INTEGER')):
+                    if col not in cols:
+                        self.cursor.execute(f"ALTER TABLE files ADD COLUMN {col} {col_type};")
+                self.cursor.execute("PRAGMA table_info(cold_objects);")
+                cols = [row[1] for row in self.cursor.fetchall()]
+                for col, col_type in (('codec', 'TEXT'), ('stored_size', 'INTEGER')):
+                    if col not in cols:
+                        self.cursor.execute(f"ALTER TABLE cold_objects ADD COLUMN {col} {col_type};")
+
+            if version < 7:
+                # v7: path lookups for filesystem access capture (see access_ingest.py)
+                self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_path ON files (current_path);")
+
+            if version < 8:
+                # v8: logged accesses of files not yet in the catalog, retried by later ingests
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS pending_accesses (
+                    file_id TEXT NOT NULL,
+                    timestamp REAL NOT NULL
+                );
+                """)
+
+            if version < 9:
+                # v9: paths the mover is reading, so access capture can ignore its I/O
+                self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS mover_activity (
+                    path TEXT PRIMARY KEY,
+                    started REAL NOT NULL,
+                    ended REAL
+                );
+                """)
+
+            if version < 10:
+                # v10: when each co-access pair and support count was last updated, for aging them out
+                migrated_at = time.time()
+                for table in ('coaccess', 'coaccess_support'):
+                    self.cursor.execute(f"PRAGMA table_info({table});")
+                    if 'last_seen' not in [row[1] for row in self.cursor.fetchall()]:
+                        self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN last_seen REAL;")
+                    self.cursor.execute(f"UPDATE {table} SET last_seen = ? WHERE last_seen IS NULL;", (migrated_at,))
+
+            # PRAGMA does not accept bound parameters; SCHEMA_VERSION is a module constant
+            self.cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+            self.conn.commit()
             print("Metadata table checked/created successfully.")
         except sqlite3.Error as e:
             print(f"Error creating table: {e}")
@@ -103,25 +265,74 @@ class MetadataStore:
         # file_id (0), current_path (1), current_tier (2), last_accessed_timestamp (3),
         # access_count_last_7_days (4), access_pattern_score (5), created_timestamp (6)
         sql_select = "SELECT file_id, current_path, current_tier, last_accessed_timestamp, access_count_last_7_days, access_pattern_score, created_timestamp FROM files;"
-        self.cursor.execute(sql_select)
-        # Returns a list of tuples (rows)
-        return self.cursor.fetchall()
+        with metrics.span('store_query'):
+            self.cursor.execute(sql_select)
+            # Returns a list of tuples (rows)
+            return self.cursor.fetchall()
+
+    def iter_all_files(self, batch_size=10000):
+        """
+        Yields the get_all_files() rows ordered by file_id, fetched in batches
+        so that large catalogs are never held in memory at once.
+        """
+        # A private cursor keeps the scan independent of queries made while iterating
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT file_id, current_path, current_tier, last_accessed_timestamp, access_count_last_7_days, "
+            "access_pattern_score, created_timestamp FROM files ORDER BY file_id;")
+        try:
+            while True:
+                with metrics.span('store_query'):
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
     
+    def get_file(self, file_id):
+        """Returns one file record (same columns as get_all_files) or None."""
+        sql_select = "SELECT file_id, current_path, current_tier, last_accessed_timestamp, access_count_last_7_days, access_pattern_score, created_timestamp FROM files WHERE file_id = ?;"
+        with metrics.span('store_query'):
+            self.cursor.execute(sql_select, (file_id,))
+            return self.cursor.fetchone()
+
+    def touch_file(self, file_id, accessed_at=None):
+        """
+        Records a single read: bumps last_accessed_timestamp and the hourly window.
+        Used by on-demand recalls so a just-read file is not demoted again.
+        """
+        accessed_at = time.time() if accessed_at is None else accessed_at
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "UPDATE files SET last_accessed_timestamp = MAX(COALESCE(last_accessed_timestamp, 0), ?) WHERE file_id = ?;",
+                    (accessed_at, file_id))
+            self.record_accesses_many({file_id: [accessed_at]})  # commits
+            return True
+        except sqlite3.Error as e:
+            print(f"Error touching file {file_id}: {e}")
+            return False
+
     def update_file_stats(self, file_id, last_accessed_time, access_count, access_pattern_score=0.0):
         """
         Updates the access statistics for a specific file.
-        Used by the Pattern Analyzer.
+        Used by the Pattern Analyzer. The last access time only moves forward,
+        so a batch run never rolls back a newer time written by access ingest
+        or a recall.
         """
         sql_update = """
         UPDATE files 
-        SET last_accessed_timestamp = ?, 
+        SET last_accessed_timestamp = MAX(COALESCE(last_accessed_timestamp, 0), ?), 
             access_count_last_7_days = ?,
             access_pattern_score = ?
         WHERE file_id = ?;
         """
         try:
-            self.cursor.execute(sql_update, (last_accessed_time, access_count, access_pattern_score, file_id))
-            self.conn.commit()
+            with metrics.span('store_query'):
+                self.cursor.execute(sql_update, (last_accessed_time, access_count, access_pattern_score, file_id))
+            with metrics.span('store_commit'):
+                self.conn.commit()
             return True
         except sqlite3.Error as e:
             print(f"Error updating file stats for {file_id}: {e}")
@@ -138,13 +349,687 @@ class MetadataStore:
         WHERE file_id = ?;
         """
         try:
-            self.cursor.execute(sql_update, (new_path, new_tier, file_id))
-            self.conn.commit()
+            with metrics.span('store_query'):
+                self.cursor.execute(sql_update, (new_path, new_tier, file_id))
+            with metrics.span('store_commit'):
+                self.conn.commit()
             return True
         except sqlite3.Error as e:
             print(f"Error updating file location for {file_id}: {e}")
             return False
 
+    def update_file_locations_many(self, rows):
+        """
+        Updates [(file_id, new_path, new_tier)] in one transaction. Used for
+        bulk path rewrites such as tier layout migrations. Cached copies of
+        files on a local tier follow their file's new path.
+        """
+        try:
+            with metrics.span('store_query'):
+                self.cursor.executemany(
+                    "UPDATE files SET current_path = ?, current_tier = ? WHERE file_id = ?;",
+                    [(path, tier, file_id) for file_id, path, tier in rows])
+                self.cursor.executemany(
+                    "UPDATE warm_cache SET cached_path = ? WHERE file_id = ?;",
+                    [(path, file_id) for file_id, path, tier in rows if tier in ('Hot', 'Warm')])
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error updating file locations: {e}")
+            return False
+
+    def record_accesses_many(self, events_by_file):
+        """
+        Adds access events to the per-file hourly windows in one transaction.
+        Used by the Pattern Analyzer for incremental ingest.
+
+        :param events_by_file: dict of file_id -> iterable of access timestamps.
+        :return: Number of files whose window was updated.
+        """
+        if not events_by_file:
+            return 0
+        file_ids = list(events_by_file)
+        try:
+            windows = self._load_windows(file_ids)
+            rows = []
+            for file_id in file_ids:
+                window = windows.get(file_id) or HourlyWindow()
+                for ts in sorted(events_by_file[file_id]):
+                    window.add(ts)
+                rows.append((file_id, window.head_hour, window.to_blob()))
+            with metrics.span('store_query'):
+                self.cursor.executemany(
+                    "INSERT OR REPLACE INTO access_windows (file_id, head_hour, buckets) VALUES (?, ?, ?);", rows)
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Error recording accesses: {e}")
+            return 0
+
+    def record_access_counts_many(self, counts_by_file, last_access_by_file):
+        """
+        Applies pre-aggregated accesses in one transaction: adds the counts to
+        the hourly windows and advances last_accessed_timestamp. Used by the
+        access ingest service.
+
+        :param counts_by_file: dict of file_id -> {hour timestamp: number of accesses}.
+        :param last_access_by_file: dict of file_id -> latest access timestamp.
+        :return: Number of files whose window was updated.
+        """
+        if not counts_by_file:
+            return 0
+        file_ids = list(counts_by_file)
+        try:
+            windows = self._load_windows(file_ids)
+            rows = []
+            for file_id in file_ids:
+                window = windows.get(file_id) or HourlyWindow()
+                for ts, n in sorted(counts_by_file[file_id].items()):
+                    window.add(ts, n)
+                rows.append((file_id, window.head_hour, window.to_blob()))
+            with metrics.span('store_query'):
+                self.cursor.executemany(
+                    "INSERT OR REPLACE INTO access_windows (file_id, head_hour, buckets) VALUES (?, ?, ?);", rows)
+                self.cursor.executemany(
+                    "UPDATE files SET last_accessed_timestamp = MAX(COALESCE(last_accessed_timestamp, 0), ?) "
+                    "WHERE file_id = ?;", [(ts, file_id) for file_id, ts in last_access_by_file.items()])
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Error recording access counts: {e}")
+            return 0
+
+    def _load_windows(self, file_ids=None):
+        """Returns {file_id: HourlyWindow} for the given ids (or every file)."""
+        with metrics.span('store_query'):
+            if file_ids is None:
+                self.cursor.execute("SELECT file_id, head_hour, buckets FROM access_windows;")
+                rows = self.cursor.fetchall()
+            else:
+                rows = []
+                # Stay well below SQLite's bound-parameter limit
+                for i in range(0, len(file_ids), 500):
+                    chunk = file_ids[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    self.cursor.execute(
+                        f"SELECT file_id, head_hour, buckets FROM access_windows WHERE file_id IN ({placeholders});", chunk)
+                    rows.extend(self.cursor.fetchall())
+        return {file_id: HourlyWindow.from_blob(blob, head_hour) for file_id, head_hour, blob in rows}
+
+    def get_tiers(self, file_ids):
+        """Returns {file_id: current_tier} for the given ids; unknown ids are omitted."""
+        file_ids = list(file_ids)
+        tiers = {}
+        with metrics.span('store_query'):
+            for i in range(0, len(file_ids), 500):
+                chunk = file_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                self.cursor.execute(
+                    f"SELECT file_id, current_tier FROM files WHERE file_id IN ({placeholders});", chunk)
+                tiers.update(self.cursor.fetchall())
+        return tiers
+
+    def get_scores(self, file_ids):
+        """Returns {file_id: access_pattern_score} for the given ids; unknown ids are omitted."""
+        file_ids = list(file_ids)
+        scores = {}
+        with metrics.span('store_query'):
+            for i in range(0, len(file_ids), 500):
+                chunk = file_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                self.cursor.execute(
+                    f"SELECT file_id, access_pattern_score FROM files WHERE file_id IN ({placeholders});", chunk)
+                scores.update(self.cursor.fetchall())
+        return scores
+
+    def get_sizes(self, file_ids):
+        """
+        Returns {file_id: size in bytes} for the given ids whose size is known:
+        size_bytes, or the stored size of the Cold copy when only that was recorded.
+        """
+        file_ids = list(file_ids)
+        sizes = {}
+        with metrics.span('store_query'):
+            for i in range(0, len(file_ids), 500):
+                chunk = file_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                self.cursor.execute(
+                    f"SELECT file_id, COALESCE(size_bytes, stored_bytes) FROM files WHERE file_id IN ({placeholders}) "
+                    "AND COALESCE(size_bytes, stored_bytes) IS NOT NULL;", chunk)
+                sizes.update(self.cursor.fetchall())
+        return sizes
+
+    def get_file_ids_by_path(self, paths):
+        """Returns {current_path: file_id} for the given paths; unknown paths are omitted."""
+        paths = list(paths)
+        ids = {}
+        with metrics.span('store_query'):
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                self.cursor.execute(
+                    f"SELECT current_path, file_id FROM files WHERE current_path IN ({placeholders});", chunk)
+                ids.update(self.cursor.fetchall())
+        return ids
+
+    def get_window_counts(self, file_id, now=None):
+        """
+        Returns {'1h': n, '24h': n, '7d': n} access counts for one file.
+        Files without recorded accesses report zeros.
+        """
+        now = time.time() if now is None else now
+        window = self._load_windows([file_id]).get(file_id) or HourlyWindow()
+        return window.counts(now)
+
+    def get_access_counts(self, hours=WINDOW_HOURS, now=None, file_ids=None):
+        """
+        Returns {file_id: access count in the last `hours` hours} for every file
+        with a recorded window, or only for `file_ids` when given.
+        """
+        now = time.time() if now is None else now
+        windows = self._load_windows(None if file_ids is None else list(file_ids))
+        return {file_id: w.count(hours, now) for file_id, w in windows.items()}
+
+    def get_ingest_watermark(self, source):
+        """Returns the newest event timestamp already ingested from `source` (0.0 if none)."""
+        with metrics.span('store_query'):
+            self.cursor.execute("SELECT watermark FROM ingest_state WHERE source = ?;", (source,))
+            row = self.cursor.fetchone()
+        return row[0] if row else 0.0
+
+    def set_ingest_watermark(self, source, watermark):
+        """Stores the newest ingested event timestamp for `source`."""
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "INSERT OR REPLACE INTO ingest_state (source, watermark) VALUES (?, ?);", (source, watermark))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error updating ingest watermark for {source}: {e}")
+            return False
+
+    def get_pending_accesses(self):
+        """Returns {file_id: [timestamps]} of parked accesses to files that were not in the catalog."""
+        pending = {}
+        with metrics.span('store_query'):
+            self.cursor.execute("SELECT file_id, timestamp FROM pending_accesses;")
+            for file_id, ts in self.cursor.fetchall():
+                pending.setdefault(file_id, []).append(ts)
+        return pending
+
+    def set_pending_accesses(self, events_by_file):
+        """Replaces the parked accesses with `events_by_file` ({file_id: [timestamps]}) in one transaction."""
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute("DELETE FROM pending_accesses;")
+                self.cursor.executemany(
+                    "INSERT INTO pending_accesses (file_id, timestamp) VALUES (?, ?);",
+                    [(file_id, ts) for file_id, timestamps in events_by_file.items() for ts in timestamps])
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error storing pending accesses: {e}")
+            return False
+
+    def begin_mover_activity(self, paths, started=None):
+        """
+        Records that the mover reads `paths` from `started` on (until
+        end_mover_activity), so that access capture does not count its reads.
+        Rows older than MOVER_ACTIVITY_RETENTION_SECONDS are pruned.
+        """
+        started = time.time() if started is None else started
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute("DELETE FROM mover_activity WHERE started < ?;",
+                                    (started - MOVER_ACTIVITY_RETENTION_SECONDS,))
+                self.cursor.executemany(
+                    "INSERT OR REPLACE INTO mover_activity (path, started, ended) VALUES (?, ?, NULL);",
+                    [(path, started) for path in paths])
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error recording mover activity: {e}")
+            return False
+
+    def end_mover_activity(self, paths, ended=None):
+        """Closes the mover activity windows of `paths` opened by begin_mover_activity."""
+        ended = time.time() if ended is None else ended
+        try:
+            with metrics.span('store_query'):
+                self.cursor.executemany(
+                    "UPDATE mover_activity SET ended = ? WHERE path = ? AND ended IS NULL;",
+                    [(ended, path) for path in paths])
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error recording mover activity: {e}")
+            return False
+
+    def get_mover_activity(self, paths):
+        """Returns {path: (started, ended)} for the given paths; `ended` is None while the mover is active."""
+        paths = list(paths)
+        activity = {}
+        with metrics.span('store_query'):
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                self.cursor.execute(
+                    f"SELECT path, started, ended FROM mover_activity WHERE path IN ({placeholders});", chunk)
+                activity.update((path, (started, ended)) for path, started, ended in self.cursor.fetchall())
+        return activity
+
+    def add_coaccess_many(self, pair_counts, support_counts, max_pairs=None, max_age_seconds=None, now=None):
+        """
+        Adds mined co-access counts to the association table in one transaction
+        and stamps the touched rows with `now`. Pruning, when requested, first
+        drops pairs and support counts not updated within `max_age_seconds`.
+        Then it keeps only the `max_pairs` strongest pairs, and the support
+        counts of files in a kept pair or among the `max_pairs` largest.
+        """
+        now = time.time() if now is None else now
+        try:
+            with metrics.span('store_query'):
+                self.cursor.executemany(
+                    "INSERT INTO coaccess (file_a, file_b, count, last_seen) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(file_a, file_b) DO UPDATE SET count = count + excluded.count, "
+                    "last_seen = excluded.last_seen;",
+                    [(a, b, n, now) for (a, b), n in pair_counts.items()])
+                self.cursor.executemany(
+                    "INSERT INTO coaccess_support (file_id, count, last_seen) VALUES (?, ?, ?) "
+                    "ON CONFLICT(file_id) DO UPDATE SET count = count + excluded.count, "
+                    "last_seen = excluded.last_seen;",
+                    [(file_id, n, now) for file_id, n in support_counts.items()])
+                if max_age_seconds is not None:
+                    for table in ('coaccess', 'coaccess_support'):
+                        self.cursor.execute(f"DELETE FROM {table} WHERE last_seen < ?;", (now - max_age_seconds,))
+                if max_pairs is not None:
+                    # Among equally strong rows, the most recently seen are kept
+                    self.cursor.execute(
+                        "DELETE FROM coaccess WHERE rowid NOT IN "
+                        "(SELECT rowid FROM coaccess ORDER BY count DESC, last_seen DESC LIMIT ?);", (max_pairs,))
+                    self.cursor.execute(
+                        "DELETE FROM coaccess_support WHERE rowid NOT IN "
+                        "(SELECT rowid FROM coaccess_support ORDER BY count DESC, last_seen DESC LIMIT ?) "
+                        "AND file_id NOT IN (SELECT file_a FROM coaccess) "
+                        "AND file_id NOT IN (SELECT file_b FROM coaccess);", (max_pairs,))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error recording co-access pairs: {e}")
+            return False
+
+    def get_coaccess_peers(self, file_id, min_confidence=0.0, limit=None):
+        """
+        Returns [(peer_id, pair_count, confidence)] for files co-accessed with
+        `file_id`, strongest first. Confidence is pair_count / accesses of `file_id`.
+        """
+        with metrics.span('store_query'):
+            self.cursor.execute("SELECT count FROM coaccess_support WHERE file_id = ?;", (file_id,))
+            row = self.cursor.fetchone()
+            if not row or not row[0]:
+                return []
+            support = row[0]
+            self.cursor.execute(
+                "SELECT file_b, count FROM coaccess WHERE file_a = ? "
+                "UNION ALL SELECT file_a, count FROM coaccess WHERE file_b = ? "
+                "ORDER BY 2 DESC;", (file_id, file_id))
+            rows = self.cursor.fetchall()
+        peers = [(peer, n, n / support) for peer, n in rows if n / support >= min_confidence]
+        return peers[:limit] if limit is not None else peers
+
+    def record_prefetch(self, file_id, source_id, prefetched_at=None):
+        """Logs a prefetch so that a later access can be counted as a hit."""
+        prefetched_at = time.time() if prefetched_at is None else prefetched_at
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "INSERT OR REPLACE INTO prefetches (file_id, source_id, prefetched_at, hit_at) VALUES (?, ?, ?, NULL);",
+                    (file_id, source_id, prefetched_at))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error recording prefetch for {file_id}: {e}")
+            return False
+
+    def mark_prefetch_hits(self, events_by_file, horizon_seconds):
+        """
+        Marks prefetched files as hits when they were accessed within
+        `horizon_seconds` after being prefetched. Returns the number of new hits.
+        """
+        rows = []
+        for file_id, timestamps in events_by_file.items():
+            for ts in sorted(timestamps):
+                rows.append((ts, file_id, ts, ts, horizon_seconds))
+        if not rows:
+            return 0
+        try:
+            with metrics.span('store_query'):
+                before = self.conn.total_changes
+                self.cursor.executemany(
+                    "UPDATE prefetches SET hit_at = ? WHERE file_id = ? AND hit_at IS NULL "
+                    "AND prefetched_at <= ? AND ? - prefetched_at <= ?;", rows)
+                hits = self.conn.total_changes - before
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return hits
+        except sqlite3.Error as e:
+            print(f"Error marking prefetch hits: {e}")
+            return 0
+
+    def get_active_prefetches(self, horizon_seconds, now=None):
+        """Returns the ids of files prefetched within the last `horizon_seconds`."""
+        now = time.time() if now is None else now
+        with metrics.span('store_query'):
+            self.cursor.execute("SELECT file_id FROM prefetches WHERE prefetched_at >= ?;", (now - horizon_seconds,))
+            return {row[0] for row in self.cursor.fetchall()}
+
+    def get_prefetch_stats(self):
+        """Returns (prefetched, hits) over the whole prefetch log."""
+        with metrics.span('store_query'):
+            self.cursor.execute("SELECT COUNT(*), COUNT(hit_at) FROM prefetches;")
+            return self.cursor.fetchone()
+
+    def put_cache_entry(self, file_id, cold_path, cached_path, content_hash, size, mtime_ns, accessed_at=None):
+        """Records (or replaces) the cached local copy of a Cold object."""
+        accessed_at = time.time() if accessed_at is None else accessed_at
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "INSERT OR REPLACE INTO warm_cache (file_id, cold_path, cached_path, content_hash, size, mtime_ns, last_access, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 0);",
+                    (file_id, cold_path, cached_path, content_hash, size, mtime_ns, accessed_at))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error recording cache entry for {file_id}: {e}")
+            return False
+
+    def get_cache_entry(self, file_id):
+        """Returns (cold_path, cached_path, content_hash, size, mtime_ns, last_access, hits) or None."""
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                "SELECT cold_path, cached_path, content_hash, size, mtime_ns, last_access, hits FROM warm_cache WHERE file_id = ?;",
+                (file_id,))
+            return self.cursor.fetchone()
+
+    def update_cache_entry(self, file_id, cached_path=None, accessed_at=None, hit=False):
+        """Moves a cache entry to a new local path and/or marks it as recently used."""
+        try:
+            with metrics.span('store_query'):
+                if cached_path is not None:
+                    self.cursor.execute("UPDATE warm_cache SET cached_path = ? WHERE file_id = ?;", (cached_path, file_id))
+                if accessed_at is not None:
+                    self.cursor.execute(
+                        "UPDATE warm_cache SET last_access = ?, hits = hits + ? WHERE file_id = ?;",
+                        (accessed_at, 1 if hit else 0, file_id))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error updating cache entry for {file_id}: {e}")
+            return False
+
+    def delete_cache_entry(self, file_id):
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute("DELETE FROM warm_cache WHERE file_id = ?;", (file_id,))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error deleting cache entry for {file_id}: {e}")
+            return False
+
+    def get_cache_usage(self, tier='Warm'):
+        """Total bytes of cached copies whose file currently sits on `tier`."""
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                "SELECT COALESCE(SUM(c.size), 0) FROM warm_cache c JOIN files f ON f.file_id = c.file_id "
+                "WHERE f.current_tier = ?;", (tier,))
+            return self.cursor.fetchone()[0]
+
+    def get_cache_lru(self, limit, tier='Warm'):
+        """Least recently used cache entries on `tier`: [(file_id, cold_path, cached_path, size)]."""
+        return [row[:4] for row in self._cache_lru_rows(limit, tier)]
+
+    def _cache_lru_rows(self, limit, tier):
+        # Same as get_cache_lru plus last_access, which sharded stores merge on
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                "SELECT c.file_id, c.cold_path, c.cached_path, c.size, c.last_access FROM warm_cache c "
+                "JOIN files f ON f.file_id = c.file_id WHERE f.current_tier = ? "
+                "ORDER BY c.last_access ASC LIMIT ?;", (tier, limit))
+            return self.cursor.fetchall()
+
+    def bump_cache_stat(self, name, value=1):
+        """Adds `value` to the persistent cache counter `name`."""
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "INSERT INTO cache_stats (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;", (name, value))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error updating cache stat {name}: {e}")
+            return False
+
+    def get_cache_stats(self):
+        """Returns {name: value} for all persistent cache counters."""
+        with metrics.span('store_query'):
+            self.cursor.execute("SELECT name, value FROM cache_stats;")
+            return dict(self.cursor.fetchall())
+
+    def set_content_hashes_many(self, rows):
+        """Stores [(file_id, content_hash, size_bytes)] computed during moves."""
+        try:
+            with metrics.span('store_query'):
+                self.cursor.executemany(
+                    "UPDATE files SET content_hash = ?, size_bytes = ? WHERE file_id = ?;",
+                    [(h, size, file_id) for file_id, h, size in rows])
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error storing content hashes: {e}")
+            return False
+
+    def get_dedup_info(self, file_id):
+        """Returns (content_hash, size_bytes, cold_hash, local_name) for a file, or None."""
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                "SELECT content_hash, size_bytes, cold_hash, local_name FROM files WHERE file_id = ?;", (file_id,))
+            return self.cursor.fetchone()
+
+    def set_cold_ref(self, file_id, cold_hash, local_name=None):
+        """Records which Cold object a file references (and the name to restore on recall)."""
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "UPDATE files SET cold_hash = ?, local_name = COALESCE(?, local_name), "
+                    "content_hash = COALESCE(?, content_hash) WHERE file_id = ?;",
+                    (cold_hash, local_name, cold_hash, file_id))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error updating Cold reference for {file_id}: {e}")
+            return False
+
+    def get_cold_object(self, content_hash):
+        """Returns (location, size, refcount, codec, stored_size) of a stored Cold object, or None."""
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                "SELECT location, size, refcount, codec, COALESCE(stored_size, size) "
+                "FROM cold_objects WHERE content_hash = ?;", (content_hash,))
+            return self.cursor.fetchone()
+
+    def acquire_cold_object(self, content_hash, location, size, codec=None, stored_size=None):
+        """Adds one reference to a Cold object, creating its catalog row if needed."""
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "INSERT INTO cold_objects (content_hash, location, size, refcount, codec, stored_size) "
+                    "VALUES (?, ?, ?, 1, ?, ?) "
+                    "ON CONFLICT(content_hash) DO UPDATE SET refcount = refcount + 1;",
+                    (content_hash, location, size, codec, stored_size))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error acquiring Cold object {content_hash}: {e}")
+            return False
+
+    def acquire_existing_cold_object(self, content_hash):
+        """
+        Adds one reference to a Cold object only if it is already stored, in
+        one transaction. Returns its (location, size, refcount, codec,
+        stored_size) like get_cold_object, or None when it is not stored.
+        """
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "UPDATE cold_objects SET refcount = refcount + 1 WHERE content_hash = ?;", (content_hash,))
+                row = None
+                if self.cursor.rowcount:
+                    self.cursor.execute(
+                        "SELECT location, size, refcount, codec, COALESCE(stored_size, size) "
+                        "FROM cold_objects WHERE content_hash = ?;", (content_hash,))
+                    row = self.cursor.fetchone()
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return row
+        except sqlite3.Error as e:
+            print(f"Error acquiring Cold object {content_hash}: {e}")
+            return None
+
+    def release_cold_object(self, content_hash):
+        """
+        Drops one reference to a Cold object. Returns (location, remaining_refs),
+        or None if the object is unknown. The catalog row is removed at zero
+        references; deleting the stored bytes is left to the caller.
+        """
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "UPDATE cold_objects SET refcount = refcount - 1 WHERE content_hash = ?;", (content_hash,))
+                self.cursor.execute(
+                    "SELECT location, refcount FROM cold_objects WHERE content_hash = ?;", (content_hash,))
+                row = self.cursor.fetchone()
+                if row and row[1] <= 0:
+                    self.cursor.execute("DELETE FROM cold_objects WHERE content_hash = ?;", (content_hash,))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return row
+        except sqlite3.Error as e:
+            print(f"Error releasing Cold object {content_hash}: {e}")
+            return None
+
+    def get_dedup_stats(self):
+        """Returns (objects, stored_bytes, references, logical_bytes) for the Cold object catalog."""
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                "SELECT COUNT(*), COALESCE(SUM(COALESCE(stored_size, size)), 0), COALESCE(SUM(refcount), 0), "
+                "COALESCE(SUM(size * refcount), 0) FROM cold_objects;")
+            return self.cursor.fetchone()
+
+    def set_cold_compression(self, file_id, codec, stored_bytes, size_bytes=None):
+        """
+        Records how a file's Cold copy is stored: its codec (None for raw bytes)
+        and stored size, plus the raw size when it is known.
+        """
+        try:
+            with metrics.span('store_query'):
+                self.cursor.execute(
+                    "UPDATE files SET cold_codec = ?, stored_bytes = ?, size_bytes = COALESCE(?, size_bytes) "
+                    "WHERE file_id = ?;", (codec, stored_bytes, size_bytes, file_id))
+            with metrics.span('store_commit'):
+                self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error updating Cold compression for {file_id}: {e}")
+            return False
+
+    def get_cold_compression(self, file_id):
+        """Returns (codec, size_bytes, stored_bytes) for a file's Cold copy, or None."""
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                "SELECT cold_codec, size_bytes, stored_bytes FROM files WHERE file_id = ?;", (file_id,))
+            return self.cursor.fetchone()
+
+    def get_compression_stats(self):
+        """Returns (compressed_files, raw_bytes, stored_bytes) over files whose Cold copy is compressed."""
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), COALESCE(SUM(stored_bytes), 0) "
+                "FROM files WHERE current_tier = 'Cold' AND cold_codec IS NOT NULL;")
+            return self.cursor.fetchone()
+
+    def get_tier_summary(self, score_bins=10, age_edges_seconds=(), now=None):
+        """
+        Per-tier aggregates computed in a single pass over the files table:
+
+            {tier: {'files': n, 'known_bytes': n, 'files_with_size': n,
+                    'scores': [files per score bin], 'ages': [files per age bucket]}}
+
+        Scores fall into `score_bins` equal bins of [0, 1]. Age bucket i holds
+        files last accessed less than age_edges_seconds[i] ago (and at least
+        the previous edge ago). The next bucket holds older files, and the last
+        bucket holds files that were never accessed. Sizes are only known for
+        files that have been hashed or demoted.
+        """
+        now = time.time() if now is None else now
+        n = len(age_edges_seconds)
+        cases = ' '.join(f"WHEN ? - last_accessed_timestamp < ? THEN {i}" for i in range(n))
+        params = [v for edge in age_edges_seconds for v in (now, edge)] + [score_bins, score_bins - 1]
+        summary = {}
+        with metrics.span('store_query'):
+            self.cursor.execute(
+                f"SELECT current_tier, CASE WHEN last_accessed_timestamp IS NULL THEN {n + 1} {cases} ELSE {n} END, "
+                "MIN(MAX(CAST(COALESCE(access_pattern_score, 0) * ? AS INTEGER), 0), ?), "
+                "COUNT(*), COALESCE(SUM(size_bytes), 0), COUNT(size_bytes) FROM files GROUP BY 1, 2, 3;", params)
+            for tier, age, score, files, known, sized in self.cursor.fetchall():
+                entry = summary.setdefault(tier, {'files': 0, 'known_bytes': 0, 'files_with_size': 0,
+                                                  'scores': [0] * score_bins, 'ages': [0] * (n + 2)})
+                entry['files'] += files
+                entry['known_bytes'] += known
+                entry['files_with_size'] += sized
+                entry['scores'][score] += files
+                entry['ages'][age] += files
+        return summary
+
+    def iter_file_locations(self, batch_size=10000):
+        """Yields (file_id, current_path, current_tier) for every file, in storage order."""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT file_id, current_path, current_tier FROM files;")
+        try:
+            while True:
+                with metrics.span('store_query'):
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def get_cache_cold_paths(self):
+        """Cold copies kept by the warm cache (they are not any file's current path)."""
+        with metrics.span('store_query'):
+            self.cursor.execute("SELECT cold_path FROM warm_cache;")
+            return [row[0] for row in self.cursor.fetchall()]
+
     # The rest of the functions (insert_new_file, get_all_files, etc.)
     # will go here in the next sub-steps.
     
@@ -0,0 +1,193 @@
+"""
+Lightweight timing and metrics instrumentation for the tiering pipeline.
+
+Metrics are collected in-process as counters and histograms and can be
+exported to a Prometheus text file or a JSON file at the end of a run.
+Collection is disabled by default; while disabled, `span()` returns a shared
+no-op context manager and `inc()`/`observe()` return immediately, so the
+instrumented code paths pay only a global flag check.
+
+Typical use:
+
+    import metrics
+    metrics.enable()
+    with metrics.span('engine_plan'):
+        plan = generate_move_plan(store)
+    metrics.inc('moves_total')
+    metrics.write('metrics.prom')
+"""
+import json
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds (Prometheus style, +Inf is implicit)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+
+# Prefix applied to every exported metric name
+METRIC_PREFIX = "tiering_"
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+class _Histogram:
+    """Cumulative-bucket histogram with a running sum and count."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+
+    def to_dict(self):
+        cumulative = []
+        running = 0
+        for upper, n in zip(self.buckets, self.counts):
+            running += n
+            cumulative.append([upper, running])
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class _NullSpan:
+    """No-op span returned while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Times a block of code and records the duration in a histogram."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            inc(f"{self.name}_errors_total")
+        return False
+
+
+def enable():
+    """Turn on metric collection for this process."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Turn off metric collection (already collected values are kept)."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Drop all collected counters and histograms."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def inc(name, value=1):
+    """Increment counter `name` by `value`."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, value):
+    """Record `value` (seconds for timings) in histogram `name`."""
+    if not _enabled:
+        return
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = _Histogram()
+        hist.observe(value)
+
+
+def span(name):
+    """
+    Context manager timing the enclosed block into histogram `name`.
+    Exceptions propagate and additionally bump `<name>_errors_total`.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def snapshot():
+    """Returns a JSON-serialisable copy of all collected metrics."""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'histograms': {name: h.to_dict() for name, h in _histograms.items()},
+        }
+
+
+def _prom_name(name):
+    cleaned = ''.join(c if c.isalnum() or c == '_' else '_' for c in name)
+    return f"{METRIC_PREFIX}{cleaned}"
+
+
+def to_prometheus():
+    """Renders the collected metrics in the Prometheus text exposition format."""
+    snap = snapshot()
+    lines = []
+    for name, value in sorted(snap['counters'].items()):
+        metric = _prom_name(name)
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    for name, hist in sorted(snap['histograms'].items()):
+        metric = _prom_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for upper, cumulative in hist['buckets']:
+            lines.append(f'{metric}_bucket{{le="{upper}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {hist["count"]}')
+        lines.append(f"{metric}_sum {hist['sum']}")
+        lines.append(f"{metric}_count {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write(path):
+    """
+    Writes collected metrics to `path`. A `.json` extension selects JSON output;
+    anything else is written in the Prometheus text format (e.g. for the
+    node_exporter textfile collector).
+    """
+    if path.lower().endswith('.json'):
+        payload = json.dumps(snapshot(), indent=2, sort_keys=True)
+    else:
+        payload = to_prometheus()
+    # Write to a temp file first so a scraper never sees a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    print(f"Metrics written to {path}")
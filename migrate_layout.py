@@ -0,0 +1,112 @@
+"""
+Moves the files already on the Hot, Warm and local-cloud tiers into another
+tier layout (see tier_layout.py) and rewrites their recorded paths.
+
+Each file is renamed within its own tier directory, so every move is a cheap
+same-filesystem rename. The DB is updated in batches of --batch-size rows,
+one transaction per batch. Content-addressed Cold objects (objects/) and S3
+paths are left where they are. The migration can be interrupted and re-run:
+files already at their target path are skipped, and rows whose file was
+renamed but whose batch was never committed are repaired from the target.
+
+    python migrate_layout.py --to hashed --dry-run
+    python migrate_layout.py --to hashed --batch-size 1000
+
+Set "tier_layout" in config.json to the same layout afterwards so new moves
+use it too.
+"""
+import argparse
+import os
+
+import profiling
+import tier_layout
+import tiering_engine as te
+from metadata_store import MetadataStore
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _inside(path, root):
+    try:
+        return os.path.commonpath([os.path.abspath(path), os.path.abspath(root)]) == os.path.abspath(root)
+    except ValueError:
+        # Different drives on Windows, or a mix of absolute and relative paths
+        return False
+
+
+def migrate(store, roots, layout, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Moves the files recorded under `roots` ({tier: root directory}) into
+    `layout`. Returns (moved, missing): files moved (or, with `dry_run`, to be
+    moved) and recorded files found at neither their path nor their target.
+    A file found only at its target was moved by an interrupted run; its row
+    is updated and it counts as moved.
+    """
+    pending = []
+    moved = missing = 0
+    skip_dirs = [os.path.join(roots['Cold'], 'objects')] if 'Cold' in roots else []
+
+    def flush():
+        if pending and not dry_run:
+            with profiling.phase('db'):
+                store.update_file_locations_many(pending)
+        pending.clear()
+
+    for row in store.iter_all_files():
+        file_id, path, tier = row[:3]
+        root = roots.get(tier)
+        if root is None or not path or not _inside(path, root) or any(_inside(path, d) for d in skip_dirs):
+            continue
+        target = tier_layout.path_for(root, file_id, tier_layout.original_name(path, file_id), layout)
+        if target == path:
+            continue
+        if not os.path.exists(path):
+            if not os.path.exists(target):
+                missing += 1
+                continue
+        elif not dry_run:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        pending.append((file_id, target, tier))
+        moved += 1
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    return moved, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move tier files into a different directory layout')
+    parser.add_argument('--to', choices=tier_layout.LAYOUTS, default=tier_layout.HASHED, help='Target layout')
+    parser.add_argument('--db', type=str, default='tiering_metadata.db', help='Metadata DB path')
+    parser.add_argument('--config', type=str, help='Path to config.json to override defaults')
+    parser.add_argument('--use-local-cloud', type=str, choices=['true', 'false'], help='Override local cloud usage')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per DB transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the files that would move')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    use_local = None
+    if args.use_local_cloud is not None:
+        use_local = args.use_local_cloud.lower() == 'true'
+    te.load_config(args.config, use_local)
+
+    roots = {'Hot': te.HOT_TIER_PATH, 'Warm': te.WARM_TIER_PATH}
+    if te.USE_LOCAL_CLOUD:
+        roots['Cold'] = te.LOCAL_CLOUD_PATH
+
+    with profiling.session(args, 'migrate_layout'):
+        store = MetadataStore(args.db)
+        try:
+            moved, missing = migrate(store, roots, args.to, args.batch_size, args.dry_run)
+        finally:
+            store.close()
+
+    verb = 'Would move' if args.dry_run else 'Moved'
+    print(f"{verb} {moved} files into the '{args.to}' layout; {missing} recorded files were not found.")
+    if not args.dry_run and te.TIER_LAYOUT != args.to:
+        print(f"Set \"tier_layout\": \"{args.to}\" in config.json so that new moves use the same layout.")
+
+
+if __name__ == '__main__':
+    main()
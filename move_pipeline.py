@@ -0,0 +1,382 @@
+"""
+Staged, asyncio-based executor for move plans.
+
+`execute_move` handles one file at a time: copy, delete, update the DB, then
+the next file, so the source disk, the destination disk and the DB take turns
+being idle. This pipeline overlaps them:
+
+    read ──▶ write ──▶ verify ──▶ commit
+     (source tier)  (dest tier)    (batched DB update, then source delete)
+
+- read/write: each transfer streams HASH_CHUNK_SIZE chunks from a reader to a
+  writer through a bounded queue (`queue_depth` chunks), hashing the source
+  as it is read. The destination is written to a `.part` file.
+- verify: the `.part` file is re-read and its SHA-256 compared with the
+  source's before it is renamed into place.
+- commit: verified moves are committed in batches of up to `commit_batch`
+  rows (one transaction). Sources are deleted only after their batch is
+  committed, so a crash never leaves a DB row pointing at a deleted file.
+
+Blocking file I/O runs in one thread pool per tier. The size of each pool
+(`tier_workers`) bounds how many transfers may touch that tier at once, which
+gives back-pressure per tier. Transfers are queued per direction (e.g.
+Hot->Warm), each direction has its own worker tasks, and a worker takes the
+slots of both its tiers at once only when both are free. A saturated HDD
+therefore holds back only transfers that touch it, while SSD and cloud
+transfers keep flowing. The pipeline's metadata access runs on a single DB
+thread that owns its own MetadataStore. If a transfer's reader or writer
+fails, the other one is cancelled.
+
+With a `throttle` (throttle.MoverThrottle), each transfer takes one op from
+both of its tiers before it starts. Every chunk is charged to the tier it is
+read from or written to. Each transfer's latency, excluding throttle waits, is
+fed back to the adaptive controller.
+
+Moves that need the engine's Cold-tier features are run through
+`tiering_engine.execute_move`, concurrently with the pipelined transfers.
+This covers dedup, the warm cache, compression, S3, and Cold copies that are
+deduplicated or compressed. They run in `fallback_workers` lanes, and each
+lane has its own thread and MetadataStore, so uploads and throttle waits
+never hold up the batch commits. Moves are assigned to lanes by content hash
+(for recalls, the hash of the Cold object the file references): moves that
+touch the same Cold object run in order in one lane and never race on it.
+"""
+import asyncio
+import collections
+import hashlib
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import tier_layout
+import tiering_engine as te
+from content_hash import HASH_CHUNK_SIZE
+
+DEFAULT_TIER_WORKERS = {'Hot': 4, 'Warm': 2, 'Cold': 4}
+DEFAULT_QUEUE_DEPTH = 4
+DEFAULT_STAGE_QUEUE = 64
+DEFAULT_COMMIT_BATCH = 256
+DEFAULT_VERIFY_WORKERS = 2
+DEFAULT_FALLBACK_WORKERS = 4
+PART_SUFFIX = '.part'
+
+LOCAL_TIERS = ('Hot', 'Warm')
+
+
+class MovePipeline:
+    """Runs a move plan through the read/write/verify/commit stages."""
+
+    def __init__(self, store_factory, tier_workers=None, queue_depth=DEFAULT_QUEUE_DEPTH,
+                 stage_queue=DEFAULT_STAGE_QUEUE, commit_batch=DEFAULT_COMMIT_BATCH,
+                 verify_workers=DEFAULT_VERIFY_WORKERS, fallback_workers=DEFAULT_FALLBACK_WORKERS, throttle=None):
+        self.store_factory = store_factory
+        self.throttle = throttle
+        self.tier_workers = dict(DEFAULT_TIER_WORKERS, **(tier_workers or {}))
+        self.queue_depth = queue_depth
+        self.stage_queue = stage_queue
+        self.commit_batch = commit_batch
+        self.verify_workers = verify_workers
+        self.fallback_workers = max(1, fallback_workers)
+        self.stats = {'pipelined': 0, 'fallback': 0, 'moved': 0, 'failed': 0,
+                      'bytes': 0, 'commit_batches': 0, 'seconds': 0.0}
+
+    # --- Helpers ---
+    async def _in_db(self, fn, *args):
+        return await self._loop.run_in_executor(self._db, fn, *args)
+
+    async def _on_tier(self, tier, fn, *args):
+        return await self._loop.run_in_executor(self._pools[tier], fn, *args)
+
+    async def _acquire_slots(self, tiers):
+        """Takes one slot on every tier in `tiers` at once, never holding some while waiting for others."""
+        async with self._slots_changed:
+            await self._slots_changed.wait_for(lambda: all(self._free_slots[t] > 0 for t in tiers))
+            for tier in tiers:
+                self._free_slots[tier] -= 1
+
+    async def _release_slots(self, tiers):
+        async with self._slots_changed:
+            for tier in tiers:
+                self._free_slots[tier] += 1
+            self._slots_changed.notify_all()
+
+    async def _throttle(self, tiers, nbytes=0, ops=0):
+        """Waits for the rate limits of `tiers`. Returns the seconds waited."""
+        if self.throttle is None:
+            return 0.0
+        delay = self.throttle.reserve(tiers, nbytes, ops)
+        if delay > 0:
+            await asyncio.sleep(delay)
+            self.throttle.record_wait(tiers, delay)
+        return delay
+
+    def _fail(self, move, error):
+        print(f"  [FATAL MOVE ERROR] {move['from']} -> {move['to']} failed for {move['id']}: {error}")
+        self.stats['failed'] += 1
+        metrics.inc('moves_failed_total')
+
+    def _staged_destination(self, move):
+        """Destination path if the move can be pipelined, or None to use execute_move. Runs on the DB thread."""
+        file_id, src, dst = move['id'], move['from'], move['to']
+        roots = {'Hot': te.HOT_TIER_PATH, 'Warm': te.WARM_TIER_PATH}
+        file_name = tier_layout.original_name(move['path'], file_id)
+        if src in LOCAL_TIERS and dst in LOCAL_TIERS:
+            return te._tier_path(roots[dst], file_id, file_name)
+        if not te.USE_LOCAL_CLOUD or te.COMPRESSION_ENABLED:
+            return None
+        if src in LOCAL_TIERS and dst == 'Cold':
+            if te.DEDUP_ENABLED or (te.WARM_CACHE_ENABLED and self._store.get_cache_entry(file_id)):
+                return None
+            return te._tier_path(te.LOCAL_CLOUD_PATH, file_id, file_name)
+        if src == 'Cold' and dst in LOCAL_TIERS and not te.WARM_CACHE_ENABLED and os.path.exists(move['path']):
+            info = self._store.get_dedup_info(file_id)
+            stored = self._store.get_cold_compression(file_id)
+            if (info and info[2]) or (stored and stored[0]):
+                return None
+            return te._tier_path(roots[dst], file_id, file_name)
+        return None
+
+    def _classify(self, plan):
+        staged, fallback = [], []
+        for move in plan:
+            dest = self._staged_destination(move)
+            if dest:
+                staged.append((move, dest))
+            else:
+                fallback.append((move, self._lane_key(move)))
+        return staged, fallback
+
+    def _lane_key(self, move):
+        """The Cold object a fallback move acquires or releases, else its file_id."""
+        if move.get('content_hash'):
+            return move['content_hash']
+        info = self._store.get_dedup_info(move['id'])
+        return (info and (info[2] or info[0])) or move['id']
+
+    # --- Stage 1 + 2: read and write ---
+    async def _transfer(self, move, dest):
+        src_tier, dst_tier = move['from'], move['to']
+        part = dest + PART_SUFFIX
+        chunks = asyncio.Queue(maxsize=self.queue_depth)
+        digest = hashlib.sha256()
+        size = 0
+        waited = 0.0
+
+        async def reader(fin):
+            nonlocal size, waited
+            while True:
+                chunk = await self._on_tier(src_tier, fin.read, HASH_CHUNK_SIZE)
+                digest.update(chunk)
+                size += len(chunk)
+                waited += await self._throttle((src_tier,), len(chunk))
+                await chunks.put(chunk)
+                if not chunk:
+                    return
+
+        async def writer(fout):
+            nonlocal waited
+            while True:
+                chunk = await chunks.get()
+                if not chunk:
+                    return
+                waited += await self._throttle((dst_tier,), len(chunk))
+                await self._on_tier(dst_tier, fout.write, chunk)
+
+        waited += await self._throttle((src_tier, dst_tier), ops=1)
+        print(f"  [MOVING] {move['id']}: {src_tier} -> {dst_tier}...")
+        start = time.perf_counter()
+        try:
+            fin = await self._on_tier(src_tier, open, move['path'], 'rb')
+            try:
+                fout = await self._on_tier(dst_tier, open, part, 'wb')
+                try:
+                    with metrics.span('pipeline_transfer'):
+                        await self._run_peers(reader(fin), writer(fout))
+                finally:
+                    await self._on_tier(dst_tier, fout.close)
+            finally:
+                await self._on_tier(src_tier, fin.close)
+        except Exception as e:
+            await self._discard(dst_tier, part)
+            self._fail(move, e)
+            return
+        if self.throttle is not None:
+            self.throttle.observe((src_tier, dst_tier), max(0.0, time.perf_counter() - start - waited))
+        await self._verify_q.put((move, dest, digest.hexdigest(), size))
+
+    @staticmethod
+    async def _run_peers(*coros):
+        """Runs the coroutines together; if one fails, the others are cancelled and its error is raised."""
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for task in done:
+            task.result()
+
+    async def _discard(self, tier, path):
+        def remove():
+            if os.path.exists(path):
+                os.remove(path)
+        await self._on_tier(tier, remove)
+
+    # --- Stage 3: verify ---
+    def _hash_and_publish(self, part, dest, expected):
+        digest = hashlib.sha256()
+        with open(part, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != expected:
+            return False
+        os.replace(part, dest)
+        return True
+
+    async def _verify_worker(self):
+        while True:
+            item = await self._verify_q.get()
+            if item is None:
+                return
+            move, dest, expected, size = item
+            part = dest + PART_SUFFIX
+            try:
+                with metrics.span('pipeline_verify'):
+                    ok = await self._on_tier(move['to'], self._hash_and_publish, part, dest, expected)
+            except Exception as e:
+                ok, error = False, e
+            else:
+                error = 'checksum mismatch after copy'
+            if ok:
+                await self._commit_q.put((move, dest, size))
+            else:
+                await self._discard(move['to'], part)
+                self._fail(move, error)
+
+    # --- Stage 4: batched commit ---
+    def _commit_rows(self, batch):
+        rows = [(move['id'], dest, move['to']) for move, dest, _ in batch]
+        if not self._store.update_file_locations_many(rows):
+            return False
+        for move, dest, size in batch:
+            if move['to'] == 'Cold':
+                self._store.set_cold_compression(move['id'], None, size, size)
+            if move.get('prefetch_for'):
+                self._store.record_prefetch(move['id'], move['prefetch_for'])
+                metrics.inc('prefetch_moves_total')
+        return True
+
+    async def _commit(self, batch):
+        with metrics.span('pipeline_commit'):
+            committed = await self._in_db(self._commit_rows, batch)
+        self.stats['commit_batches'] += 1
+        if not committed:
+            # Sources are still in place: drop the new copies and report the moves as failed
+            for move, dest, _ in batch:
+                await self._discard(move['to'], dest)
+                self._fail(move, 'DB update failed')
+            return
+        deletions = [self._discard(move['from'], move['path']) for move, _, _ in batch]
+        await asyncio.gather(*deletions)
+        for move, dest, size in batch:
+            print(f"  [SUCCESS] Updated DB. New Location: {dest}")
+            self.stats['moved'] += 1
+            self.stats['bytes'] += size
+            metrics.inc('moves_total')
+            metrics.inc(f"moves_{move['from'].lower()}_to_{move['to'].lower()}_total")
+            metrics.inc('bytes_moved_total', size)
+
+    async def _commit_worker(self):
+        batch = []
+        while True:
+            item = await self._commit_q.get()
+            if item is not None:
+                batch.append(item)
+            # Flush full batches, and partial ones whenever nothing else is waiting
+            if batch and (item is None or len(batch) >= self.commit_batch or self._commit_q.empty()):
+                await self._commit(batch)
+                batch = []
+            if item is None:
+                return
+
+    # --- Stages 1 + 2 dispatch: one queue per direction ---
+    async def _transfer_worker(self, queue):
+        while queue:
+            move, dest = queue.popleft()
+            tiers = sorted({move['from'], move['to']})
+            await self._acquire_slots(tiers)
+            try:
+                await self._transfer(move, dest)
+            finally:
+                await self._release_slots(tiers)
+
+    # --- Fallback moves ---
+    async def _fallback_lane(self, moves):
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-fallback')
+        store = None
+        try:
+            store = await self._loop.run_in_executor(pool, self.store_factory)
+            for move in moves:
+                ok = await self._loop.run_in_executor(pool, te.execute_move, move, store)
+                self.stats['moved' if ok else 'failed'] += 1
+        finally:
+            if store is not None:
+                await self._loop.run_in_executor(pool, store.close)
+            pool.shutdown(wait=True)
+
+    async def _run_fallback(self, moves):
+        lanes = {}
+        for move, key in moves:
+            lanes.setdefault(zlib.crc32(key.encode('utf-8')) % self.fallback_workers, []).append(move)
+        await asyncio.gather(*(self._fallback_lane(lane) for lane in lanes.values()))
+
+    async def run(self, plan):
+        self._loop = asyncio.get_running_loop()
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-db')
+        self._pools = {tier: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f'pipeline-{tier.lower()}')
+                       for tier, n in self.tier_workers.items()}
+        self._verify_q = asyncio.Queue(maxsize=self.stage_queue)
+        self._commit_q = asyncio.Queue(maxsize=self.stage_queue)
+        self._store = None
+        start = time.perf_counter()
+        try:
+            self._store = await self._in_db(self.store_factory)
+            staged, fallback = await self._in_db(self._classify, plan)
+            self.stats['pipelined'], self.stats['fallback'] = len(staged), len(fallback)
+
+            verifiers = [asyncio.ensure_future(self._verify_worker()) for _ in range(self.verify_workers)]
+            committer = asyncio.ensure_future(self._commit_worker())
+            fallback_task = asyncio.ensure_future(self._run_fallback(fallback))
+
+            # A transfer holds a slot on both of its tiers, so each tier's pool bounds its own load
+            self._free_slots = dict(self.tier_workers)
+            self._slots_changed = asyncio.Condition()
+            directions = {}
+            for move, dest in staged:
+                directions.setdefault((move['from'], move['to']), collections.deque()).append((move, dest))
+            workers = [self._transfer_worker(queue) for (src, dst), queue in directions.items()
+                       for _ in range(min(self.tier_workers[src], self.tier_workers[dst]))]
+            await asyncio.gather(*workers)
+
+            for _ in verifiers:
+                await self._verify_q.put(None)
+            await asyncio.gather(*verifiers)
+            await self._commit_q.put(None)
+            await committer
+            await fallback_task
+        finally:
+            if self._store is not None:
+                await self._in_db(self._store.close)
+            self._db.shutdown(wait=True)
+            for pool in self._pools.values():
+                pool.shutdown(wait=True)
+        self.stats['seconds'] = time.perf_counter() - start
+        return self.stats
+
+
+def execute_plan(plan, store_factory, **options):
+    """Runs `plan` through a MovePipeline and returns its stats."""
+    return asyncio.run(MovePipeline(store_factory, **options).run(plan))
@@ -0,0 +1,184 @@
+"""
+Cost/benefit selection of planned moves under per-run budgets.
+
+Every candidate move gets a benefit and a cost:
+
+- heat = 0.5 * pattern_score + 0.5 * min(1, recent accesses / count_scale),
+  a 0-1 estimate of how hot the file is;
+- promotions (towards Hot) are worth `heat`, because each expected read is
+  served faster. Prefetches are worth PREFETCH_WEIGHT * heat;
+- demotions are worth (1 - heat) * (1 + size in GiB): colder and larger files
+  free more fast-tier space;
+- cost = size in GiB * egress_per_gib of the source tier
+  + the request price of the source and destination tiers.
+
+With a byte budget and/or a cost budget, moves are selected as a 0/1
+knapsack. Each move weighs the larger of its shares of the two budgets, so
+any selection whose weights sum to at most 1 fits both budgets.
+
+- `greedy` (default) takes moves in order of benefit per unit of weight and
+  skips those that no longer fit. If the single best move that fits on its
+  own is worth more than the greedy total, it is taken instead (this bounds
+  greedy to half the optimum). It is O(n log n) and handles millions of
+  candidates.
+- `optimal` runs the dynamic program with weights rounded up to
+  1/OPTIMAL_RESOLUTION of the budget. Rounding up keeps every result
+  feasible. It is used for up to OPTIMAL_MAX_ITEMS weighted candidates and
+  needs numpy. Otherwise greedy runs instead and the summary says so.
+
+Moves that weigh nothing (free and empty) are always kept, and so are
+capacity-forced demotions (`forced`), whose weight is taken off the budget
+first. Moves whose size is unknown are deferred while a budget is set, because
+a zero weight would let e.g. a huge S3 recall bypass it; the engine looks
+sizes up first and reports the moves that stay unsized. Prefetches whose
+recall was deferred are dropped.
+"""
+import math
+from operator import itemgetter
+
+import metrics
+
+GREEDY = 'greedy'
+OPTIMAL = 'optimal'
+SELECTORS = (GREEDY, OPTIMAL)
+
+GIB = float(1 << 30)
+TIER_RANK = {'Hot': 0, 'Warm': 1, 'Cold': 2}
+PREFETCH_WEIGHT = 0.5
+OPTIMAL_MAX_ITEMS = 5000
+OPTIMAL_RESOLUTION = 1000
+
+
+def heat(pattern_score, recent_count, count_scale):
+    return 0.5 * (pattern_score or 0.0) + 0.5 * min(1.0, (recent_count or 0) / float(count_scale or 1))
+
+
+def move_cost(move, size, prices):
+    source = prices.get(move['from'], {})
+    dest = prices.get(move['to'], {})
+    return (size / GIB * source.get('egress_per_gib', 0.0)
+            + source.get('request', 0.0) + dest.get('request', 0.0))
+
+
+def move_benefit(move, size, file_heat):
+    if TIER_RANK[move['to']] < TIER_RANK[move['from']]:
+        return file_heat * (PREFETCH_WEIGHT if move.get('prefetch_for') else 1.0)
+    return (1.0 - file_heat) * (1.0 + size / GIB)
+
+
+def evaluate(move, size, pattern_score, recent_count, prices, count_scale):
+    """Returns (benefit, cost) of one candidate move."""
+    return (move_benefit(move, size, heat(pattern_score, recent_count, count_scale)),
+            move_cost(move, size, prices))
+
+
+def _greedy(items):
+    """items: [(density, index, benefit, weight)] with weight > 0. Returns the chosen indexes."""
+    chosen, used, value = [], 0.0, 0.0
+    for _, index, benefit, weight in sorted(items, key=itemgetter(0), reverse=True):
+        if used + weight <= 1.0:
+            chosen.append(index)
+            used += weight
+            value += benefit
+    best = max((item for item in items if item[3] <= 1.0), key=itemgetter(2), default=None)
+    if best is not None and best[2] > value:
+        return [best[1]]
+    return chosen
+
+
+def _optimal(items):
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    items = [item for item in items if item[3] <= 1.0]
+    units = [math.ceil(item[3] * OPTIMAL_RESOLUTION - 1e-9) for item in items]
+    best = np.zeros(OPTIMAL_RESOLUTION + 1)
+    keep = np.zeros((len(items), OPTIMAL_RESOLUTION + 1), dtype=bool)
+    for i, (item, u) in enumerate(zip(items, units)):
+        candidate = np.full(OPTIMAL_RESOLUTION + 1, -np.inf)
+        candidate[u:] = best[:OPTIMAL_RESOLUTION + 1 - u] + item[2]
+        keep[i] = candidate > best
+        best = np.maximum(best, candidate)
+    chosen, capacity = [], OPTIMAL_RESOLUTION
+    for i in range(len(items) - 1, -1, -1):
+        if keep[i, capacity]:
+            chosen.append(items[i][1])
+            capacity -= units[i]
+    return chosen
+
+
+def select(moves, sizes, scores, counts, prices, max_bytes=None, max_cost=None,
+           method=GREEDY, count_scale=10):
+    """
+    Returns (selected moves in plan order, summary). `sizes`, `scores` and
+    `counts` map a file_id to its size in bytes, pattern score and recent
+    access count. Without budgets every move is kept. The summary lists every
+    move left out as (file_id, reason) in `deferred_moves`, and `method` is the
+    selector that actually ran (`optimal` falls back to greedy).
+    """
+    rows, items, keep_always, unknown = [], [], [], []
+    budgeted = bool(max_bytes or max_cost)
+    byte_share = 1.0 / max_bytes if max_bytes else 0.0
+    cost_share = 1.0 / max_cost if max_cost else 0.0
+    reserved = 0.0
+    with metrics.span('engine_budget_select'):
+        for index, move in enumerate(moves):
+            file_id = move['id']
+            size = sizes.get(file_id)
+            benefit, cost = evaluate(move, size or 0, scores.get(file_id), counts.get(file_id), prices, count_scale)
+            rows.append((benefit, size or 0, cost))
+            weight = max((size or 0) * byte_share, cost * cost_share)
+            if move.get('forced') or not budgeted:
+                keep_always.append(index)
+                reserved += weight
+            elif size is None:
+                unknown.append(index)
+            elif weight > 0:
+                items.append((benefit / weight, index, benefit, weight))
+            else:
+                keep_always.append(index)
+
+        chosen = []
+        used_method = method
+        capacity = 1.0 - reserved
+        if items and capacity > 0:
+            # Forced moves use their share of the budget first; the rest is rescaled to a budget of 1
+            items = [(density, index, benefit, weight / capacity) for density, index, benefit, weight in items]
+            chosen = None
+            if method == OPTIMAL and len(items) <= OPTIMAL_MAX_ITEMS:
+                chosen = _optimal(items)
+            if chosen is None:
+                chosen = _greedy(items)
+                used_method = GREEDY
+
+        keep = bytearray(len(moves))
+        for index in keep_always:
+            keep[index] = 1
+        for index in chosen:
+            keep[index] = 1
+        reasons = dict.fromkeys(unknown, 'unknown size')
+        kept_ids = {move['id'] for move, kept in zip(moves, keep) if kept and not move.get('prefetch_for')}
+        for index, move in enumerate(moves):
+            if keep[index] and move.get('prefetch_for') and move['prefetch_for'] not in kept_ids:
+                keep[index] = 0
+                reasons[index] = 'recall deferred'
+        selected = [move for move, kept in zip(moves, keep) if kept]
+        deferred_moves = [(move['id'], reasons.get(index, 'over budget'))
+                          for index, move in enumerate(moves) if not keep[index]]
+
+    kept_rows = [row for row, kept in zip(rows, keep) if kept]
+    summary = {
+        'candidates': len(moves),
+        'selected': len(selected),
+        'deferred': len(moves) - len(selected),
+        'unknown_size': len(unknown),
+        'deferred_moves': deferred_moves,
+        'method': used_method,
+        'bytes': sum(row[1] for row in kept_rows),
+        'cost': sum(row[2] for row in kept_rows),
+        'benefit': sum(row[0] for row in kept_rows),
+        'total_benefit': sum(row[0] for row in rows),
+    }
+    metrics.inc('budget_deferred_moves_total', summary['deferred'])
+    return selected, summary
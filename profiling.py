@@ -0,0 +1,166 @@
+"""
+Opt-in profiling hooks shared by every CLI entry point.
+
+Each CLI calls `add_arguments(parser)` and wraps its work in
+`with profiling.session(args, 'tiering_engine'):`. Nothing is profiled unless
+`--profile` is given:
+
+    --profile                  profile the whole run
+    --profile --profile-phase plan
+                               profile only the named phase (see PHASES)
+    --profile-dir DIR          where output is written (default: profiles/)
+
+A profiled run writes two files named after the run id
+(`<entry>-<YYYYmmdd-HHMMSS>-<pid>[-<phase>]`):
+
+- `.pstats`    cProfile statistics, readable with `python -m pstats` or snakeviz
+- `.collapsed` sampled stacks in collapsed format ("a;b;c count"), which
+               flamegraph.pl / speedscope / inferno render as a flamegraph
+
+Code marks phases with `with profiling.phase('plan'):`; outside a profiled
+session this is a no-op.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_DIR_DEFAULT = "profiles"
+
+# Interval between stack samples for the collapsed-stack output (seconds)
+SAMPLE_INTERVAL = 0.005
+
+# Phase names used across the entry points (for --help and validation)
+PHASES = ('capacity', 'plan', 'execute', 'parse', 'score', 'reconcile', 'scan', 'db')
+
+_session = None
+
+
+class _StackSampler(threading.Thread):
+    """Periodically samples one thread's Python stack and counts collapsed stacks."""
+
+    def __init__(self, target_thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.counts = {}
+        self._active = threading.Event()
+        self._stopped = threading.Event()
+
+    def resume(self):
+        self._active.set()
+
+    def pause(self):
+        self._active.clear()
+
+    def stop(self):
+        self._stopped.set()
+        self._active.set()  # wake the loop so it can exit
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._active.wait()
+            if self._stopped.is_set():
+                break
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            time.sleep(self.interval)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class _Session:
+    """Profiling state for a single CLI invocation."""
+
+    def __init__(self, entry_point, target_phase, out_dir):
+        self.target_phase = target_phase
+        self.out_dir = out_dir
+        self.run_id = f"{entry_point}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        if target_phase:
+            self.run_id += f"-{target_phase}"
+        # Imported here so that CLIs pay for cProfile only when --profile is used
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.sampler = _StackSampler(threading.get_ident())
+        self.depth = 0
+
+    def start(self):
+        # Nested starts (e.g. a phase inside a phase) keep a single profiler running
+        self.depth += 1
+        if self.depth == 1:
+            self.sampler.resume()
+            self.profiler.enable()
+
+    def stop(self):
+        self.depth -= 1
+        if self.depth == 0:
+            self.profiler.disable()
+            self.sampler.pause()
+
+    def write(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, self.run_id)
+        self.profiler.dump_stats(f"{base}.pstats")
+        self.sampler.write(f"{base}.collapsed")
+        print(f"Profile written: {base}.pstats, {base}.collapsed")
+        return base
+
+
+def add_arguments(parser):
+    """Adds the shared --profile options to an argparse parser."""
+    parser.add_argument('--profile', action='store_true', help='Profile this run (cProfile + sampled flamegraph stacks)')
+    parser.add_argument('--profile-phase', type=str, choices=PHASES, help='With --profile, only profile the named phase')
+    parser.add_argument('--profile-dir', type=str, default=PROFILE_DIR_DEFAULT, help='Directory for profile output')
+
+
+@contextmanager
+def session(args, entry_point):
+    """
+    Wraps a CLI run. With --profile and no --profile-phase the whole block is
+    profiled; with --profile-phase only matching `phase()` blocks are.
+    """
+    global _session
+    if not getattr(args, 'profile', False):
+        yield None
+        return
+
+    _session = _Session(entry_point, args.profile_phase, args.profile_dir)
+    _session.sampler.start()
+    whole_run = not args.profile_phase
+    if whole_run:
+        _session.start()
+    try:
+        yield _session
+    finally:
+        if whole_run:
+            _session.stop()
+        _session.sampler.stop()
+        # The sampler must be finished with `counts` before they are written out
+        _session.sampler.join()
+        _session.write()
+        _session = None
+
+
+@contextmanager
+def phase(name):
+    """Marks a named phase; profiled only when it matches --profile-phase."""
+    active = _session
+    if active is None or active.target_phase != name:
+        yield
+        return
+    active.start()
+    try:
+        yield
+    finally:
+        active.stop()
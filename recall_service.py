@@ -0,0 +1,190 @@
+"""
+On-demand recall service for Cold-tier files.
+
+Instead of waiting for the next batch `tiering_engine` run, a client asks the
+service to bring a Cold file back to the Warm tier and gets the local path
+once the transfer has finished:
+
+    GET /recall/<file_id>   -> {"file_id": ..., "path": ..., "tier": ..., "recalled": bool}
+    GET /health             -> {"status": "ok", "in_flight": n}
+
+Concurrent requests for the same file are coalesced onto one transfer, and
+transfers run on a bounded worker pool. Each recall reuses
+`tiering_engine.execute_move`, so the DB is updated exactly as a batch run
+would update it, and the read is recorded so the file is not demoted again
+straight away.
+
+Run with:
+
+    python recall_service.py --port 8765 --workers 4 --use-local-cloud true
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import metrics
+import tiering_engine as te
+import warm_cache
+from metadata_store import MetadataStore
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+
+
+class RecallError(Exception):
+    """Raised when a recall cannot be completed."""
+
+
+class UnknownFileError(RecallError):
+    """Raised when the requested file_id is not in the metadata store."""
+
+
+class RecallService:
+    """Coalescing, bounded-concurrency recall of Cold files to the Warm tier."""
+
+    def __init__(self, db_name='tiering_metadata.db', max_workers=DEFAULT_WORKERS):
+        self.db_name = db_name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recall')
+        self._lock = threading.Lock()
+        self._in_flight = {}  # file_id -> Future
+
+    def recall(self, file_id):
+        """
+        Starts (or joins) the recall of `file_id` and returns a Future whose
+        result is the dict reported to clients.
+        """
+        with self._lock:
+            future = self._in_flight.get(file_id)
+            if future is not None:
+                metrics.inc('recall_coalesced_total')
+                return future
+            future = self._executor.submit(self._do_recall, file_id)
+            self._in_flight[file_id] = future
+        future.add_done_callback(lambda _: self._forget(file_id))
+        return future
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def _forget(self, file_id):
+        with self._lock:
+            self._in_flight.pop(file_id, None)
+
+    def _do_recall(self, file_id):
+        # SQLite connections are per-thread, so each recall opens its own store
+        store = MetadataStore(self.db_name)
+        try:
+            record = store.get_file(file_id)
+            if record is None:
+                raise UnknownFileError(f"Unknown file_id: {file_id}")
+            _, current_path, current_tier = record[:3]
+
+            recalled = False
+            if current_tier == 'Cold':
+                move = {
+                    'id': file_id,
+                    'from': 'Cold',
+                    'to': 'Warm',
+                    'path': current_path,
+                    'reason': 'On-demand recall.'
+                }
+                start = time.perf_counter()
+                with metrics.span('recall_transfer'):
+                    ok = te.execute_move(move, store)
+                if not ok:
+                    metrics.inc('recall_failed_total')
+                    raise RecallError(f"Recall of {file_id} failed")
+                metrics.inc('recall_total')
+                print(f"  [RECALL] {file_id} recalled in {time.perf_counter() - start:.3f}s")
+                recalled = True
+                record = store.get_file(file_id)
+            else:
+                warm_cache.record_hit(store, file_id)
+
+            store.touch_file(file_id)
+            return {'file_id': file_id, 'path': record[1], 'tier': record[2], 'recalled': recalled}
+        finally:
+            store.close()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class _RecallHandler(BaseHTTPRequestHandler):
+    """HTTP front end; `self.server.recall_service` is the shared RecallService."""
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {'status': 'ok', 'in_flight': self.server.recall_service.in_flight()})
+            return
+        if not self.path.startswith('/recall/'):
+            self._send(404, {'error': 'not found'})
+            return
+
+        file_id = unquote(self.path[len('/recall/'):])
+        try:
+            result = self.server.recall_service.recall(file_id).result()
+        except UnknownFileError as e:
+            self._send(404, {'error': str(e)})
+        except Exception as e:
+            self._send(500, {'error': str(e)})
+        else:
+            self._send(200, result)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep request logging in the same style as the rest of the project
+        print(f"  [HTTP] {self.address_string()} {format % args}")
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Builds (but does not start) the HTTP server for `service`."""
+    server = ThreadingHTTPServer((host, port), _RecallHandler)
+    server.daemon_threads = True
+    server.recall_service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='On-demand recall service for Cold-tier files')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Maximum concurrent recalls')
+    parser.add_argument('--db', type=str, default='tiering_metadata.db', help='Metadata DB path')
+    parser.add_argument('--use-local-cloud', type=str, choices=['true', 'false'], help='Override local cloud usage')
+    parser.add_argument('--config', type=str, help='Path to config.json to override defaults')
+    args = parser.parse_args()
+
+    use_local = None
+    if args.use_local_cloud is not None:
+        use_local = args.use_local_cloud.lower() == 'true'
+    te.load_config(args.config, use_local)
+
+    service = RecallService(args.db, max_workers=args.workers)
+    server = make_server(service, args.host, args.port)
+    print(f"Recall service listening on http://{args.host}:{args.port} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        print("Recall service stopped.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
+import argparse
 import os
 import shutil
-import sqlite3
 from pprint import pprint
 
+import profiling
+import tier_layout
+from metadata_store import MetadataStore
+
 BASE = os.path.dirname(__file__)
 DB_PATH = os.path.join(BASE, 'tiering_metadata.db')
 BACKUP_PATH = os.path.join(BASE, 'tiering_metadata.db.bak')
@@ -10,16 +14,17 @@ SSD = os.path.join(BASE, 'mnt_ssd')
 HDD = os.path.join(BASE, 'mnt_hdd')
 CLOUD = os.path.join(BASE, 'mnt_cloud')
 
-def find_file_basename(basename):
-    # Search SSD, HDD, CLOUD for basename; return (tier, fullpath) or (None, None)
-    for tier, path in [('Hot', SSD), ('Warm', HDD), ('Cold', CLOUD)]:
-        candidate = os.path.join(path, basename)
-        if os.path.exists(candidate):
-            return tier, candidate
-    return None, None
+def find_file(file_id, name):
+    # Probe the file's flat and hashed layout paths on SSD, HDD, CLOUD; return (tier, fullpath) or (None, None)
+    return tier_layout.resolve(file_id, name, [('Hot', SSD), ('Warm', HDD), ('Cold', CLOUD)])
 
 def backup_db():
-    if os.path.exists(DB_PATH):
+    if os.path.isdir(DB_PATH):
+        # Sharded catalog (see sharded_store.py)
+        shutil.rmtree(BACKUP_PATH, ignore_errors=True)
+        shutil.copytree(DB_PATH, BACKUP_PATH)
+        print(f'Backed up DB to {BACKUP_PATH}')
+    elif os.path.exists(DB_PATH):
         shutil.copy2(DB_PATH, BACKUP_PATH)
         print(f'Backed up DB to {BACKUP_PATH}')
     else:
@@ -30,11 +35,8 @@ def reconcile():
         print('No DB found at', DB_PATH)
         return
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute('SELECT file_id, current_path, current_tier FROM files;')
-    rows = cur.fetchall()
+    store = MetadataStore(DB_PATH)
+    rows = [r[:3] for r in store.get_all_files()]
 
     updated = []
     not_found = []
@@ -44,22 +46,21 @@ def reconcile():
             # Path exists — nothing to do
             continue
 
-        basename = os.path.basename(recorded_path) if recorded_path else None
-        if not basename:
+        name = tier_layout.original_name(recorded_path, file_id) if recorded_path else None
+        if not name:
             not_found.append((file_id, recorded_path, 'no basename'))
             continue
 
-        tier, actual_path = find_file_basename(basename)
+        tier, actual_path = find_file(file_id, name)
         if tier and actual_path:
             # Update DB row to reflect actual file
             new_tier = 'Hot' if tier == 'Hot' else ('Warm' if tier == 'Warm' else 'Cold')
-            cur.execute('UPDATE files SET current_path = ?, current_tier = ? WHERE file_id = ?;', (actual_path, new_tier, file_id))
+            store.update_file_location(file_id, actual_path, new_tier)
             updated.append((file_id, recorded_path, actual_path, new_tier))
         else:
             not_found.append((file_id, recorded_path, None))
 
-    conn.commit()
-    conn.close()
+    store.close()
 
     print('\nReconciliation summary:')
     print(f' Updated rows: {len(updated)}')
@@ -67,8 +68,17 @@ def reconcile():
     print(f' Not found rows: {len(not_found)}')
     pprint(not_found)
 
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile DB paths with files found in the tier directories')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    with profiling.session(args, 'reconcile_db_fs'):
+        print('Starting safe DB <-> FS reconciliation')
+        backup_db()
+        with profiling.phase('reconcile'):
+            reconcile()
+        print('Reconciliation complete.')
+
 if __name__ == '__main__':
-    print('Starting safe DB <-> FS reconciliation')
-    backup_db()
-    reconcile()
-    print('Reconciliation complete.')
\ No newline at end of file
+    main()
@@ -0,0 +1,333 @@
+"""
+Sharded metadata catalog: `file_id`s hash-partitioned across N SQLite files.
+
+A sharded catalog is a directory instead of a single DB file:
+
+    tiering_metadata.db/
+        shards.json         {"shards": N}
+        shard-000.db ... shard-(N-1).db
+
+`MetadataStore(path)` returns a ShardedMetadataStore when `path` is such a
+directory, so the analyzer, the engine and the reconcilers use it unchanged.
+Every shard is an ordinary MetadataStore with the full schema. Data is routed
+as follows:
+
+- per-file rows (files, access windows, prefetches, cache entries) go to the
+  shard of their `file_id`;
+- Cold objects go to the shard of their content hash;
+- tables that are global to the catalog (co-access pairs, ingest watermarks,
+  pending accesses of not-yet-cataloged files, mover activity, cache
+  counters) live in shard 0.
+
+Batch writes are split per shard. With `write_workers` > 1, large batches are
+written by worker processes, one per shard file, so shards are written in
+parallel. Scans fan out to all shards: `iter_all_files` merges the shards'
+file_id-ordered cursors lazily, and aggregates are summed.
+
+Convert an existing single-file catalog with:
+
+    python sharded_store.py --db tiering_metadata.db --shards 8
+"""
+import argparse
+import functools
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from access_window import WINDOW_HOURS
+from metadata_store import MetadataStore
+
+MANIFEST_NAME = 'shards.json'
+# Batches smaller than this are written in-process even when workers are enabled
+PARALLEL_MIN_ITEMS = 10000
+
+# Per-file tables copied by split_database, with the column holding the routing key
+_ROUTED_TABLES = {
+    'files': 'file_id',
+    'access_windows': 'file_id',
+    'prefetches': 'file_id',
+    'warm_cache': 'file_id',
+    'cold_objects': 'content_hash',
+}
+_CATALOG_TABLES = ('coaccess', 'coaccess_support', 'ingest_state', 'cache_stats', 'pending_accesses',
+                   'mover_activity')
+
+
+def shard_index(key, num_shards):
+    """Stable shard number for a file_id or content hash (independent of PYTHONHASHSEED)."""
+    return zlib.crc32(key.encode('utf-8')) % num_shards
+
+
+def shard_path(db_dir, index):
+    return os.path.join(db_dir, f"shard-{index:03d}.db")
+
+
+def create(db_dir, num_shards, write_workers=0):
+    """
+    Creates an empty sharded catalog with `num_shards` shards. `write_workers`
+    is the default number of worker processes for large batch writes.
+    """
+    if num_shards < 1:
+        raise ValueError("num_shards must be at least 1")
+    os.makedirs(db_dir, exist_ok=True)
+    manifest = os.path.join(db_dir, MANIFEST_NAME)
+    if os.path.exists(manifest):
+        raise FileExistsError(f"Sharded catalog already exists at {db_dir}")
+    for i in range(num_shards):
+        MetadataStore(shard_path(db_dir, i)).close()
+    with open(manifest, 'w') as f:
+        json.dump({'shards': num_shards, 'write_workers': write_workers}, f)
+
+
+def _write_shard(path, method, batch):
+    # Runs in a worker process: each worker owns one shard file
+    store = MetadataStore(path)
+    try:
+        return getattr(store, method)(batch)
+    finally:
+        store.close()
+
+
+def _by_file(name):
+    """Method routed to the shard owning its first argument (a file_id or content hash)."""
+    @functools.wraps(getattr(MetadataStore, name))
+    def method(self, key, *args, **kwargs):
+        return getattr(self._shard_for(key), name)(key, *args, **kwargs)
+    return method
+
+
+def _on_catalog(name):
+    """Method served by shard 0, which holds the catalog-wide tables."""
+    @functools.wraps(getattr(MetadataStore, name))
+    def method(self, *args, **kwargs):
+        return getattr(self.shards[0], name)(*args, **kwargs)
+    return method
+
+
+def _add(a, b):
+    """Adds two aggregates: numbers, tuples/lists of numbers, or dicts of those."""
+    if isinstance(a, dict):
+        merged = dict(a)
+        for key, value in b.items():
+            merged[key] = _add(merged[key], value) if key in merged else value
+        return merged
+    if isinstance(a, (tuple, list)):
+        return type(a)(_add(x, y) for x, y in zip(a, b))
+    return a + b
+
+
+def _summed(name):
+    """Aggregate whose per-shard results are added up (see _add)."""
+    @functools.wraps(getattr(MetadataStore, name))
+    def method(self, *args, **kwargs):
+        return functools.reduce(_add, (getattr(shard, name)(*args, **kwargs) for shard in self.shards))
+    return method
+
+
+class ShardedMetadataStore:
+    """MetadataStore API over a directory of hash-partitioned SQLite shards."""
+
+    def __init__(self, db_name, write_workers=0):
+        with open(os.path.join(db_name, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        self.db_name = db_name
+        self.write_workers = write_workers or manifest.get('write_workers', 0)
+        self.shards = [MetadataStore(shard_path(db_name, i)) for i in range(manifest['shards'])]
+
+    def _shard_for(self, key):
+        return self.shards[shard_index(key, len(self.shards))]
+
+    def _partition(self, items, key=lambda item: item):
+        """Groups `items` by shard number."""
+        parts = {}
+        for item in items:
+            parts.setdefault(shard_index(key(item), len(self.shards)), []).append(item)
+        return parts
+
+    def _write_batches(self, method, batches, total):
+        """Applies `method` to each shard's batch, in worker processes for large batches."""
+        if self.write_workers > 1 and len(batches) > 1 and total >= PARALLEL_MIN_ITEMS:
+            with ProcessPoolExecutor(max_workers=min(self.write_workers, len(batches))) as pool:
+                futures = [pool.submit(_write_shard, shard_path(self.db_name, i), method, batch)
+                           for i, batch in batches.items()]
+                return [f.result() for f in futures]
+        return [getattr(self.shards[i], method)(batch) for i, batch in batches.items()]
+
+    # --- Per-file and per-object routing ---
+    insert_new_file = _by_file('insert_new_file')
+    get_file = _by_file('get_file')
+    touch_file = _by_file('touch_file')
+    update_file_stats = _by_file('update_file_stats')
+    update_file_location = _by_file('update_file_location')
+    get_window_counts = _by_file('get_window_counts')
+    record_prefetch = _by_file('record_prefetch')
+    put_cache_entry = _by_file('put_cache_entry')
+    get_cache_entry = _by_file('get_cache_entry')
+    update_cache_entry = _by_file('update_cache_entry')
+    delete_cache_entry = _by_file('delete_cache_entry')
+    get_dedup_info = _by_file('get_dedup_info')
+    set_cold_ref = _by_file('set_cold_ref')
+    set_cold_compression = _by_file('set_cold_compression')
+    get_cold_compression = _by_file('get_cold_compression')
+    get_cold_object = _by_file('get_cold_object')
+    acquire_cold_object = _by_file('acquire_cold_object')
+    acquire_existing_cold_object = _by_file('acquire_existing_cold_object')
+    release_cold_object = _by_file('release_cold_object')
+
+    # --- Catalog-wide tables (shard 0) ---
+    get_ingest_watermark = _on_catalog('get_ingest_watermark')
+    set_ingest_watermark = _on_catalog('set_ingest_watermark')
+    get_pending_accesses = _on_catalog('get_pending_accesses')
+    set_pending_accesses = _on_catalog('set_pending_accesses')
+    begin_mover_activity = _on_catalog('begin_mover_activity')
+    end_mover_activity = _on_catalog('end_mover_activity')
+    get_mover_activity = _on_catalog('get_mover_activity')
+    add_coaccess_many = _on_catalog('add_coaccess_many')
+    get_coaccess_peers = _on_catalog('get_coaccess_peers')
+    bump_cache_stat = _on_catalog('bump_cache_stat')
+    get_cache_stats = _on_catalog('get_cache_stats')
+
+    # --- Aggregates ---
+    get_prefetch_stats = _summed('get_prefetch_stats')
+    get_cache_usage = _summed('get_cache_usage')
+    get_dedup_stats = _summed('get_dedup_stats')
+    get_compression_stats = _summed('get_compression_stats')
+    get_tier_summary = _summed('get_tier_summary')
+
+    # --- Batches split per shard ---
+    def record_accesses_many(self, events_by_file):
+        batches = {i: {fid: events_by_file[fid] for fid in ids}
+                   for i, ids in self._partition(events_by_file).items()}
+        return sum(self._write_batches('record_accesses_many', batches, len(events_by_file)))
+
+    def record_access_counts_many(self, counts_by_file, last_access_by_file):
+        return sum(self.shards[i].record_access_counts_many(
+            {fid: counts_by_file[fid] for fid in ids},
+            {fid: last_access_by_file[fid] for fid in ids if fid in last_access_by_file})
+            for i, ids in self._partition(counts_by_file).items())
+
+    def set_content_hashes_many(self, rows):
+        rows = list(rows)
+        results = self._write_batches('set_content_hashes_many', self._partition(rows, key=lambda r: r[0]), len(rows))
+        return all(results)
+
+    def update_file_locations_many(self, rows):
+        rows = list(rows)
+        results = self._write_batches('update_file_locations_many', self._partition(rows, key=lambda r: r[0]), len(rows))
+        return all(results)
+
+    def mark_prefetch_hits(self, events_by_file, horizon_seconds):
+        return sum(self.shards[i].mark_prefetch_hits({fid: events_by_file[fid] for fid in ids}, horizon_seconds)
+                   for i, ids in self._partition(events_by_file).items())
+
+    def get_tiers(self, file_ids):
+        tiers = {}
+        for i, ids in self._partition(file_ids).items():
+            tiers.update(self.shards[i].get_tiers(ids))
+        return tiers
+
+    def get_scores(self, file_ids):
+        scores = {}
+        for i, ids in self._partition(file_ids).items():
+            scores.update(self.shards[i].get_scores(ids))
+        return scores
+
+    def get_sizes(self, file_ids):
+        sizes = {}
+        for i, ids in self._partition(file_ids).items():
+            sizes.update(self.shards[i].get_sizes(ids))
+        return sizes
+
+    # --- Fan-out scans ---
+    def get_all_files(self):
+        return list(self.iter_all_files())
+
+    def iter_all_files(self, batch_size=10000):
+        """Lazily merges the shards' file_id-ordered scans into one ordered stream."""
+        return heapq.merge(*(shard.iter_all_files(batch_size) for shard in self.shards), key=lambda row: row[0])
+
+    def iter_file_locations(self, batch_size=10000):
+        return itertools.chain.from_iterable(shard.iter_file_locations(batch_size) for shard in self.shards)
+
+    def get_access_counts(self, hours=WINDOW_HOURS, now=None, file_ids=None):
+        counts = {}
+        if file_ids is None:
+            for shard in self.shards:
+                counts.update(shard.get_access_counts(hours, now))
+        else:
+            for i, ids in self._partition(file_ids).items():
+                counts.update(self.shards[i].get_access_counts(hours, now, ids))
+        return counts
+
+    def get_file_ids_by_path(self, paths):
+        # Paths are not the routing key: every shard is asked
+        paths = list(paths)
+        ids = {}
+        for shard in self.shards:
+            ids.update(shard.get_file_ids_by_path(paths))
+        return ids
+
+    def get_active_prefetches(self, *args, **kwargs):
+        return set().union(*(shard.get_active_prefetches(*args, **kwargs) for shard in self.shards))
+
+    def get_cache_cold_paths(self):
+        return [path for shard in self.shards for path in shard.get_cache_cold_paths()]
+
+    def get_cache_lru(self, limit, tier='Warm'):
+        merged = heapq.merge(*(shard._cache_lru_rows(limit, tier) for shard in self.shards), key=lambda row: row[4])
+        return [row[:4] for _, row in zip(range(limit), merged)]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+def split_database(src_db, db_dir, num_shards, write_workers=0):
+    """
+    Copies a single-file catalog into a new sharded catalog at `db_dir`.
+    Each shard copies its rows with one INSERT ... SELECT over the attached source.
+    """
+    # Bring the source up to the current schema so its columns match the shards
+    MetadataStore(src_db).close()
+    create(db_dir, num_shards, write_workers)
+    for i in range(num_shards):
+        conn = sqlite3.connect(shard_path(db_dir, i))
+        conn.create_function('shard_of', 1, lambda key: shard_index(key, num_shards), deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS src;", (src_db,))
+        tables = dict(_ROUTED_TABLES)
+        if i == 0:
+            tables.update({name: None for name in _CATALOG_TABLES})
+        for table, key in tables.items():
+            cols = ', '.join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table});"))
+            where = f" WHERE shard_of({key}) = {i}" if key else ""
+            conn.execute(f"INSERT INTO main.{table} ({cols}) SELECT {cols} FROM src.{table}{where};")
+        conn.commit()
+        conn.execute("DETACH DATABASE src;")
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a single-file metadata DB into a sharded catalog')
+    parser.add_argument('--db', type=str, default='tiering_metadata.db', help='Metadata DB to convert in place')
+    parser.add_argument('--shards', type=int, default=8, help='Number of shards')
+    parser.add_argument('--write-workers', type=int, default=0,
+                        help='Worker processes for large batch writes (0 writes shards in-process)')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.db):
+        print(f"{args.db} is already a sharded catalog.")
+        return
+    staging = args.db + '.sharding'
+    backup = args.db + '.unsharded.bak'
+    split_database(args.db, staging, args.shards, args.write_workers)
+    os.replace(args.db, backup)
+    os.replace(staging, args.db)
+    print(f"Split {args.db} into {args.shards} shards (original kept at {backup}).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Approximate, memory-bounded summaries of the access log.
+
+Used by `analyzer.py --sketch` when exact per-file aggregation is too expensive
+(SpaceSaving and HyperLogLog; CountMinSketch is available but not kept there).
+All three structures use a fixed amount of memory regardless of how many
+distinct files appear in the log, and can be saved and reloaded between runs.
+
+Error bounds (N = total events added, n = true count of a key):
+
+- CountMinSketch(width, depth): estimates never undercount, and with
+  probability at least 1 - delta an estimate is at most n + eps * N, where
+  eps = e / width and delta = exp(-depth). `CountMinSketch.for_error(eps, delta)`
+  picks the dimensions. The defaults (eps=0.001, delta=0.01) use 2719 x 5
+  counters, about 106 KiB.
+- SpaceSaving(k): tracks at most k keys. Every key with n > N / k is
+  guaranteed to be tracked, and each reported count overestimates n by at most
+  its recorded `error` (itself at most N / k).
+- HyperLogLog(p): 2**p one-byte registers with a relative standard error of
+  about 1.04 / sqrt(2**p). The default p=12 uses 4 KiB for about 1.6% error.
+"""
+import base64
+import hashlib
+import heapq
+import json
+import math
+import os
+from array import array
+
+
+def _hash64_pair(key):
+    """Two independent 64-bit hashes of `key` from one blake2b digest."""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+class CountMinSketch:
+    """Count-min sketch for approximate per-key frequencies."""
+
+    def __init__(self, width=2719, depth=5, counts=None):
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else array('Q', [0] * (width * depth))
+        self.total = 0
+
+    @classmethod
+    def for_error(cls, eps=0.001, delta=0.01):
+        """Sizes the sketch so estimates are within eps * N with probability 1 - delta."""
+        return cls(width=math.ceil(math.e / eps), depth=math.ceil(math.log(1.0 / delta)))
+
+    def _indexes(self, key):
+        # Kirsch-Mitzenmacher: row i uses h1 + i * h2, which is as good as
+        # `depth` independent hashes for count-min purposes
+        h1, h2 = _hash64_pair(key)
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key, n=1):
+        for idx in self._indexes(key):
+            self.counts[idx] += n
+        self.total += n
+
+    def estimate(self, key):
+        return min(self.counts[idx] for idx in self._indexes(key))
+
+    def to_dict(self):
+        return {'width': self.width, 'depth': self.depth, 'total': self.total,
+                'counts': base64.b64encode(self.counts.tobytes()).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        counts = array('Q')
+        counts.frombytes(base64.b64decode(data['counts']))
+        sketch = cls(data['width'], data['depth'], counts)
+        sketch.total = data['total']
+        return sketch
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k heavy-hitter tracker. Each tracked key keeps its
+    estimated count, the maximum overestimate (`error`) and the newest
+    timestamp seen for it.
+    """
+
+    def __init__(self, k=1000):
+        self.k = k
+        self.entries = {}  # key -> [count, error, last_ts]
+        self._heap = []    # (count, key); stale entries are skipped lazily
+        self.total = 0
+
+    def add(self, key, n=1, ts=None):
+        self.total += n
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[0] += n
+        elif len(self.entries) < self.k:
+            entry = self.entries[key] = [n, 0, None]
+        else:
+            # Evict the current minimum; the newcomer inherits its count as error
+            min_count, min_key = self._pop_min()
+            del self.entries[min_key]
+            entry = self.entries[key] = [min_count + n, min_count, None]
+        if ts is not None and (entry[2] is None or ts > entry[2]):
+            entry[2] = ts
+        heapq.heappush(self._heap, (entry[0], key))
+        if len(self._heap) > 4 * self.k:
+            self._rebuild_heap()
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == count:
+                return count, key
+
+    def _rebuild_heap(self):
+        self._heap = [(entry[0], key) for key, entry in self.entries.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, n=None):
+        """Returns [(key, count, error, last_ts)] sorted by descending count."""
+        ranked = sorted(self.entries.items(), key=lambda kv: kv[1][0], reverse=True)
+        if n is not None:
+            ranked = ranked[:n]
+        return [(key, count, error, last_ts) for key, (count, error, last_ts) in ranked]
+
+    def to_dict(self):
+        return {'k': self.k, 'total': self.total, 'entries': self.entries}
+
+    @classmethod
+    def from_dict(cls, data):
+        tracker = cls(data['k'])
+        tracker.total = data['total']
+        tracker.entries = {key: list(entry) for key, entry in data['entries'].items()}
+        tracker._rebuild_heap()
+        return tracker
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count estimator."""
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, key):
+        h, _ = _hash64_pair(key)
+        idx = h >> (64 - self.p)
+        rest = (h << self.p) & ((1 << 64) - 1)
+        # Position of the first 1-bit in the remaining 64 - p bits
+        rank = (64 - self.p + 1) if rest == 0 else (64 - rest.bit_length() + 1)
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            return m * math.log(m / zeros)
+        return raw
+
+    def to_dict(self):
+        return {'p': self.p, 'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['p'], bytearray(base64.b64decode(data['registers'])))
+
+
+class SketchState:
+    """The sketches the analyzer keeps between runs, plus its ingest watermark."""
+
+    def __init__(self, top_k=1000, heavy_hitters=None, tier_hll=None, watermark=0.0):
+        self.heavy_hitters = heavy_hitters if heavy_hitters is not None else SpaceSaving(top_k)
+        self.tier_hll = tier_hll if tier_hll is not None else {}
+        self.watermark = watermark
+
+    def add(self, file_id, tier, ts):
+        self.heavy_hitters.add(file_id, ts=ts)
+        hll = self.tier_hll.get(tier)
+        if hll is None:
+            hll = self.tier_hll[tier] = HyperLogLog()
+        hll.add(file_id)
+        if ts > self.watermark:
+            self.watermark = ts
+
+    def distinct_files_per_tier(self):
+        return {tier: hll.estimate() for tier, hll in self.tier_hll.items()}
+
+    def save(self, path):
+        payload = {
+            'watermark': self.watermark,
+            'heavy_hitters': self.heavy_hitters.to_dict(),
+            'tier_hll': {tier: hll.to_dict() for tier, hll in self.tier_hll.items()},
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, top_k=1000):
+        """
+        Loads saved sketches, or returns an empty state if `path` does not
+        exist. A count-min sketch saved by older versions is ignored.
+        """
+        if not os.path.exists(path):
+            return cls(top_k=top_k)
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(
+            heavy_hitters=SpaceSaving.from_dict(data['heavy_hitters']),
+            tier_hll={tier: HyperLogLog.from_dict(h) for tier, h in data['tier_hll'].items()},
+            watermark=data['watermark'],
+        )
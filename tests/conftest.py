@@ -0,0 +1,43 @@
+import sys
+import os
+
+import pytest
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tier_layout
+import tiering_engine as te
+
+TIER_DIR_NAMES = ('mnt_ssd', 'mnt_hdd', 'mnt_cloud')
+
+# Engine settings used by tier_dirs unless a test overrides them
+ENGINE_DEFAULTS = {
+    'USE_LOCAL_CLOUD': True,
+    'DEDUP_ENABLED': False,
+    'WARM_CACHE_ENABLED': False,
+    'COMPRESSION_ENABLED': False,
+    'TIER_LAYOUT': tier_layout.FLAT,
+}
+
+
+@pytest.fixture
+def tier_dirs(tmp_path, monkeypatch):
+    """
+    Creates mnt_ssd, mnt_hdd and mnt_cloud under tmp_path and points the
+    engine at them. Keyword arguments override ENGINE_DEFAULTS or set other
+    engine globals, e.g. tier_dirs(DEDUP_ENABLED=True, WARM_CACHE_BYTES=100).
+    Returns {directory name: Path}.
+    """
+    def make(**settings):
+        dirs = {}
+        for name in TIER_DIR_NAMES:
+            dirs[name] = tmp_path / name
+            dirs[name].mkdir(exist_ok=True)
+        monkeypatch.setattr(te, 'HOT_TIER_PATH', str(dirs['mnt_ssd']))
+        monkeypatch.setattr(te, 'WARM_TIER_PATH', str(dirs['mnt_hdd']))
+        monkeypatch.setattr(te, 'LOCAL_CLOUD_PATH', str(dirs['mnt_cloud']))
+        for name, value in dict(ENGINE_DEFAULTS, **settings).items():
+            monkeypatch.setattr(te, name, value)
+        return dirs
+    return make
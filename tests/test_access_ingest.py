@@ -0,0 +1,187 @@
+import sys
+import os
+import select
+import threading
+import time
+
+import pytest
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import access_ingest
+from metadata_store import MetadataStore
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_parse_record():
+    assert access_ingest.parse_record('abc', now=5.0) == ('abc', 5.0)
+    assert access_ingest.parse_record('abc\t12.5\n') == ('abc', 12.5)
+    assert access_ingest.parse_record('  ') is None
+    assert access_ingest.parse_record('abc\tnot-a-time') is None
+
+
+def test_flush_updates_windows_last_access_and_coaccess():
+    store = MetadataStore(':memory:')
+    store.insert_new_file('a', '/mnt_hdd/a', current_tier='Warm', backdate_seconds=86400)
+    store.insert_new_file('b', '/mnt_hdd/b', current_tier='Warm', backdate_seconds=86400)
+    now = time.time()
+    agg = access_ingest.AccessAggregator()
+    for i in range(12):
+        agg.add('a', now - i)
+    agg.add('b', now - 3)
+    agg.add('unknown', now)
+
+    assert access_ingest.flush(agg, store) == 2
+    assert store.get_window_counts('a', now=now)['1h'] == 12
+    assert store.get_file('a')[3] == now
+    assert store.get_access_counts(now=now) == {'a': 12, 'b': 1}
+    assert store.get_coaccess_peers('b')
+    # Drained: nothing left to flush
+    assert access_ingest.flush(agg, store) == 0
+    store.close()
+
+
+def test_coaccess_pairs_span_flushes_and_pruning_is_periodic(monkeypatch):
+    store = MetadataStore(':memory:')
+    for fid in ('a', 'b', 'c'):
+        store.insert_new_file(fid, f'/mnt_hdd/{fid}', current_tier='Warm', backdate_seconds=86400)
+    prunes = []
+    add_coaccess_many = store.add_coaccess_many
+    monkeypatch.setattr(store, 'add_coaccess_many',
+                        lambda pairs, support, max_pairs=None, **kwargs: (
+                            prunes.append(max_pairs), add_coaccess_many(pairs, support, max_pairs, **kwargs))[1])
+    now = time.time()
+    agg = access_ingest.AccessAggregator()
+    agg.add('a', now - 10)
+    assert access_ingest.flush(agg, store) == 1
+    agg.add('b', now - 5)
+    assert access_ingest.flush(agg, store) == 1
+    agg.add('c', now + 1000)
+    assert access_ingest.flush(agg, store) == 1
+
+    # a and b met across a flush boundary, once; c is outside their window
+    assert [peer for peer, *_ in store.get_coaccess_peers('b')] == ['a']
+    assert not store.get_coaccess_peers('c')
+    assert list(agg.coaccess_tail) == [(now + 1000, 'c')]
+    # Only the first flush prunes the table; the others fall inside the interval
+    assert prunes == [access_ingest.coaccess.DEFAULT_MAX_PAIRS, None]
+    store.close()
+
+
+def test_path_events_resolve_by_path_and_drop_removed_files(tmp_path):
+    kept = tmp_path / 'kept.txt'
+    moved = tmp_path / 'moved.txt'
+    for path in (kept, moved):
+        path.write_text('x')
+    store = MetadataStore(':memory:')
+    store.insert_new_file('kept', str(kept), current_tier='Hot')
+    store.insert_new_file('moved', str(moved), current_tier='Hot')
+    now = time.time()
+    agg = access_ingest.AccessAggregator()
+    agg.add_path(str(kept), now)
+    agg.add_path(str(moved), now)
+    agg.forget_path(str(moved))
+
+    assert access_ingest.flush(agg, store) == 1
+    assert store.get_access_counts(now=now) == {'kept': 1}
+    store.close()
+
+
+def test_reads_by_the_mover_are_not_counted(tmp_path):
+    paths = {}
+    store = MetadataStore(':memory:')
+    for name in ('demoted', 'other'):
+        paths[name] = tmp_path / f'{name}.txt'
+        paths[name].write_text('x')
+        store.insert_new_file(name, str(paths[name]), current_tier='Warm', backdate_seconds=86400)
+    now = time.time()
+    store.begin_mover_activity([str(paths['demoted'])], started=now - 10)
+    agg = access_ingest.AccessAggregator()
+    # Pre-hash and copy reads of the demoted file, next to an application read of another file
+    agg.add_path(str(paths['demoted']), now - 9)
+    agg.add_path(str(paths['demoted']), now - 5)
+    agg.add_path(str(paths['other']), now - 8)
+
+    assert access_ingest.flush(agg, store) == 1
+    assert store.get_access_counts(now=now) == {'other': 1}
+    assert store.get_file('demoted')[3] < now - 3600
+    assert not store.get_coaccess_peers('other')
+
+    # Once the run has ended, reads count again
+    store.end_mover_activity([str(paths['demoted'])], ended=now - 4)
+    agg.add_path(str(paths['demoted']), now)
+    assert access_ingest.flush(agg, store) == 1
+    assert store.get_access_counts(now=now)['demoted'] == 1
+    store.close()
+
+
+def test_socket_service_flushes_in_batches(tmp_path):
+    db = str(tmp_path / 'meta.db')
+    store = MetadataStore(db)
+    store.insert_new_file('s1', '/mnt_hdd/s1', current_tier='Warm')
+    store.close()
+    sock = str(tmp_path / 'a.sock')
+
+    service = access_ingest.AccessIngestService(db, flush_interval=0.05, socket_path=sock)
+    service.start()
+    try:
+        now = time.time()
+        access_ingest.send_accesses(['s1', ('s1', now - 10), ('s1', now - 20)], sock)
+        _wait_for(lambda: service.files_updated >= 1)
+    finally:
+        service.stop()
+    assert not os.path.exists(sock)
+
+    store = MetadataStore(db)
+    assert store.get_access_counts() == {'s1': 3}
+    store.close()
+
+
+def test_fifo_source_reads_records(tmp_path):
+    fifo = str(tmp_path / 'access.fifo')
+    agg = access_ingest.AccessAggregator()
+    source = access_ingest.FifoSource(fifo, agg)
+    stop = threading.Event()
+    thread = threading.Thread(target=source.run, args=(stop,))
+    thread.start()
+    try:
+        with open(fifo, 'w') as f:
+            f.write('f1\t100.0\nf2\n')
+        _wait_for(lambda: agg.events == 2)
+    finally:
+        stop.set()
+        thread.join()
+        source.close()
+    by_id, _, _, _ = agg.drain()
+    assert by_id['f1'] == [100.0, {0.0: 1}] and 'f2' in by_id
+
+
+@pytest.mark.skipif(not access_ingest.inotify_available(), reason='inotify is Linux only')
+def test_inotify_counts_reads_and_watches_new_subdirectories(tmp_path):
+    agg = access_ingest.AccessAggregator()
+    source = access_ingest.InotifySource([str(tmp_path)], agg)
+
+    def pump():
+        ready, _, _ = select.select([source.fd], [], [], 2.0)
+        if ready:
+            source.handle(os.read(source.fd, 1 << 16))
+
+    try:
+        bucket = tmp_path / 'ab'
+        bucket.mkdir()
+        pump()
+        target = bucket / 'f.txt'
+        target.write_text('data')
+        target.read_text()
+        pump()
+        _, by_path, _, _ = agg.drain()
+        assert list(by_path) == [str(target)]
+    finally:
+        source.close()
@@ -0,0 +1,160 @@
+import sys
+import os
+import csv
+import time
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from access_window import HourlyWindow, WINDOW_HOURS, BUCKET_SECONDS
+from metadata_store import MetadataStore
+import analyzer
+import tiering_engine as te
+
+HOUR = BUCKET_SECONDS
+NOW = 1_700_000_000.0
+
+
+def test_window_counts_by_horizon():
+    w = HourlyWindow()
+    w.add(NOW)                   # current hour
+    w.add(NOW - 5 * HOUR)        # within 24h
+    w.add(NOW - 3 * 24 * HOUR)   # within 7d
+    w.add(NOW - 8 * 24 * HOUR)   # outside the window, dropped
+    assert w.counts(NOW) == {'1h': 1, '24h': 2, '7d': 3}
+
+
+def test_window_expires_as_time_advances():
+    w = HourlyWindow()
+    w.add(NOW, n=4)
+    w.add(NOW + 2 * 24 * HOUR)
+    assert w.count(WINDOW_HOURS, NOW + 2 * 24 * HOUR) == 5
+    # Seven days and an hour after the first event only the second is still in the window
+    later = NOW + 7 * 24 * HOUR + HOUR
+    assert w.count(WINDOW_HOURS, later) == 1
+    # A jump past the whole window clears every bucket
+    w.add(NOW + 30 * 24 * HOUR)
+    assert w.total == 1
+
+
+def test_blob_roundtrip():
+    w = HourlyWindow()
+    w.add(NOW, n=7)
+    restored = HourlyWindow.from_blob(w.to_blob(), w.head_hour)
+    assert restored.counts(NOW) == w.counts(NOW)
+    assert len(w.to_blob()) == WINDOW_HOURS * 4
+
+
+def test_store_records_and_queries_windows():
+    store = MetadataStore(':memory:')
+    store.insert_new_file('fileA', '/mnt_hdd/fileA', current_tier='Warm')
+    store.record_accesses_many({'fileA': [NOW - HOUR * 2, NOW]})
+    store.record_accesses_many({'fileA': [NOW]})
+    assert store.get_window_counts('fileA', now=NOW) == {'1h': 2, '24h': 3, '7d': 3}
+    assert store.get_access_counts(hours=1, now=NOW) == {'fileA': 2}
+    store.close()
+
+
+def test_analyzer_ingest_is_incremental(tmp_path, monkeypatch):
+    log_path = tmp_path / 'access_log.csv'
+    db_path = tmp_path / 'meta.db'
+    monkeypatch.setattr(analyzer, 'LOG_FILE', str(log_path))
+    monkeypatch.setattr(analyzer, 'DB_NAME', str(db_path))
+
+    store = MetadataStore(str(db_path))
+    store.insert_new_file('fileA', '/mnt_hdd/fileA', current_tier='Warm')
+    store.close()
+
+    now = time.time()
+    with open(log_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'file_id', 'access_type'])
+        # 3 recent events and 2 outside the 7-day window
+        for ts in (now - 60, now - 30, now - 10, now - 10 * 24 * HOUR, now - 9 * 24 * HOUR):
+            writer.writerow([ts, 'fileA', 'READ'])
+
+    analyzer.analyze_patterns()
+    analyzer.analyze_patterns()  # same log again must not double count
+
+    store = MetadataStore(str(db_path))
+    row = store.get_all_files()[0]
+    assert row[4] == 3
+    assert store.get_window_counts('fileA')['7d'] == 3
+    store.close()
+
+
+def test_analyzer_does_not_roll_back_newer_last_access(tmp_path, monkeypatch):
+    log_path = tmp_path / 'access_log.csv'
+    db_path = tmp_path / 'meta.db'
+    monkeypatch.setattr(analyzer, 'LOG_FILE', str(log_path))
+    monkeypatch.setattr(analyzer, 'DB_NAME', str(db_path))
+    now = time.time()
+    store = MetadataStore(str(db_path))
+    store.insert_new_file('fileA', '/mnt_hdd/fileA', current_tier='Warm', backdate_seconds=24 * HOUR)
+    # A newer access already recorded by the ingest service
+    store.record_access_counts_many({'fileA': {now - now % HOUR: 1}}, {'fileA': now})
+    store.close()
+
+    with open(log_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'file_id', 'access_type'])
+        writer.writerow([now - 2 * HOUR, 'fileA', 'READ'])
+
+    analyzer.analyze_patterns()
+    store = MetadataStore(str(db_path))
+    assert store.get_file('fileA')[3] == now
+    store.close()
+
+
+def test_analyzer_keeps_events_for_files_cataloged_later(tmp_path, monkeypatch):
+    log_path = tmp_path / 'access_log.csv'
+    db_path = tmp_path / 'meta.db'
+    monkeypatch.setattr(analyzer, 'LOG_FILE', str(log_path))
+    monkeypatch.setattr(analyzer, 'DB_NAME', str(db_path))
+    store = MetadataStore(str(db_path))
+    store.insert_new_file('known', '/mnt_hdd/known', current_tier='Warm')
+    store.close()
+
+    now = time.time()
+    with open(log_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'file_id', 'access_type'])
+        for ts, fid in ((now - 60, 'late'), (now - 30, 'late'), (now - 20, 'known'),
+                        (now - 10 * 24 * HOUR, 'stale')):
+            writer.writerow([ts, fid, 'READ'])
+
+    analyzer.analyze_patterns()
+    store = MetadataStore(str(db_path))
+    assert set(store.get_pending_accesses()) == {'late'}
+    store.insert_new_file('late', '/mnt_hdd/late', current_tier='Warm')
+    store.close()
+
+    analyzer.analyze_patterns()  # the watermark has passed these events already
+    store = MetadataStore(str(db_path))
+    assert store.get_window_counts('late')['7d'] == 2
+    assert store.get_window_counts('known')['7d'] == 1
+    assert store.get_pending_accesses() == {}
+    store.close()
+
+
+def test_warm_file_promoted_on_window_count(monkeypatch):
+    store = MetadataStore(':memory:')
+    store.insert_new_file('fileW', '/mnt_hdd/fileW', current_tier='Warm')
+    store.insert_new_file('fileH', '/mnt_ssd/fileH', current_tier='Hot')
+    store.update_file_stats('fileW', time.time(), 0, 0.0)
+    now = time.time()
+    store.record_accesses_many({'fileW': [now - i for i in range(te.PROMOTE_WARM_TO_HOT_COUNT + 1)],
+                                'fileH': [now]})
+    loaded = []
+    load_windows = MetadataStore._load_windows
+
+    def recording(self, file_ids=None):
+        loaded.append(file_ids)
+        return load_windows(self, file_ids)
+    monkeypatch.setattr(MetadataStore, '_load_windows', recording)
+
+    moves = {m['id']: m for m in te.generate_move_plan(store=store)}
+    assert moves['fileW']['to'] == 'Hot'
+    # Only the Warm files' windows are read, not the whole catalog's
+    assert loaded == [['fileW']]
+    store.close()
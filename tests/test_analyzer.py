@@ -1,6 +1,5 @@
 import sys
 import os
-import time
 
 # Ensure project root is on sys.path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
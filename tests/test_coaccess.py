@@ -0,0 +1,89 @@
+import sys
+import os
+import time
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import coaccess
+from metadata_store import MetadataStore
+import tiering_engine as te
+
+
+def test_mine_pairs_respects_window():
+    events = [(0, 'A'), (10, 'B'), (1000, 'C'), (1005, 'A')]
+    pairs, support = coaccess.mine_pairs(events, window_seconds=60)
+    assert pairs == {('A', 'B'): 1, ('A', 'C'): 1}
+    assert support == {'A': 2, 'B': 1, 'C': 1}
+
+
+def test_mine_pairs_is_bounded():
+    events = [(i, f"f{i}") for i in range(200)]
+    pairs, _ = coaccess.mine_pairs(events, window_seconds=1000, max_pairs=50)
+    assert len(pairs) <= 50
+
+
+def test_peers_confidence_and_prefetch_hits():
+    store = MetadataStore(':memory:')
+    store.add_coaccess_many({('A', 'B'): 3, ('A', 'C'): 1}, {'A': 4, 'B': 3, 'C': 1})
+    peers = store.get_coaccess_peers('A', min_confidence=0.5)
+    assert peers == [('B', 3, 0.75)]
+    # Looking up from the other side of the pair uses that file's support
+    assert store.get_coaccess_peers('C') == [('A', 1, 1.0)]
+
+    store.record_prefetch('B', 'A', prefetched_at=100.0)
+    store.record_prefetch('C', 'A', prefetched_at=100.0)
+    hits = store.mark_prefetch_hits({'B': [150.0], 'C': [50.0]}, horizon_seconds=3600)
+    assert hits == 1
+    assert store.get_prefetch_stats() == (2, 1)
+    store.close()
+
+
+def test_pruning_ages_out_stale_pairs_and_bounds_support():
+    store = MetadataStore(':memory:')
+    day = 24 * 60 * 60
+    store.add_coaccess_many({('A', 'B'): 50}, {'A': 50, 'B': 50}, now=0.0)
+    store.add_coaccess_many({('C', 'D'): 1}, {'C': 1, 'D': 1, 'E': 7, 'F': 2, 'X': 1}, now=40 * day)
+
+    # A-B is much stronger but has not been seen for 40 days
+    store.add_coaccess_many({('G', 'H'): 1}, {'G': 1, 'H': 1}, max_pairs=2, max_age_seconds=30 * day, now=40 * day)
+    assert store.get_coaccess_peers('A') == [] and store.get_coaccess_peers('B') == []
+    assert store.get_coaccess_peers('C') == [('D', 1, 1.0)] and store.get_coaccess_peers('G') == [('H', 1, 1.0)]
+    store.cursor.execute("SELECT file_id FROM coaccess_support ORDER BY file_id;")
+    # Files in a kept pair keep their support; of the rest only the 2 largest counts remain
+    assert [row[0] for row in store.cursor.fetchall()] == ['C', 'D', 'E', 'F', 'G', 'H']
+
+    store.add_coaccess_many({}, {}, max_pairs=1, max_age_seconds=30 * day, now=40 * day)
+    store.cursor.execute("SELECT file_id FROM coaccess_support ORDER BY file_id;")
+    assert len(store.cursor.fetchall()) == 3
+    store.close()
+
+
+def test_recall_queues_prefetch_after_the_plan():
+    store = MetadataStore(':memory:')
+    now = time.time()
+    store.insert_new_file('recalled', '/mnt_cloud/recalled', current_tier='Cold')
+    store.update_file_stats('recalled', now - 60, 1, 0.0)
+    store.insert_new_file('peer', '/mnt_cloud/peer', current_tier='Cold', backdate_seconds=90 * te.DAYS)
+    store.insert_new_file('weak_peer', '/mnt_cloud/weak_peer', current_tier='Cold', backdate_seconds=90 * te.DAYS)
+    store.add_coaccess_many({('peer', 'recalled'): 9, ('recalled', 'weak_peer'): 1},
+                            {'recalled': 10, 'peer': 9, 'weak_peer': 1})
+
+    plan = te.generate_move_plan(store=store)
+    ids = [m['id'] for m in plan]
+    assert ids == ['recalled', 'peer']
+    assert plan[1]['prefetch_for'] == 'recalled'
+    store.close()
+
+
+def test_unexpired_prefetch_is_not_demoted_back():
+    store = MetadataStore(':memory:')
+    now = time.time()
+    for name in ('fresh', 'expired'):
+        store.insert_new_file(name, f'/mnt_hdd/{name}', current_tier='Warm', backdate_seconds=90 * te.DAYS)
+    store.record_prefetch('fresh', 'recalled', prefetched_at=now - 60)
+    store.record_prefetch('expired', 'recalled', prefetched_at=now - 2 * coaccess.PREFETCH_HIT_HORIZON_SECONDS)
+
+    plan = te.generate_move_plan(store=store)
+    assert [(m['id'], m['to']) for m in plan] == [('expired', 'Cold')]
+    store.close()
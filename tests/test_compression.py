@@ -0,0 +1,110 @@
+import sys
+import os
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gzip
+import hashlib
+
+import pytest
+
+import compression
+from metadata_store import MetadataStore
+import tiering_engine as te
+
+LOG_TEXT = "2025-01-01 12:00:00 INFO request served in 12ms path=/api/items\n" * 500
+
+
+@pytest.fixture(autouse=True)
+def no_zstandard(monkeypatch):
+    # Keep results independent of whether the optional zstandard package is installed
+    monkeypatch.setattr(compression, '_zstd', lambda: None)
+    compression.reset_totals()
+
+
+def _setup(tier_dirs, files, dedup=False, cache=False):
+    dirs = tier_dirs(DEDUP_ENABLED=dedup, WARM_CACHE_ENABLED=cache, COMPRESSION_ENABLED=True)
+
+    store = MetadataStore(':memory:')
+    for file_name, data in files.items():
+        path = dirs['mnt_hdd'] / file_name
+        path.write_bytes(data)
+        store.insert_new_file(file_name, str(path), current_tier='Warm')
+    return dirs, store
+
+
+def _move(store, file_id, to_tier):
+    record = store.get_file(file_id)
+    return te.execute_move({'id': file_id, 'from': record[2], 'to': to_tier, 'path': record[1]}, store)
+
+
+def test_choose_codec_skips_compressed_data(tmp_path):
+    text = tmp_path / 'app.log'
+    text.write_text(LOG_TEXT)
+    noise = tmp_path / 'blob.bin'
+    noise.write_bytes(os.urandom(200000))
+    archive = tmp_path / 'old.gz'
+    archive.write_bytes(gzip.compress(LOG_TEXT.encode()))
+    disguised = tmp_path / 'old.dat'
+    disguised.write_bytes(gzip.compress(LOG_TEXT.encode()))
+
+    # zstd is preferred for logs but falls back to gzip without zstandard
+    assert compression.choose_codec(str(text)) == compression.GZIP
+    assert compression.choose_codec(str(text), {'.log': 'none'}) is None
+    assert compression.choose_codec(str(noise)) is None
+    assert compression.choose_codec(str(archive)) is None
+    assert compression.choose_codec(str(disguised)) is None
+    assert compression.totals()['files_skipped'] == 3
+
+
+def test_round_trip_reports_raw_digest(tmp_path):
+    src, packed, restored = tmp_path / 'a.log', tmp_path / 'a.log.gz', tmp_path / 'out.log'
+    src.write_text(LOG_TEXT)
+    raw_size, stored_size = compression.compress_file(str(src), str(packed), compression.GZIP)
+    assert raw_size == len(LOG_TEXT) and stored_size == packed.stat().st_size < raw_size / 5
+    assert gzip.decompress(packed.read_bytes()).decode() == LOG_TEXT
+
+    digest, size = compression.decompress_file(str(packed), str(restored), compression.GZIP)
+    assert restored.read_text() == LOG_TEXT
+    assert (digest, size) == (hashlib.sha256(LOG_TEXT.encode()).hexdigest(), len(LOG_TEXT))
+    assert compression.totals()['bytes_saved'] == raw_size - stored_size
+
+
+def test_demotion_compresses_and_recall_restores(tier_dirs):
+    dirs, store = _setup(tier_dirs, {'app.log': LOG_TEXT.encode(), 'blob.bin': os.urandom(50000)})
+    assert _move(store, 'app.log', 'Cold') and _move(store, 'blob.bin', 'Cold')
+
+    cold_path = dirs['mnt_cloud'] / 'app.log.gz'
+    assert store.get_file('app.log')[1] == str(cold_path)
+    codec, raw_size, stored_size = store.get_cold_compression('app.log')
+    assert codec == compression.GZIP and raw_size == len(LOG_TEXT) and stored_size == cold_path.stat().st_size
+    assert store.get_cold_compression('blob.bin') == (None, 50000, 50000)
+    assert store.get_compression_stats() == (1, raw_size, stored_size)
+
+    assert _move(store, 'app.log', 'Warm')
+    restored = dirs['mnt_hdd'] / 'app.log'
+    assert store.get_file('app.log')[1] == str(restored)
+    assert restored.read_text() == LOG_TEXT
+    assert not cold_path.exists()
+    assert store.get_cold_compression('app.log')[0] is None
+    store.close()
+
+
+def test_compressed_dedup_object_serves_cached_recall(tier_dirs):
+    data = LOG_TEXT.encode()
+    dirs, store = _setup(tier_dirs, {'a.log': data, 'b.log': data}, dedup=True, cache=True)
+    assert _move(store, 'a.log', 'Cold') and _move(store, 'b.log', 'Cold')
+    digest = hashlib.sha256(data).hexdigest()
+    location, size, refs, codec, stored_size = store.get_cold_object(digest)
+    assert location.endswith('.gz') and (size, refs, codec) == (len(data), 2, compression.GZIP)
+    assert store.get_dedup_stats()[1] == stored_size
+    assert store.get_cold_compression('b.log') == (compression.GZIP, len(data), stored_size)
+
+    assert _move(store, 'a.log', 'Warm')
+    assert (dirs['mnt_hdd'] / 'a.log').read_bytes() == data
+    # The cached copy is clean, so demoting it again reuses the compressed object
+    assert _move(store, 'a.log', 'Cold')
+    assert store.get_cache_stats()['clean_demotions'] == 1
+    assert store.get_file('a.log')[1] == location
+    store.close()
@@ -0,0 +1,87 @@
+import sys
+import os
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import hashlib
+
+import content_hash
+from metadata_store import MetadataStore
+import tiering_engine as te
+
+
+def _setup(tier_dirs, files, cache=False):
+    dirs = tier_dirs(DEDUP_ENABLED=True, WARM_CACHE_ENABLED=cache)
+
+    store = MetadataStore(':memory:')
+    for name, text in files.items():
+        path = dirs['mnt_hdd'] / f"{name}.txt"
+        path.write_text(text)
+        store.insert_new_file(name, str(path), current_tier='Warm')
+    return dirs, store
+
+
+def _move(store, file_id, to_tier):
+    record = store.get_file(file_id)
+    return te.execute_move({'id': file_id, 'from': record[2], 'to': to_tier, 'path': record[1]}, store)
+
+
+def _stored_objects(dirs):
+    return [p for p in (dirs['mnt_cloud'] / 'objects').rglob('*') if p.is_file()]
+
+
+def test_hash_files_parallel_matches_hashlib(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"f{i}"
+        path.write_bytes(os.urandom(1000 * i))
+        paths.append(str(path))
+    results = content_hash.hash_files_parallel(paths + [str(tmp_path / 'missing')], max_workers=3)
+    assert set(results) == set(paths)
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        assert results[path] == (hashlib.sha256(data).hexdigest(), len(data))
+
+
+def test_identical_files_share_one_cold_object(tier_dirs):
+    dirs, store = _setup(tier_dirs, {'a': 'same bytes', 'b': 'same bytes', 'c': 'other'})
+    for name in ('a', 'b', 'c'):
+        assert _move(store, name, 'Cold')
+
+    assert store.get_file('a')[1] == store.get_file('b')[1]
+    assert len(_stored_objects(dirs)) == 2
+    digest = hashlib.sha256(b'same bytes').hexdigest()
+    assert store.get_cold_object(digest)[2] == 2
+    assert store.get_dedup_stats() == (2, len('same bytes') + len('other'), 3, 2 * len('same bytes') + len('other'))
+    store.close()
+
+
+def test_recall_restores_name_and_last_release_deletes_object(tier_dirs):
+    dirs, store = _setup(tier_dirs, {'a': 'shared', 'b': 'shared'})
+    assert _move(store, 'a', 'Cold') and _move(store, 'b', 'Cold')
+    (obj,) = _stored_objects(dirs)
+
+    assert _move(store, 'a', 'Warm')
+    assert store.get_file('a')[1] == str(dirs['mnt_hdd'] / 'a.txt')
+    assert (dirs['mnt_hdd'] / 'a.txt').read_text() == 'shared'
+    # b still refers to the object
+    assert obj.exists()
+
+    assert _move(store, 'b', 'Warm')
+    assert (dirs['mnt_hdd'] / 'b.txt').read_text() == 'shared'
+    assert not obj.exists()
+    assert store.get_dedup_stats()[0] == 0
+    store.close()
+
+
+def test_prehash_attaches_and_stores_hashes(tier_dirs):
+    dirs, store = _setup(tier_dirs, {'a': 'alpha', 'b': 'beta'})
+    plan = [{'id': n, 'from': 'Warm', 'to': 'Cold', 'path': str(dirs['mnt_hdd'] / f"{n}.txt")} for n in ('a', 'b')]
+    te._prehash_moves(plan, store)
+
+    assert plan[0]['content_hash'] == hashlib.sha256(b'alpha').hexdigest()
+    assert plan[1]['size'] == len('beta')
+    assert store.get_dedup_info('a')[:2] == (plan[0]['content_hash'], len('alpha'))
+    store.close()
@@ -0,0 +1,69 @@
+import sys
+import os
+import sqlite3
+import subprocess
+
+# Ensure project root is on sys.path for imports
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from metadata_store import MetadataStore, SCHEMA_VERSION
+
+# Generous ceiling for the self time of our own modules plus stdlib deps; the
+# heavy third-party imports this guards against take hundreds of milliseconds.
+MAX_IMPORT_MICROSECONDS = 150000
+
+
+def _import_profile(module):
+    """Runs `python -X importtime -c 'import module'` and returns {module: cumulative_us}."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [p.strip() for p in line.replace('import time:', '|', 1).split('|')]
+        timings[name] = int(cumulative_us)
+    return timings
+
+
+def test_tiering_engine_import_skips_boto3():
+    timings = _import_profile('tiering_engine')
+    assert 'boto3' not in timings
+    assert 'pandas' not in timings
+    assert timings['tiering_engine'] < MAX_IMPORT_MICROSECONDS
+
+
+def test_analyzer_import_skips_pandas():
+    timings = _import_profile('analyzer')
+    assert 'pandas' not in timings
+    assert timings['analyzer'] < MAX_IMPORT_MICROSECONDS
+
+
+def test_schema_version_stamp_and_legacy_migration(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    # A pre-pattern-score DB without a user_version stamp
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE files (file_id TEXT PRIMARY KEY, current_path TEXT NOT NULL, current_tier TEXT NOT NULL, "
+                 "last_accessed_timestamp REAL, access_count_last_7_days INTEGER, created_timestamp REAL);")
+    conn.commit()
+    conn.close()
+
+    store = MetadataStore(db_path)
+    store.cursor.execute("PRAGMA user_version;")
+    assert store.cursor.fetchone()[0] == SCHEMA_VERSION
+    store.cursor.execute("PRAGMA table_info(files);")
+    assert 'access_pattern_score' in [row[1] for row in store.cursor.fetchall()]
+    store.close()
+
+    # Re-opening a stamped DB should not re-run the table_info migration check
+    statements = []
+    conn = sqlite3.connect(db_path)
+    conn.set_trace_callback(statements.append)
+    store = MetadataStore.__new__(MetadataStore)
+    store.db_name, store.conn, store.cursor = db_path, conn, conn.cursor()
+    store._create_table()
+    assert not any('table_info' in s for s in statements)
+    store.close()
@@ -0,0 +1,101 @@
+import sys
+import os
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import time
+
+import inspect_state
+import sharded_store
+import tier_layout
+from metadata_store import MetadataStore
+
+DAY = 24 * 60 * 60
+
+
+def _tree(tmp_path, monkeypatch):
+    dirs = {}
+    for attr, name in (('SSD', 'mnt_ssd'), ('HDD', 'mnt_hdd'), ('CLOUD', 'mnt_cloud')):
+        dirs[attr] = tmp_path / name
+        dirs[attr].mkdir()
+        monkeypatch.setattr(inspect_state, attr, str(dirs[attr]))
+    monkeypatch.setattr(inspect_state, 'TIER_DIRS', (
+        ('Hot', 'SSD', str(dirs['SSD'])), ('Warm', 'HDD', str(dirs['HDD'])), ('Cold', 'CLOUD', str(dirs['CLOUD']))))
+    return dirs
+
+
+def _populate(store, dirs, now):
+    # Two files on Hot (one in the hashed layout), one Warm, one missing, plus an orphan
+    (dirs['SSD'] / 'a.txt').write_text('aaaa')
+    hashed = tier_layout.path_for(str(dirs['SSD']), 'b', 'b.txt', tier_layout.HASHED)
+    os.makedirs(os.path.dirname(hashed))
+    with open(hashed, 'w') as f:
+        f.write('bb')
+    (dirs['HDD'] / 'c.txt').write_text('c')
+    (dirs['HDD'] / 'a.txt').write_text('orphan with a colliding name')
+    store.insert_new_file('a', str(dirs['SSD'] / 'a.txt'))
+    store.insert_new_file('b', hashed, backdate_seconds=10 * DAY)
+    store.insert_new_file('c', str(dirs['HDD'] / 'c.txt'), current_tier='Warm', backdate_seconds=100 * DAY)
+    store.insert_new_file('gone', str(dirs['HDD'] / 'gone.txt'), current_tier='Warm')
+    store.update_file_stats('a', now, 5, 0.95)
+    store.set_content_hashes_many([('a', 'h', 4)])
+
+
+def _check(report):
+    assert report['directories']['SSD']['files'] == 2
+    assert report['directories']['SSD']['bytes'] == 6
+    db = report['db']
+    assert db['tiers']['Hot'] == {'files': 2, 'known_bytes': 4, 'files_with_size': 1}
+    assert db['tiers']['Warm']['files'] == 2
+    assert db['score_histogram']['Hot'][9] == 1 and sum(db['score_histogram']['Hot']) == 2
+    # Ages: a (just accessed), b (10 days), c (100 days), gone (just created)
+    assert db['age_histogram']['Hot'][:3] == [1, 0, 1]
+    assert db['age_histogram']['Warm'][0] == 1 and db['age_histogram']['Warm'][4] == 1
+    check = report['verification']
+    assert check['missing_records'] == 1 and check['missing_samples'][0]['file_id'] == 'gone'
+    assert check['unreferenced_files'] == 1 and check['unreferenced_samples'][0].endswith('a.txt')
+    assert report['collisions']['count'] == 1
+    json.dumps(report)
+
+
+def test_report_from_sql_aggregates_and_single_scan(tmp_path, monkeypatch):
+    dirs = _tree(tmp_path, monkeypatch)
+    db_path = str(tmp_path / 'meta.db')
+    now = time.time()
+    store = MetadataStore(db_path)
+    _populate(store, dirs, now)
+    store.close()
+
+    _check(inspect_state.collect(db_path, samples=5, now=now))
+
+
+def test_report_on_sharded_catalog(tmp_path, monkeypatch, capsys):
+    dirs = _tree(tmp_path, monkeypatch)
+    db_dir = str(tmp_path / 'catalog.db')
+    sharded_store.create(db_dir, 3)
+    now = time.time()
+    store = MetadataStore(db_dir)
+    _populate(store, dirs, now)
+    store.close()
+
+    _check(inspect_state.collect(db_dir, samples=5, now=now))
+    monkeypatch.setattr(sys, 'argv', ['inspect_state.py', '--json', '--db', db_dir])
+    capsys.readouterr()
+    inspect_state.main()
+    assert json.loads(capsys.readouterr().out)['db']['tiers']['Hot']['files'] == 2
+
+
+def test_scan_keeps_name_hashes_not_paths(tmp_path, monkeypatch):
+    dirs = _tree(tmp_path, monkeypatch)
+    for i in range(50):
+        (dirs['HDD'] / f'f{i:02d}.txt').write_text('x')
+    (dirs['CLOUD'] / 'f07.txt').write_text('copy')
+
+    scan = inspect_state.scan_dir(str(dirs['HDD']), samples=3)
+    assert scan['files'] == 50 and scan['samples'] == [str(dirs['HDD'] / f'f0{i}.txt') for i in range(3)]
+    assert all(not isinstance(v, str) for hashes in scan['dirs'].values() for v in hashes)
+
+    scans = {label: inspect_state.scan_dir(path) for _, label, path in inspect_state.TIER_DIRS}
+    assert inspect_state.collisions(scans, 5) == {'count': 1, 'samples': [{'name': 'f07.txt', 'tiers': ['CLOUD', 'HDD']}]}
@@ -0,0 +1,73 @@
+import sys
+import os
+import json
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import metrics
+from metadata_store import MetadataStore
+import tiering_engine as te
+
+
+def setup_function(_):
+    metrics.reset()
+    metrics.disable()
+
+
+def teardown_function(_):
+    metrics.reset()
+    metrics.disable()
+
+
+def test_disabled_metrics_record_nothing():
+    with metrics.span('store_query'):
+        pass
+    metrics.inc('moves_total')
+    snap = metrics.snapshot()
+    assert snap == {'counters': {}, 'histograms': {}}
+
+
+def test_spans_and_counters_export(tmp_path):
+    metrics.enable()
+    with metrics.span('engine_plan'):
+        pass
+    metrics.inc('moves_total', 3)
+
+    snap = metrics.snapshot()
+    assert snap['counters']['moves_total'] == 3
+    assert snap['histograms']['engine_plan']['count'] == 1
+
+    prom_path = tmp_path / 'metrics.prom'
+    metrics.write(str(prom_path))
+    text = prom_path.read_text()
+    assert 'tiering_moves_total 3' in text
+    assert 'tiering_engine_plan_seconds_count 1' in text
+
+    json_path = tmp_path / 'metrics.json'
+    metrics.write(str(json_path))
+    assert json.loads(json_path.read_text())['counters']['moves_total'] == 3
+
+
+def test_execute_move_records_phases(tmp_path, monkeypatch):
+    hot = tmp_path / 'mnt_ssd'
+    warm = tmp_path / 'mnt_hdd'
+    hot.mkdir()
+    warm.mkdir()
+    monkeypatch.setattr(te, 'HOT_TIER_PATH', str(hot))
+    monkeypatch.setattr(te, 'WARM_TIER_PATH', str(warm))
+
+    src = hot / 'fileA.txt'
+    src.write_text('x' * 100)
+    store = MetadataStore(':memory:')
+    store.insert_new_file('fileA', str(src), current_tier='Hot')
+
+    metrics.enable()
+    assert te.execute_move({'id': 'fileA', 'from': 'Hot', 'to': 'Warm', 'path': str(src)}, store)
+
+    snap = metrics.snapshot()
+    assert snap['histograms']['move_copy']['count'] == 1
+    assert snap['histograms']['move_db_update']['count'] == 1
+    assert snap['counters']['bytes_moved_total'] == 100
+    assert snap['counters']['moves_hot_to_warm_total'] == 1
+    store.close()
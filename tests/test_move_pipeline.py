@@ -0,0 +1,200 @@
+import asyncio
+import sys
+import os
+import threading
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import content_hash
+from metadata_store import MetadataStore
+import move_pipeline
+import throttle
+import tiering_engine as te
+
+
+def _setup(tier_dirs, dedup=False, cache=False):
+    dirs = tier_dirs(DEDUP_ENABLED=dedup, WARM_CACHE_ENABLED=cache)
+    return dirs, str(dirs['mnt_ssd'].parent / 'meta.db')
+
+
+def _add(db, dirs, name, tier, data):
+    root = {'Hot': 'mnt_ssd', 'Warm': 'mnt_hdd', 'Cold': 'mnt_cloud'}[tier]
+    path = dirs[root] / f"{name}.bin"
+    path.write_bytes(data)
+    store = MetadataStore(db)
+    store.insert_new_file(name, str(path), current_tier=tier)
+    store.close()
+    return {'id': name, 'path': str(path), 'from': tier}
+
+
+def test_pipeline_moves_files_and_commits_in_batches(tmp_path, tier_dirs):
+    dirs, db = _setup(tier_dirs)
+    plan = []
+    for i in range(6):
+        move = _add(db, dirs, f"h{i}", 'Hot', os.urandom(3 * move_pipeline.HASH_CHUNK_SIZE // 2 + i))
+        plan.append(dict(move, to='Warm'))
+    plan.append(dict(_add(db, dirs, 'w0', 'Warm', b'warm data'), to='Cold'))
+    plan.append(dict(_add(db, dirs, 'c0', 'Cold', b'cold data'), to='Warm', prefetch_for='h0'))
+    expected = {m['id']: open(m['path'], 'rb').read() for m in plan}
+
+    stats = move_pipeline.execute_plan(plan, lambda: MetadataStore(db),
+                                       tier_workers={'Hot': 2, 'Warm': 1, 'Cold': 1}, queue_depth=1, commit_batch=4)
+
+    assert stats['moved'] == len(plan) and stats['failed'] == 0
+    assert stats['pipelined'] == len(plan) and stats['fallback'] == 0
+    assert stats['bytes'] == sum(len(data) for data in expected.values())
+    store = MetadataStore(db)
+    for move in plan:
+        path, tier = store.get_file(move['id'])[1:3]
+        assert tier == move['to']
+        assert open(path, 'rb').read() == expected[move['id']]
+        assert not os.path.exists(move['path'])
+    assert store.get_prefetch_stats()[0] == 1
+    store.close()
+    assert not list(tmp_path.rglob('*' + move_pipeline.PART_SUFFIX))
+
+
+def test_checksum_mismatch_keeps_source_and_db_row(monkeypatch, tier_dirs):
+    dirs, db = _setup(tier_dirs)
+    move = dict(_add(db, dirs, 'bad', 'Hot', b'original bytes'), to='Warm')
+
+    real_open = open
+
+    def corrupting_open(path, mode='r', *args, **kwargs):
+        f = real_open(path, mode, *args, **kwargs)
+        if str(path).endswith(move_pipeline.PART_SUFFIX) and 'w' in mode:
+            write = f.write
+            f.write = lambda chunk: write(chunk[::-1])
+        return f
+    monkeypatch.setattr('builtins.open', corrupting_open)
+
+    stats = move_pipeline.execute_plan([move], lambda: MetadataStore(db))
+    monkeypatch.undo()
+
+    assert stats['failed'] == 1 and stats['moved'] == 0
+    assert os.path.exists(move['path'])
+    assert not list(dirs['mnt_hdd'].iterdir())
+    store = MetadataStore(db)
+    assert store.get_file('bad')[1:3] == (move['path'], 'Hot')
+    store.close()
+
+
+def test_dedup_demotions_fall_back_to_execute_move(tier_dirs):
+    dirs, db = _setup(tier_dirs, dedup=True)
+    plan = [dict(_add(db, dirs, 'd0', 'Warm', b'same'), to='Cold'),
+            dict(_add(db, dirs, 'd1', 'Warm', b'same'), to='Cold'),
+            dict(_add(db, dirs, 'h0', 'Hot', b'local'), to='Warm')]
+
+    stats = move_pipeline.execute_plan(plan, lambda: MetadataStore(db))
+
+    assert (stats['pipelined'], stats['fallback'], stats['moved']) == (1, 2, 3)
+    store = MetadataStore(db)
+    assert store.get_dedup_stats()[:1] == (1,)
+    assert store.get_file('h0')[2] == 'Warm'
+    store.close()
+
+
+def test_pipeline_charges_throttle_per_tier(tier_dirs):
+    dirs, db = _setup(tier_dirs)
+    plan = [dict(_add(db, dirs, f"t{i}", 'Hot', b'x' * 1000), to='Warm') for i in range(3)]
+    mover = throttle.MoverThrottle({'Warm': {'ops_per_sec': 1000}}, target_latency=60.0)
+
+    stats = move_pipeline.execute_plan(plan, lambda: MetadataStore(db), throttle=mover)
+
+    assert stats['moved'] == 3
+    report = mover.summary()
+    assert report['Hot']['ops'] == 3 and report['Warm']['ops'] == 3
+    assert report['Hot']['bytes'] == 3000 and report['Warm']['bytes'] == 3000
+    assert report['Warm']['backoffs'] == 0
+
+
+def test_saturated_tier_does_not_block_other_directions(monkeypatch, tier_dirs):
+    dirs, db = _setup(tier_dirs)
+    plan = [dict(_add(db, dirs, f"w{i}", 'Hot', b'to warm'), to='Warm') for i in range(2)]
+    plan.append(dict(_add(db, dirs, 'c0', 'Hot', b'to cold'), to='Cold'))
+    cold_done = asyncio.Event()
+    transfer = move_pipeline.MovePipeline._transfer
+
+    async def gated(self, move, dest):
+        if move['to'] == 'Warm':
+            # The only Warm slot is held until the Cold move, queued behind both, has finished
+            await asyncio.wait_for(cold_done.wait(), 5)
+        await transfer(self, move, dest)
+        if move['to'] == 'Cold':
+            cold_done.set()
+    monkeypatch.setattr(move_pipeline.MovePipeline, '_transfer', gated)
+
+    stats = move_pipeline.execute_plan(plan, lambda: MetadataStore(db), tier_workers={'Warm': 1})
+    assert stats['moved'] == 3 and stats['failed'] == 0
+
+
+def test_writer_failure_cancels_reader(monkeypatch, tier_dirs):
+    dirs, db = _setup(tier_dirs)
+    move = dict(_add(db, dirs, 'big', 'Hot', os.urandom(6 * move_pipeline.HASH_CHUNK_SIZE)), to='Warm')
+    real_open = open
+
+    def failing_open(path, mode='r', *args, **kwargs):
+        f = real_open(path, mode, *args, **kwargs)
+        if str(path).endswith(move_pipeline.PART_SUFFIX) and 'w' in mode:
+            def write(chunk):
+                raise OSError('disk full')
+            f.write = write
+        return f
+    monkeypatch.setattr('builtins.open', failing_open)
+
+    stats = move_pipeline.execute_plan([move], lambda: MetadataStore(db), queue_depth=1)
+    monkeypatch.undo()
+
+    assert stats['failed'] == 1 and os.path.exists(move['path'])
+    assert not list(dirs['mnt_hdd'].iterdir())
+
+
+def test_fallback_moves_run_off_the_db_thread(monkeypatch, tier_dirs):
+    dirs, db = _setup(tier_dirs, dedup=True)
+    plan = [dict(_add(db, dirs, f"d{i}", 'Warm', b'same' if i < 2 else b'other %d' % i), to='Cold') for i in range(4)]
+    threads = []
+    execute_move = te.execute_move
+
+    def recording(move, store):
+        threads.append(threading.current_thread().name)
+        return execute_move(move, store)
+    monkeypatch.setattr(te, 'execute_move', recording)
+
+    stats = move_pipeline.execute_plan(plan, lambda: MetadataStore(db), fallback_workers=2)
+
+    assert stats['fallback'] == 4 and stats['moved'] == 4
+    assert all(name.startswith('pipeline-fallback') for name in threads)
+    store = MetadataStore(db)
+    assert store.get_dedup_stats()[:1] == (3,)
+    store.close()
+
+
+def test_recall_and_same_hash_demotion_share_a_lane(monkeypatch, tier_dirs):
+    dirs, db = _setup(tier_dirs, dedup=True)
+    store = MetadataStore(db)
+    demoted = dict(_add(db, dirs, 'a', 'Warm', b'shared bytes'), to='Cold')
+    assert te.execute_move(demoted, store)
+    cold_path = store.get_file('a')[1]
+    store.close()
+    recall = {'id': 'a', 'path': cold_path, 'from': 'Cold', 'to': 'Warm'}
+    demotion = dict(_add(db, dirs, 'b', 'Warm', b'shared bytes'), to='Cold')
+    demotion['content_hash'], demotion['size'] = content_hash.hash_file(demotion['path'])
+    lanes = {}
+    execute_move = te.execute_move
+
+    def recording(move, store):
+        lanes[move['id']] = threading.get_ident()
+        return execute_move(move, store)
+    monkeypatch.setattr(te, 'execute_move', recording)
+
+    stats = move_pipeline.execute_plan([recall, demotion], lambda: MetadataStore(db), fallback_workers=64)
+
+    assert stats['fallback'] == 2 and stats['moved'] == 2
+    assert lanes['a'] == lanes['b']
+    store = MetadataStore(db)
+    path, tier = store.get_file('b')[1:3]
+    assert tier == 'Cold' and open(path, 'rb').read() == b'shared bytes'
+    assert store.get_cold_object(demotion['content_hash'])[2] == 1
+    assert open(store.get_file('a')[1], 'rb').read() == b'shared bytes'
+    store.close()
@@ -0,0 +1,152 @@
+import sys
+import os
+import time
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metadata_store import MetadataStore
+import move_selection
+import tiering_engine as te
+
+GIB = 1 << 30
+PRICES = {'Cold': {'egress_per_gib': 0.09, 'request': 0.0004}, 'Warm': {'request': 0.0}}
+
+
+def _recall(file_id, **extra):
+    return dict({'id': file_id, 'from': 'Cold', 'to': 'Warm', 'path': f'/mnt_cloud/{file_id}'}, **extra)
+
+
+def test_cost_model_and_benefit():
+    move = _recall('a')
+    assert abs(move_selection.move_cost(move, 10 * GIB, PRICES) - (0.9 + 0.0004)) < 1e-12
+    assert move_selection.heat(1.0, 20, 10) == 1.0
+    assert move_selection.move_benefit(move, GIB, 0.8) == 0.8
+    assert move_selection.move_benefit(_recall('b', prefetch_for='a'), GIB, 0.8) == 0.4
+    # Demotions of colder and larger files are worth more
+    demotion = {'id': 'c', 'from': 'Hot', 'to': 'Warm'}
+    assert move_selection.move_benefit(demotion, 3 * GIB, 0.5) == 2.0
+
+
+def test_greedy_prefers_cheap_hot_recalls_under_cost_budget():
+    moves = [_recall('huge'), _recall('small1'), _recall('small2'), _recall('peer', prefetch_for='huge')]
+    sizes = {'huge': 100 * GIB, 'small1': GIB, 'small2': GIB, 'peer': GIB}
+    scores = {'huge': 0.9, 'small1': 0.8, 'small2': 0.7, 'peer': 0.9}
+    selected, summary = move_selection.select(moves, sizes, scores, {}, PRICES, max_cost=1.0)
+    assert [m['id'] for m in selected] == ['small1', 'small2']
+    assert summary['deferred'] == 2 and summary['cost'] <= 1.0
+
+
+def test_free_moves_are_kept_and_no_budget_keeps_everything():
+    moves = [{'id': 'a', 'from': 'Hot', 'to': 'Warm', 'path': '/a'}, _recall('b')]
+    selected, _ = move_selection.select(moves, {'a': GIB, 'b': GIB}, {}, {}, PRICES, max_cost=0.0001)
+    assert [m['id'] for m in selected] == ['a']
+    selected, summary = move_selection.select(moves, {}, {}, {}, PRICES)
+    assert selected == moves and summary['deferred'] == 0
+
+
+def test_select_uses_the_shared_evaluation():
+    moves = [_recall('a'), {'id': 'b', 'from': 'Hot', 'to': 'Warm'}]
+    sizes, scores, counts = {'a': 2 * GIB, 'b': GIB}, {'a': 0.6, 'b': 0.2}, {'a': 4}
+    _, summary = move_selection.select(moves, sizes, scores, counts, PRICES, max_bytes=10 * GIB)
+    expected = [move_selection.evaluate(m, sizes[m['id']], scores[m['id']], counts.get(m['id']), PRICES, 10)
+                for m in moves]
+    assert abs(summary['benefit'] - sum(b for b, _ in expected)) < 1e-12
+    assert abs(summary['cost'] - sum(c for _, c in expected)) < 1e-12
+
+
+def test_unknown_sizes_are_deferred_and_forced_moves_always_kept():
+    forced = {'id': 'f', 'from': 'Hot', 'to': 'Warm', 'forced': True}
+    moves = [_recall('unsized'), forced, _recall('small'), _recall('large')]
+    sizes = {'f': 80, 'small': 10, 'large': 30}
+    selected, summary = move_selection.select(moves, sizes, {}, {}, PRICES, max_bytes=100)
+    # The forced demotion uses 80 of the 100 bytes first; only 'small' still fits
+    assert [m['id'] for m in selected] == ['f', 'small']
+    assert summary['unknown_size'] == 1 and summary['deferred'] == 2
+    assert summary['deferred_moves'] == [('unsized', 'unknown size'), ('large', 'over budget')]
+
+    # Forced moves are kept even when they alone exceed the budget
+    selected, _ = move_selection.select([forced, _recall('small')], sizes, {}, {}, PRICES, max_bytes=50)
+    assert [m['id'] for m in selected] == ['f']
+
+
+def test_optimal_beats_greedy_on_awkward_weights():
+    # Density favours 'a', but 'b' + 'c' fill the byte budget exactly for more benefit
+    moves = [{'id': fid, 'from': 'Hot', 'to': 'Warm', 'path': '/' + fid} for fid in 'abc']
+    sizes = {'a': 60, 'b': 50, 'c': 50}
+    scores = {'a': 0.0, 'b': 0.4, 'c': 0.4}
+    greedy, _ = move_selection.select(moves, sizes, scores, {}, {}, max_bytes=100)
+    optimal, summary = move_selection.select(moves, sizes, scores, {}, {}, max_bytes=100, method='optimal')
+    assert [m['id'] for m in greedy] == ['a']
+    assert [m['id'] for m in optimal] == ['b', 'c'] and summary['bytes'] == 100
+
+
+def test_greedy_scales_to_large_candidate_sets():
+    n = 200000
+    moves = [{'id': f'f{i}', 'from': 'Cold', 'to': 'Warm'} for i in range(n)]
+    sizes = {f'f{i}': (i % 1000 + 1) * 1024 for i in range(n)}
+    scores = {f'f{i}': (i % 97) / 97 for i in range(n)}
+    start = time.perf_counter()
+    selected, summary = move_selection.select(moves, sizes, scores, {}, PRICES, max_bytes=GIB)
+    assert time.perf_counter() - start < 10
+    assert 0 < len(selected) < n and summary['bytes'] <= GIB
+
+
+def test_engine_applies_budget_to_plan(monkeypatch):
+    monkeypatch.setattr(te, 'MOVE_BUDGET_BYTES', 1500)
+    monkeypatch.setattr(te, 'PREFETCH_MAX_PEERS', 0)
+    store = MetadataStore(':memory:')
+    now = time.time()
+    for name, size, score in (('big', 1000, 0.9), ('s1', 600, 0.6), ('s2', 600, 0.5)):
+        store.insert_new_file(name, f'/mnt_cloud/{name}', current_tier='Cold')
+        store.update_file_stats(name, now - 60, 1, score)
+        store.set_content_hashes_many([(name, 'h' + name, size)])
+    assert store.get_sizes(['big', 's1', 'missing']) == {'big': 1000, 's1': 600}
+
+    plan = te.generate_move_plan(store=store)
+    assert sorted(m['id'] for m in plan) == ['s1', 's2']
+    store.close()
+
+
+class _FakeS3:
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.heads = []
+
+    def head_object(self, Bucket, Key):
+        self.heads.append(Key)
+        if Key not in self.sizes:
+            raise KeyError(Key)
+        return {'ContentLength': self.sizes[Key]}
+
+
+def test_engine_budget_sizes_s3_recalls_from_stored_bytes(monkeypatch, capsys):
+    monkeypatch.setattr(te, 'MOVE_BUDGET_BYTES', 1000)
+    monkeypatch.setattr(te, 'PREFETCH_MAX_PEERS', 0)
+    s3 = _FakeS3({'legacy': 200})
+    monkeypatch.setattr(te, '_s3_client', lambda: s3)
+    store = MetadataStore(':memory:')
+    now = time.time()
+    for name in ('huge', 'legacy', 'missing', 'small'):
+        store.insert_new_file(name, f's3://bucket/{name}', current_tier='Cold')
+        store.update_file_stats(name, now - 60, 1, 0.9)
+    store.set_cold_compression('huge', None, 5000)
+    store.set_cold_compression('small', None, 500)
+
+    plan = te.generate_move_plan(store=store)
+    # Legacy rows without a recorded size are sized with a HEAD request, and the size is kept
+    assert [m['id'] for m in plan] == ['legacy', 'small']
+    assert sorted(s3.heads) == ['legacy', 'missing']
+    assert store.get_sizes(['legacy']) == {'legacy': 200}
+    out = capsys.readouterr().out
+    assert '1 moves have no known size and are not run under a budget: missing' in out
+    assert '[DEFERRED] huge: over budget' in out
+    store.close()
+
+
+def test_optimal_selector_reports_fallback_to_greedy(monkeypatch):
+    monkeypatch.setattr(move_selection, 'OPTIMAL_MAX_ITEMS', 1)
+    moves = [{'id': fid, 'from': 'Hot', 'to': 'Warm', 'path': '/' + fid} for fid in 'ab']
+    _, summary = move_selection.select(moves, {'a': 60, 'b': 50}, {}, {}, {}, max_bytes=100, method='optimal')
+    assert summary['method'] == 'greedy'
+    assert summary['deferred_moves'] == [('b', 'over budget')]
@@ -0,0 +1,54 @@
+import sys
+import os
+import argparse
+import pstats
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import profiling
+
+
+def _args(tmp_path, profile=True, phase=None):
+    return argparse.Namespace(profile=profile, profile_phase=phase, profile_dir=str(tmp_path))
+
+
+def _inside_phase():
+    return sum(range(1000))
+
+
+def _outside_phase():
+    return sum(range(1000))
+
+
+def _profiled_functions(path):
+    return {func for (_, _, func) in pstats.Stats(path).stats}
+
+
+def test_no_profile_flag_writes_nothing(tmp_path):
+    with profiling.session(_args(tmp_path, profile=False), 'test'):
+        with profiling.phase('plan'):
+            _inside_phase()
+    assert os.listdir(tmp_path) == []
+
+
+def test_whole_run_writes_pstats_and_collapsed(tmp_path):
+    with profiling.session(_args(tmp_path), 'test') as sess:
+        _outside_phase()
+    assert not sess.sampler.is_alive()
+    files = sorted(os.listdir(tmp_path))
+    assert files == [f"{sess.run_id}.collapsed", f"{sess.run_id}.pstats"]
+    assert '_outside_phase' in _profiled_functions(os.path.join(tmp_path, f"{sess.run_id}.pstats"))
+
+
+def test_phase_only_profiles_named_phase(tmp_path):
+    with profiling.session(_args(tmp_path, phase='plan'), 'test') as sess:
+        _outside_phase()
+        with profiling.phase('plan'):
+            _inside_phase()
+        with profiling.phase('execute'):
+            _outside_phase()
+    assert sess.run_id.endswith('-plan')
+    funcs = _profiled_functions(os.path.join(tmp_path, f"{sess.run_id}.pstats"))
+    assert '_inside_phase' in funcs
+    assert '_outside_phase' not in funcs
@@ -0,0 +1,91 @@
+import sys
+import os
+import json
+import threading
+import time
+import urllib.request
+import urllib.error
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metadata_store import MetadataStore
+import recall_service
+import tiering_engine as te
+
+
+def _local_cloud(tier_dirs):
+    """Points the engine at temp tier directories using the local-cloud backend."""
+    return tier_dirs(DEDUP_ENABLED=True, WARM_CACHE_ENABLED=True)
+
+
+def _cold_file(dirs, db_path, file_id):
+    path = dirs['mnt_cloud'] / f"{file_id}.txt"
+    path.write_text('cold data')
+    store = MetadataStore(db_path)
+    store.insert_new_file(file_id, str(path), current_tier='Cold', backdate_seconds=90 * te.DAYS)
+    store.close()
+    return path
+
+
+def test_concurrent_recalls_are_coalesced(tmp_path, monkeypatch, tier_dirs):
+    dirs = _local_cloud(tier_dirs)
+    db_path = str(tmp_path / 'meta.db')
+    _cold_file(dirs, db_path, 'cold1')
+
+    transfers = []
+    real_execute_move = te.execute_move
+
+    def slow_execute_move(move, store):
+        transfers.append(move['id'])
+        time.sleep(0.2)  # keep the transfer in flight while other requests arrive
+        return real_execute_move(move, store)
+
+    monkeypatch.setattr(te, 'execute_move', slow_execute_move)
+
+    service = recall_service.RecallService(db_path, max_workers=2)
+    futures = [service.recall('cold1') for _ in range(5)]
+    results = [f.result(timeout=5) for f in futures]
+    service.shutdown()
+
+    assert transfers == ['cold1']
+    expected_path = str(dirs['mnt_hdd'] / 'cold1.txt')
+    assert all(r['path'] == expected_path and r['tier'] == 'Warm' for r in results)
+    assert os.path.exists(expected_path)
+
+    store = MetadataStore(db_path)
+    record = store.get_file('cold1')
+    assert record[2] == 'Warm' and record[1] == expected_path
+    # The read was recorded, so the next engine run will not demote it again
+    assert time.time() - record[3] < 60
+    store.close()
+
+
+def test_http_recall_and_unknown_file(tmp_path, tier_dirs):
+    dirs = _local_cloud(tier_dirs)
+    db_path = str(tmp_path / 'meta.db')
+    _cold_file(dirs, db_path, 'cold2')
+
+    service = recall_service.RecallService(db_path, max_workers=1)
+    server = recall_service.make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{base}/recall/cold2", timeout=5) as resp:
+            payload = json.loads(resp.read())
+        assert payload['recalled'] is True and payload['tier'] == 'Warm'
+
+        # Second request finds the file already local and does no transfer
+        with urllib.request.urlopen(f"{base}/recall/cold2", timeout=5) as resp:
+            assert json.loads(resp.read())['recalled'] is False
+
+        try:
+            urllib.request.urlopen(f"{base}/recall/missing", timeout=5)
+            assert False, 'expected 404'
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
@@ -0,0 +1,120 @@
+import sys
+import os
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import sharded_store
+from metadata_store import MetadataStore
+from sharded_store import ShardedMetadataStore
+import tiering_engine as te
+
+NUM_FILES = 60
+
+
+def _sharded(tmp_path, num_shards=4):
+    db_dir = str(tmp_path / 'catalog.db')
+    sharded_store.create(db_dir, num_shards)
+    return db_dir, MetadataStore(db_dir)
+
+
+def test_public_api_matches_single_file_store():
+    public = {name for name in dir(MetadataStore) if not name.startswith('_')}
+    missing = {name for name in public if not hasattr(ShardedMetadataStore, name)}
+    assert not missing
+
+
+def test_routes_files_and_merges_scans(tmp_path):
+    db_dir, store = _sharded(tmp_path)
+    assert isinstance(store, ShardedMetadataStore)
+    ids = [f"file{i:03d}" for i in range(NUM_FILES)]
+    for fid in ids:
+        store.insert_new_file(fid, f"/mnt_hdd/{fid}", current_tier='Warm')
+
+    per_shard = [len(shard.get_all_files()) for shard in store.shards]
+    assert sum(per_shard) == NUM_FILES and all(per_shard)
+    assert [row[0] for row in store.get_all_files()] == ids
+    assert store.get_file('file007')[1] == '/mnt_hdd/file007'
+
+    store.update_file_location('file007', '/mnt_ssd/file007', 'Hot')
+    tiers = store.get_tiers(ids)
+    assert tiers['file007'] == 'Hot' and len(tiers) == NUM_FILES
+
+    now = time.time()
+    store.record_accesses_many({fid: [now - 10, now] for fid in ids[:10]})
+    counts = store.get_access_counts(now=now)
+    assert counts == {fid: 2 for fid in ids[:10]}
+    assert store.get_access_counts(now=now, file_ids=ids[5:15]) == {fid: 2 for fid in ids[5:10]}
+    assert store.get_scores(['file001', 'missing']) == {'file001': 0.0}
+
+    store.set_ingest_watermark('access_log', now)
+    store.close()
+
+    # Reopening routes to the same shards
+    store = MetadataStore(db_dir)
+    assert store.get_window_counts('file003', now=now)['1h'] == 2
+    assert store.get_ingest_watermark('access_log') == now
+    store.close()
+
+
+def test_aggregates_and_cache_lru_span_shards(tmp_path):
+    _, store = _sharded(tmp_path)
+    for i in range(6):
+        fid = f"c{i}"
+        store.insert_new_file(fid, f"/mnt_hdd/{fid}", current_tier='Warm')
+        store.put_cache_entry(fid, f"/mnt_cloud/{fid}", f"/mnt_hdd/{fid}", 'h', 10, 0, accessed_at=100 - i)
+        store.acquire_cold_object(f"hash{i}", f"/objects/hash{i}", 10)
+    assert store.get_cache_usage() == 60
+    assert [row[0] for row in store.get_cache_lru(3)] == ['c5', 'c4', 'c3']
+    assert store.get_dedup_stats() == (6, 60, 6, 60)
+    store.close()
+
+
+def test_split_database_preserves_rows(tmp_path):
+    src = str(tmp_path / 'single.db')
+    store = MetadataStore(src)
+    now = time.time()
+    for i in range(20):
+        store.insert_new_file(f"f{i}", f"/mnt_ssd/f{i}")
+    store.record_accesses_many({'f1': [now], 'f2': [now, now]})
+    store.add_coaccess_many({('f1', 'f2'): 3}, {'f1': 4, 'f2': 5})
+    store.close()
+
+    db_dir = str(tmp_path / 'sharded.db')
+    sharded_store.split_database(src, db_dir, 3)
+    store = MetadataStore(db_dir)
+    assert len(store.get_all_files()) == 20
+    assert store.get_access_counts(now=now) == {'f1': 1, 'f2': 2}
+    assert store.get_coaccess_peers('f1')[0][:2] == ('f2', 3)
+    store.close()
+
+
+def test_parallel_shard_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharded_store, 'PARALLEL_MIN_ITEMS', 1)
+    db_dir, store = _sharded(tmp_path)
+    store.write_workers = 2
+    ids = [f"p{i}" for i in range(NUM_FILES)]
+    for fid in ids:
+        store.insert_new_file(fid, f"/mnt_hdd/{fid}")
+    assert store.set_content_hashes_many([(fid, f"hash-{fid}", 1) for fid in ids])
+    now = time.time()
+    assert store.record_accesses_many({fid: [now] for fid in ids}) == NUM_FILES
+    assert len(store.get_access_counts(now=now)) == NUM_FILES
+    assert store.get_dedup_info('p5')[:2] == ('hash-p5', 1)
+    store.close()
+
+
+def test_engine_moves_on_sharded_store(tmp_path, tier_dirs):
+    tier_dirs(DEDUP_ENABLED=True, WARM_CACHE_ENABLED=True)
+    _, store = _sharded(tmp_path)
+    for i in range(8):
+        path = tmp_path / 'mnt_hdd' / f"same{i}.txt"
+        path.write_text('identical content')
+        store.insert_new_file(f"same{i}", str(path), current_tier='Warm')
+        assert te.execute_move({'id': f"same{i}", 'from': 'Warm', 'to': 'Cold', 'path': str(path)}, store)
+    assert store.get_dedup_stats()[:3] == (1, len('identical content'), 8)
+    assert te.execute_move({'id': 'same3', 'from': 'Cold', 'to': 'Warm', 'path': store.get_file('same3')[1]}, store)
+    assert (tmp_path / 'mnt_hdd' / 'same3.txt').read_text() == 'identical content'
+    store.close()
@@ -0,0 +1,171 @@
+import sys
+import os
+import csv
+import math
+import random
+import time
+from collections import Counter
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sketches import CountMinSketch, SpaceSaving, HyperLogLog, SketchState
+from metadata_store import MetadataStore
+import analyzer
+
+
+def _zipf_stream(n_events, n_keys, seed=7):
+    """Skewed workload: a few hot files and a long tail of one-off reads."""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(n_keys)]
+    return rng.choices([f"file_{i}" for i in range(n_keys)], weights=weights, k=n_events)
+
+
+def test_count_min_within_documented_bound():
+    eps, delta = 0.001, 0.01
+    stream = _zipf_stream(50000, 5000)
+    exact = Counter(stream)
+    cms = CountMinSketch.for_error(eps, delta)
+    for key in stream:
+        cms.add(key)
+
+    bound = eps * len(stream)
+    violations = 0
+    for key, true_count in exact.items():
+        est = cms.estimate(key)
+        assert est >= true_count  # never undercounts
+        if est > true_count + bound:
+            violations += 1
+    assert violations <= delta * len(exact)
+
+
+def test_space_saving_tracks_all_heavy_hitters():
+    k = 200
+    stream = _zipf_stream(50000, 5000)
+    exact = Counter(stream)
+    tracker = SpaceSaving(k)
+    for i, key in enumerate(stream):
+        tracker.add(key, ts=float(i))
+
+    tracked = {key: (count, error) for key, count, error, _ in tracker.top()}
+    for key, true_count in exact.items():
+        if true_count > len(stream) / k:
+            assert key in tracked
+            count, error = tracked[key]
+            assert true_count <= count <= true_count + error
+
+
+def test_hyperloglog_within_three_standard_errors():
+    hll = HyperLogLog(p=12)
+    n = 20000
+    for i in range(n):
+        hll.add(f"file_{i}")
+        hll.add(f"file_{i}")  # duplicates must not change the estimate
+    rel_error = 1.04 / math.sqrt(hll.m)
+    assert abs(hll.estimate() - n) <= 3 * rel_error * n
+
+
+def test_sketch_state_roundtrip(tmp_path):
+    state = SketchState(top_k=10)
+    for i in range(100):
+        state.add(f"file_{i % 7}", 'Hot' if i % 2 else 'Warm', float(i))
+    path = str(tmp_path / 'sketch.json')
+    state.save(path)
+
+    restored = SketchState.load(path)
+    assert restored.watermark == state.watermark
+    assert restored.heavy_hitters.top() == state.heavy_hitters.top()
+    assert restored.distinct_files_per_tier() == state.distinct_files_per_tier()
+
+
+def test_analyzer_sketch_mode_matches_exact_counts(tmp_path, monkeypatch):
+    log_path = tmp_path / 'access_log.csv'
+    db_path = tmp_path / 'meta.db'
+    state_path = str(tmp_path / 'sketch.json')
+    monkeypatch.setattr(analyzer, 'LOG_FILE', str(log_path))
+    monkeypatch.setattr(analyzer, 'DB_NAME', str(db_path))
+
+    store = MetadataStore(str(db_path))
+    for name in ('hot_a', 'hot_b', 'rare_c'):
+        store.insert_new_file(name, f"/mnt_ssd/{name}", current_tier='Hot')
+    store.close()
+
+    now = time.time()
+    with open(log_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'file_id', 'access_type'])
+        for i in range(20):
+            writer.writerow([now - i, 'hot_a', 'READ'])
+        for i in range(10):
+            writer.writerow([now - i, 'hot_b', 'READ'])
+        writer.writerow([now, 'rare_c', 'READ'])
+
+    state = analyzer.analyze_patterns_sketch(state_path=state_path, top_k=10)
+    # Re-running over the same log is a no-op thanks to the watermark
+    analyzer.analyze_patterns_sketch(state_path=state_path, top_k=10)
+
+    store = MetadataStore(str(db_path))
+    counts = {r[0]: r[4] for r in store.get_all_files()}
+    store.close()
+    assert counts == {'hot_a': 20, 'hot_b': 10, 'rare_c': 1}
+    assert round(state.distinct_files_per_tier()['Hot']) == 3
+
+
+def test_analyzer_sketch_mode_stores_seven_day_counts(tmp_path, monkeypatch):
+    log_path = tmp_path / 'access_log.csv'
+    db_path = tmp_path / 'meta.db'
+    monkeypatch.setattr(analyzer, 'LOG_FILE', str(log_path))
+    monkeypatch.setattr(analyzer, 'DB_NAME', str(db_path))
+    store = MetadataStore(str(db_path))
+    store.insert_new_file('old_hot', '/mnt_hdd/old_hot', current_tier='Warm')
+    store.close()
+
+    now = time.time()
+    with open(log_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'file_id', 'access_type'])
+        for i in range(30):
+            writer.writerow([now - 10 * 86400 + i, 'old_hot', 'READ'])
+        for i in range(2):
+            writer.writerow([now - i, 'old_hot', 'READ'])
+
+    # Only the heavy hitters are looked up, never the whole catalog
+    def no_scan(self):
+        raise AssertionError('catalog scan in sketch mode')
+    monkeypatch.setattr(MetadataStore, 'get_all_files', no_scan)
+    monkeypatch.setattr(MetadataStore, '_load_windows',
+                        lambda self, file_ids=None, load=MetadataStore._load_windows: (
+                            no_scan(self) if file_ids is None else load(self, file_ids)))
+    state = analyzer.analyze_patterns_sketch(state_path=str(tmp_path / 'sketch.json'), top_k=10)
+    monkeypatch.undo()
+
+    store = MetadataStore(str(db_path))
+    assert state.heavy_hitters.top()[0][:2] == ('old_hot', 32)
+    assert store.get_file('old_hot')[4] == 2
+    assert store.get_access_counts(now=now) == {'old_hot': 2}
+    store.close()
+
+
+def test_sketch_and_exact_modes_share_the_window_watermark(tmp_path, monkeypatch):
+    log_path = tmp_path / 'access_log.csv'
+    db_path = tmp_path / 'meta.db'
+    monkeypatch.setattr(analyzer, 'LOG_FILE', str(log_path))
+    monkeypatch.setattr(analyzer, 'DB_NAME', str(db_path))
+    store = MetadataStore(str(db_path))
+    store.insert_new_file('a', '/mnt_hdd/a', current_tier='Warm')
+    store.close()
+
+    now = time.time()
+    with open(log_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'file_id', 'access_type'])
+        for i in range(5):
+            writer.writerow([now - i, 'a', 'READ'])
+
+    analyzer.analyze_patterns_sketch(state_path=str(tmp_path / 'sketch.json'), top_k=10)
+    analyzer.analyze_patterns()
+
+    store = MetadataStore(str(db_path))
+    assert store.get_access_counts(now=now) == {'a': 5}
+    assert store.get_file('a')[4] == 5
+    store.close()
@@ -0,0 +1,100 @@
+import sys
+import os
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metadata_store import MetadataStore
+import throttle
+import tiering_engine as te
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_waits_out_debt():
+    clock = FakeClock()
+    bucket = throttle.TokenBucket(100, clock=clock)
+    assert bucket.reserve(100) == 0.0
+    assert bucket.reserve(50) == 0.5
+    clock.now = 0.5
+    assert bucket.reserve(10) == 0.1
+    # Halving the factor halves the refill rate: 15 tokens left, 85 owed at 50/s
+    clock.now = 1.0
+    assert abs(bucket.reserve(100, factor=0.5) - 1.7) < 1e-9
+
+
+def test_move_waits_for_slowest_tier_and_reports_throughput():
+    clock = FakeClock()
+    mover = throttle.MoverThrottle({'Hot': {'bytes_per_sec': 1000}, 'Warm': {'bytes_per_sec': 100, 'ops_per_sec': 1}},
+                                   clock=clock, sleep=clock.sleep)
+    assert mover.acquire(('Hot', 'Warm'), 100) == 0.0
+    assert mover.acquire(('Hot', 'Warm'), 100) == 1.0
+    assert clock.now == 1.0
+
+    report = mover.summary()
+    assert report['Warm']['bytes'] == 200 and report['Warm']['ops'] == 2
+    assert report['Warm']['bytes_per_sec'] == 200.0
+    assert report['Warm']['waits'] == 1 and report['Warm']['wait_seconds'] == 1.0
+    assert report['Warm']['limit_bytes_per_sec'] == 100.0
+    assert len(throttle.format_summary(report)) == 2
+
+
+def test_adaptive_mode_backs_off_on_latency_and_recovers():
+    clock = FakeClock()
+    mover = throttle.MoverThrottle({'Warm': {'bytes_per_sec': 1000}}, target_latency=0.5, clock=clock)
+    mover.observe(('Warm',), 2.0)
+    mover.observe(('Warm',), 2.0)
+    assert mover.tiers['Warm'].factor == throttle.BACKOFF ** 2
+    assert mover.summary()['Warm']['limit_bytes_per_sec'] == 250.0
+    mover.observe(('Warm',), 0.1)
+    assert mover.tiers['Warm'].factor == throttle.BACKOFF ** 2 + throttle.RECOVERY_STEP
+
+    # An unlimited tier is capped at its measured rate on the first back-off
+    mover.reserve(('Hot',), 4000, 1)
+    mover.observe(('Hot',), 2.0)
+    assert mover.summary()['Hot']['limit_bytes_per_sec'] == 2000 * throttle.BACKOFF
+
+
+def test_disk_utilization_from_diskstats(tmp_path, monkeypatch):
+    clock = FakeClock()
+    st = os.stat(tmp_path)
+    device = (os.major(st.st_dev), os.minor(st.st_dev))
+    ticks = {device: 1000}
+    monkeypatch.setattr(throttle, '_read_io_ticks', lambda path=throttle.DISKSTATS_PATH: dict(ticks))
+
+    mover = throttle.MoverThrottle(paths={'Warm': str(tmp_path)}, target_util=0.8, clock=clock)
+    clock.now, ticks[device] = 2.0, 2900  # busy 1.9s of 2s
+    mover.observe(('Warm',), 0.0)
+    assert mover.summary()['Warm']['disk_util'] == 0.95
+    assert mover.tiers['Warm'].backoffs == 1
+
+
+def test_engine_throttles_execute_move(tmp_path, monkeypatch):
+    for name in ('mnt_ssd', 'mnt_hdd'):
+        (tmp_path / name).mkdir()
+    monkeypatch.setattr(te, 'HOT_TIER_PATH', str(tmp_path / 'mnt_ssd'))
+    monkeypatch.setattr(te, 'WARM_TIER_PATH', str(tmp_path / 'mnt_hdd'))
+    clock = FakeClock()
+    mover = throttle.MoverThrottle({'Warm': {'ops_per_sec': 1}}, clock=clock, sleep=clock.sleep)
+    monkeypatch.setattr(te, 'MOVE_THROTTLE', mover)
+
+    store = MetadataStore(':memory:')
+    for name in ('a', 'b'):
+        path = tmp_path / 'mnt_ssd' / name
+        path.write_bytes(b'x' * 10)
+        store.insert_new_file(name, str(path), current_tier='Hot')
+        assert te.execute_move({'id': name, 'from': 'Hot', 'to': 'Warm', 'path': str(path)}, store)
+    store.close()
+
+    report = mover.summary()
+    assert report['Warm']['ops'] == 2 and report['Hot']['bytes'] == 20
+    assert report['Warm']['wait_seconds'] == 1.0
@@ -0,0 +1,122 @@
+import sys
+import os
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import migrate_layout
+import reconcile_db_fs
+import tier_layout
+from metadata_store import MetadataStore
+import tiering_engine as te
+
+
+def _setup(tier_dirs, layout):
+    return tier_dirs(TIER_LAYOUT=layout)
+
+
+def _move(store, file_id, to_tier):
+    record = store.get_file(file_id)
+    return te.execute_move({'id': file_id, 'from': record[2], 'to': to_tier, 'path': record[1]}, store)
+
+
+def test_hashed_paths_are_stable_and_reversible(tmp_path):
+    path = tier_layout.path_for('/tier', 'dir/file 1', 'report.csv', tier_layout.HASHED)
+    assert path == tier_layout.path_for('/tier', 'dir/file 1', 'report.csv', tier_layout.HASHED)
+    parts = os.path.relpath(path, '/tier').split(os.sep)
+    assert len(parts) == tier_layout.FANOUT_LEVELS + 1
+    assert all(len(p) == tier_layout.FANOUT_CHARS for p in parts[:-1])
+    assert tier_layout.original_name(path, 'dir/file 1') == 'report.csv'
+    assert tier_layout.path_for('/tier', 'x', 'a.txt') == os.path.join('/tier', 'a.txt')
+
+
+def test_same_basename_no_longer_collides(tmp_path, tier_dirs):
+    dirs = _setup(tier_dirs, tier_layout.HASHED)
+    store = MetadataStore(':memory:')
+    for file_id, text in (('team-a', 'first'), ('team-b', 'second')):
+        src = tmp_path / file_id
+        src.mkdir()
+        (src / 'report.txt').write_text(text)
+        store.insert_new_file(file_id, str(src / 'report.txt'), current_tier='Hot')
+        assert _move(store, file_id, 'Warm')
+
+    contents = {f: open(store.get_file(f)[1]).read() for f in ('team-a', 'team-b')}
+    assert contents == {'team-a': 'first', 'team-b': 'second'}
+
+    # Round trip through Cold keeps the original name under the layout
+    assert _move(store, 'team-a', 'Cold') and _move(store, 'team-a', 'Hot')
+    hot_path = store.get_file('team-a')[1]
+    assert hot_path == tier_layout.path_for(str(dirs['mnt_ssd']), 'team-a', 'report.txt', tier_layout.HASHED)
+    assert open(hot_path).read() == 'first'
+    store.close()
+
+
+def test_migration_moves_files_and_batches_updates(monkeypatch, tier_dirs):
+    dirs = _setup(tier_dirs, tier_layout.FLAT)
+    store = MetadataStore(':memory:')
+    for i in range(7):
+        path = dirs['mnt_hdd'] / f"f{i}.txt"
+        path.write_text(str(i))
+        store.insert_new_file(f"f{i}", str(path), current_tier='Warm')
+    store.insert_new_file('gone', str(dirs['mnt_hdd'] / 'gone.txt'), current_tier='Warm')
+
+    batches = []
+    original = store.update_file_locations_many
+    monkeypatch.setattr(store, 'update_file_locations_many', lambda rows: batches.append(len(rows)) or original(rows))
+    roots = {'Hot': str(dirs['mnt_ssd']), 'Warm': str(dirs['mnt_hdd']), 'Cold': str(dirs['mnt_cloud'])}
+
+    assert migrate_layout.migrate(store, roots, tier_layout.HASHED, dry_run=True) == (7, 1)
+    assert batches == [] and (dirs['mnt_hdd'] / 'f0.txt').exists()
+
+    assert migrate_layout.migrate(store, roots, tier_layout.HASHED, batch_size=3) == (7, 1)
+    assert batches == [3, 3, 1]
+    for i in range(7):
+        path = store.get_file(f"f{i}")[1]
+        assert path == tier_layout.path_for(roots['Warm'], f"f{i}", f"f{i}.txt", tier_layout.HASHED)
+        assert open(path).read() == str(i)
+    # Re-running finds nothing left to move
+    assert migrate_layout.migrate(store, roots, tier_layout.HASHED) == (0, 1)
+    store.close()
+
+
+def test_migration_rerun_repairs_rows_of_an_interrupted_batch(monkeypatch, tier_dirs):
+    dirs = _setup(tier_dirs, tier_layout.FLAT)
+    store = MetadataStore(':memory:')
+    for i in range(2):
+        path = dirs['mnt_hdd'] / f"f{i}.txt"
+        path.write_text(str(i))
+        store.insert_new_file(f"f{i}", str(path), current_tier='Warm')
+    roots = {'Warm': str(dirs['mnt_hdd'])}
+
+    # Crash after the renames, before the batch is committed
+    monkeypatch.setattr(store, 'update_file_locations_many', lambda rows: None)
+    migrate_layout.migrate(store, roots, tier_layout.HASHED)
+    monkeypatch.undo()
+    assert not (dirs['mnt_hdd'] / 'f0.txt').exists()
+
+    assert migrate_layout.migrate(store, roots, tier_layout.HASHED) == (2, 0)
+    for i in range(2):
+        assert open(store.get_file(f"f{i}")[1]).read() == str(i)
+    store.close()
+
+
+def test_reconcile_resolves_hashed_paths_by_file_id(tmp_path, monkeypatch, tier_dirs):
+    dirs = _setup(tier_dirs, tier_layout.HASHED)
+    db_path = str(tmp_path / 'meta.db')
+    monkeypatch.setattr(reconcile_db_fs, 'DB_PATH', db_path)
+    for attr, name in (('SSD', 'mnt_ssd'), ('HDD', 'mnt_hdd'), ('CLOUD', 'mnt_cloud')):
+        monkeypatch.setattr(reconcile_db_fs, attr, str(dirs[name]))
+
+    actual = tier_layout.path_for(str(dirs['mnt_ssd']), 'doc', 'doc.txt', tier_layout.HASHED)
+    os.makedirs(os.path.dirname(actual))
+    with open(actual, 'w') as f:
+        f.write('x')
+    store = MetadataStore(db_path)
+    # Recorded on Warm, but it actually sits on Hot
+    store.insert_new_file('doc', str(dirs['mnt_hdd'] / 'doc.txt'), current_tier='Warm')
+    store.close()
+
+    reconcile_db_fs.reconcile()
+    store = MetadataStore(db_path)
+    assert store.get_file('doc')[1:3] == (actual, 'Hot')
+    store.close()
@@ -17,15 +17,15 @@ def test_generate_move_plan_respects_pattern_and_time():
     store = MetadataStore(':memory:')
 
     # File A: Hot, old last access, low pattern -> should be demoted to Warm
-    store.insert_new_file('fileA', '/mnt_ssd/fileA', current_tier='Hot')
+    store.insert_new_file('fileA', '/mnt_ssd/fileA', current_tier='Hot', backdate_seconds=30 * 24 * 3600)
     store.update_file_stats('fileA', make_ts_days_ago(30), 0, 0.0)
 
     # File B: Hot, recent access, high pattern -> should stay Hot
-    store.insert_new_file('fileB', '/mnt_ssd/fileB', current_tier='Hot')
+    store.insert_new_file('fileB', '/mnt_ssd/fileB', current_tier='Hot', backdate_seconds=1 * 24 * 3600)
     store.update_file_stats('fileB', make_ts_days_ago(1), 15, 0.9)
 
     # File C: Warm, moderate access but high pattern -> should be promoted to Hot
-    store.insert_new_file('fileC', '/mnt_hdd/fileC', current_tier='Warm')
+    store.insert_new_file('fileC', '/mnt_hdd/fileC', current_tier='Warm', backdate_seconds=5 * 24 * 3600)
     store.update_file_stats('fileC', make_ts_days_ago(5), 5, 0.8)
 
     plan = te.generate_move_plan(store=store)
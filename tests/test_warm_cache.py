@@ -0,0 +1,98 @@
+import sys
+import os
+
+# Ensure project root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metadata_store import MetadataStore
+import tiering_engine as te
+import warm_cache
+
+
+def _setup(tier_dirs, names, budget=warm_cache.DEFAULT_BUDGET_BYTES):
+    dirs = tier_dirs(DEDUP_ENABLED=True, WARM_CACHE_ENABLED=True, WARM_CACHE_BYTES=budget)
+
+    store = MetadataStore(':memory:')
+    for name in names:
+        path = dirs['mnt_cloud'] / f"{name}.txt"
+        path.write_text(f"content of {name}" * 10)
+        store.insert_new_file(name, str(path), current_tier='Cold')
+    return dirs, store
+
+
+def _recall(store, dirs, name):
+    move = {'id': name, 'from': 'Cold', 'to': 'Warm', 'path': str(dirs['mnt_cloud'] / f"{name}.txt")}
+    assert te.execute_move(move, store)
+
+
+def _demote(store, name):
+    record = store.get_file(name)
+    return te.execute_move({'id': name, 'from': record[2], 'to': 'Cold', 'path': record[1]}, store)
+
+
+def test_recall_keeps_cold_copy_and_clean_demotion_skips_upload(monkeypatch, tier_dirs):
+    dirs, store = _setup(tier_dirs, ['a'])
+    cold_path = dirs['mnt_cloud'] / 'a.txt'
+    _recall(store, dirs, 'a')
+    assert cold_path.exists() and (dirs['mnt_hdd'] / 'a.txt').exists()
+
+    # Any upload attempt would go through shutil.move into the cloud dir
+    def no_upload(*args, **kwargs):
+        raise AssertionError('clean demotion must not upload')
+    monkeypatch.setattr(te.shutil, 'move', no_upload)
+
+    assert _demote(store, 'a')
+    record = store.get_file('a')
+    assert record[1:3] == (str(cold_path), 'Cold')
+    assert not (dirs['mnt_hdd'] / 'a.txt').exists()
+    stats = store.get_cache_stats()
+    assert stats['clean_demotions'] == 1
+    assert stats['upload_bytes_avoided'] == cold_path.stat().st_size
+    assert store.get_cache_entry('a') is None
+    store.close()
+
+
+def test_modified_copy_is_uploaded(tier_dirs):
+    dirs, store = _setup(tier_dirs, ['b'])
+    _recall(store, dirs, 'b')
+    (dirs['mnt_hdd'] / 'b.txt').write_text('changed locally')
+
+    assert _demote(store, 'b')
+    with open(store.get_file('b')[1]) as f:
+        assert f.read() == 'changed locally'
+    assert store.get_cache_stats()['dirty_demotions'] == 1
+    store.close()
+
+
+def test_cached_copy_follows_promotion_to_hot(tier_dirs):
+    dirs, store = _setup(tier_dirs, ['c'])
+    _recall(store, dirs, 'c')
+    assert te.execute_move({'id': 'c', 'from': 'Warm', 'to': 'Hot', 'path': str(dirs['mnt_hdd'] / 'c.txt')}, store)
+    assert store.get_cache_entry('c')[1] == str(dirs['mnt_ssd'] / 'c.txt')
+
+    assert _demote(store, 'c')
+    assert store.get_cache_stats()['clean_demotions'] == 1
+    store.close()
+
+
+def test_lru_eviction_under_byte_budget(monkeypatch, tier_dirs):
+    names = ['d1', 'd2', 'd3']
+    dirs, store = _setup(tier_dirs, names)
+    size = (dirs['mnt_cloud'] / 'd1.txt').stat().st_size
+    monkeypatch.setattr(te, 'WARM_CACHE_BYTES', 2 * size)
+
+    _recall(store, dirs, 'd1')
+    _recall(store, dirs, 'd2')
+    # Reading d1 again makes d2 the least recently used entry
+    assert warm_cache.record_hit(store, 'd1')
+    # The third fill pushes usage over budget and evicts d2
+    _recall(store, dirs, 'd3')
+
+    tiers = {n: store.get_file(n)[2] for n in names}
+    assert tiers == {'d1': 'Warm', 'd2': 'Cold', 'd3': 'Warm'}
+    assert store.get_file('d2')[1] == str(dirs['mnt_cloud'] / 'd2.txt')
+    assert not (dirs['mnt_hdd'] / 'd2.txt').exists()
+    stats = store.get_cache_stats()
+    assert stats['evictions'] == 1 and stats['hits'] == 1 and stats['fills'] == 3
+    assert stats['bytes_evicted'] == size
+    store.close()
@@ -0,0 +1,242 @@
+"""
+Rate control for the mover, so that rebalancing does not starve application
+I/O on the tiers.
+
+Each tier has two token buckets, one for bytes/s and one for moves (ops)/s.
+A move charges its size and one op to both its source and destination tiers,
+and waits for whichever tier is slowest. Buckets may go into debt, so a file
+larger than the burst size still moves; the next caller waits out the debt.
+
+In adaptive mode each tier's limits are scaled by a factor in
+[MIN_FACTOR, 1], adjusted AIMD-style after every move:
+
+- the factor is multiplied by BACKOFF when the move's latency (excluding time
+  spent waiting on the throttle) exceeds `target_latency`, or when the
+  utilization of the tier's block device (/proc/diskstats io_ticks, sampled at
+  most every UTIL_SAMPLE_INTERVAL seconds) exceeds `target_util`;
+- otherwise it recovers by RECOVERY_STEP per move.
+
+A tier without a bytes/s limit gets one on its first back-off: the tier's
+measured transfer rate so far.
+
+Utilization is only available on Linux, for paths on a device listed in
+/proc/diskstats. Elsewhere only the latency signal is used.
+"""
+import os
+import threading
+import time
+
+import metrics
+
+BACKOFF = 0.5
+RECOVERY_STEP = 0.05
+MIN_FACTOR = 0.05
+UTIL_SAMPLE_INTERVAL = 1.0
+DISKSTATS_PATH = '/proc/diskstats'
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens/s, holding at most `burst` tokens (default: one second's worth)."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.clock = clock
+        self.last = clock()
+
+    def reserve(self, amount, factor=1.0):
+        """Takes `amount` tokens and returns the seconds to wait before using them."""
+        rate = self.rate * factor
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * rate)
+        self.last = now
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / rate
+
+
+def _read_io_ticks(path=DISKSTATS_PATH):
+    """{(major, minor): milliseconds spent doing I/O} from /proc/diskstats."""
+    ticks = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 13:
+                ticks[(int(fields[0]), int(fields[1]))] = int(fields[12])
+    return ticks
+
+
+class DiskUtilization:
+    """Fraction of wall time the block device holding `path` was busy, between samples."""
+
+    def __init__(self, path, clock=time.monotonic):
+        self.clock = clock
+        self.device = None
+        self.value = None
+        try:
+            st = os.stat(path)
+            device = (os.major(st.st_dev), os.minor(st.st_dev))
+            ticks = _read_io_ticks()
+        except (OSError, ValueError):
+            return
+        if device in ticks:
+            self.device = device
+            self.last_ticks = ticks[device]
+            self.last = clock()
+
+    def sample(self):
+        """Returns the latest utilization (0-1), re-reading diskstats at most every UTIL_SAMPLE_INTERVAL."""
+        if self.device is None:
+            return None
+        now = self.clock()
+        if now - self.last >= UTIL_SAMPLE_INTERVAL:
+            try:
+                ticks = _read_io_ticks().get(self.device, self.last_ticks)
+            except OSError:
+                return self.value
+            self.value = min(1.0, (ticks - self.last_ticks) / ((now - self.last) * 1000.0))
+            self.last_ticks, self.last = ticks, now
+        return self.value
+
+
+class TierThrottle:
+    """Byte and op buckets for one tier, plus its adaptive factor and counters."""
+
+    def __init__(self, tier, bytes_per_sec=None, ops_per_sec=None, path=None, clock=time.monotonic):
+        self.tier = tier
+        self.clock = clock
+        self.bytes_bucket = TokenBucket(bytes_per_sec, clock=clock) if bytes_per_sec else None
+        self.ops_bucket = TokenBucket(ops_per_sec, clock=clock) if ops_per_sec else None
+        self.util = DiskUtilization(path, clock=clock) if path else None
+        self.factor = 1.0
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.ops = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.waits = 0
+        self.backoffs = 0
+        self.last_util = None
+
+    def reserve(self, nbytes, ops):
+        with self.lock:
+            self.bytes += nbytes
+            self.ops += ops
+            delay = 0.0
+            if self.bytes_bucket and nbytes:
+                delay = max(delay, self.bytes_bucket.reserve(nbytes, self.factor))
+            if self.ops_bucket and ops:
+                delay = max(delay, self.ops_bucket.reserve(ops, self.factor))
+            return delay
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.wait_seconds += seconds
+            self.waits += 1
+
+    def observe(self, latency, target_latency, target_util):
+        with self.lock:
+            self.busy_seconds += latency
+            if self.util is not None:
+                self.last_util = self.util.sample()
+            over = ((target_latency is not None and latency > target_latency) or
+                    (target_util is not None and self.last_util is not None and self.last_util > target_util))
+            if not over:
+                self.factor = min(1.0, self.factor + RECOVERY_STEP)
+                return
+            if self.bytes_bucket is None and self.bytes and self.busy_seconds > 0:
+                self.bytes_bucket = TokenBucket(self.bytes / self.busy_seconds, clock=self.clock)
+            self.factor = max(MIN_FACTOR, self.factor * BACKOFF)
+            self.backoffs += 1
+
+
+class MoverThrottle:
+    """
+    Per-tier rate limits for moves. `limits` maps a tier to
+    {'bytes_per_sec', 'ops_per_sec'}, and `paths` maps a tier to its local
+    directory (used for the diskstats signal). Adaptive mode is enabled by
+    setting `target_latency` (seconds per move) and/or `target_util` (0-1).
+    """
+
+    def __init__(self, limits=None, paths=None, target_latency=None, target_util=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        limits = limits or {}
+        paths = paths or {}
+        self.target_latency = target_latency
+        self.target_util = target_util
+        self.clock = clock
+        self.sleep = sleep
+        self.start = clock()
+        self.tiers = {}
+        for tier in set(limits) | set(paths):
+            cfg = limits.get(tier, {})
+            self.tiers[tier] = TierThrottle(tier, cfg.get('bytes_per_sec'), cfg.get('ops_per_sec'),
+                                            paths.get(tier) if target_util is not None else None, clock=clock)
+
+    def _tier(self, tier):
+        if tier not in self.tiers:
+            self.tiers[tier] = TierThrottle(tier, clock=self.clock)
+        return self.tiers[tier]
+
+    def reserve(self, tiers, nbytes=0, ops=0):
+        """Charges every tier in `tiers` and returns the longest wait. The caller must wait, then call record_wait."""
+        return max((self._tier(tier).reserve(nbytes, ops) for tier in tiers), default=0.0)
+
+    def record_wait(self, tiers, seconds):
+        if seconds > 0:
+            for tier in tiers:
+                self._tier(tier).record_wait(seconds)
+            metrics.inc('throttle_waits_total')
+            metrics.inc('throttle_wait_seconds_total', seconds)
+
+    def acquire(self, tiers, nbytes=0, ops=1):
+        """Blocking reserve for synchronous callers. Returns the seconds slept."""
+        delay = self.reserve(tiers, nbytes, ops)
+        if delay > 0:
+            self.sleep(delay)
+            self.record_wait(tiers, delay)
+        return delay
+
+    def observe(self, tiers, latency):
+        """Records one finished move's latency (excluding throttle waits) against each of its tiers."""
+        for tier in tiers:
+            self._tier(tier).observe(latency, self.target_latency, self.target_util)
+
+    def summary(self):
+        """Per-tier throttle state and effective throughput since the throttle was created."""
+        elapsed = max(self.clock() - self.start, 1e-9)
+        report = {}
+        for name, tier in sorted(self.tiers.items()):
+            with tier.lock:
+                report[name] = {
+                    'bytes': tier.bytes,
+                    'ops': tier.ops,
+                    'bytes_per_sec': tier.bytes / elapsed,
+                    'ops_per_sec': tier.ops / elapsed,
+                    'limit_bytes_per_sec': tier.bytes_bucket.rate * tier.factor if tier.bytes_bucket else None,
+                    'limit_ops_per_sec': tier.ops_bucket.rate * tier.factor if tier.ops_bucket else None,
+                    'factor': tier.factor,
+                    'backoffs': tier.backoffs,
+                    'waits': tier.waits,
+                    'wait_seconds': tier.wait_seconds,
+                    'disk_util': tier.last_util,
+                }
+        return report
+
+
+def format_summary(report):
+    """Human-readable lines for MoverThrottle.summary()."""
+    def limit(value, unit):
+        return 'unlimited' if value is None else f'{value:.1f} {unit}'
+
+    lines = []
+    for tier, info in report.items():
+        bytes_limit = info['limit_bytes_per_sec']
+        bytes_limit = None if bytes_limit is None else bytes_limit / (1 << 20)
+        util = '' if info['disk_util'] is None else f", disk util {info['disk_util']:.0%}"
+        lines.append(
+            f"  {tier}: {info['bytes_per_sec'] / (1 << 20):.2f} MiB/s, {info['ops_per_sec']:.2f} moves/s effective "
+            f"(limits {limit(bytes_limit, 'MiB/s')}, "
+            f"{limit(info['limit_ops_per_sec'], 'moves/s')}; factor {info['factor']:.2f}, "
+            f"{info['backoffs']} back-offs, {info['waits']} waits totalling {info['wait_seconds']:.2f}s{util})")
+    return lines
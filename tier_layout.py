@@ -0,0 +1,79 @@
+"""
+On-disk layout of files inside a tier directory.
+
+The flat layout keeps the historical behaviour: `<tier root>/<basename>`.
+The hashed layout spreads files over a fixed two-level fan-out of
+subdirectories keyed by a hash of the `file_id`, and prefixes the name with the
+(quoted) file_id:
+
+    <tier root>/3f/a2/<file_id>~<basename>
+
+No directory ever holds more than 256 subdirectories, and leaves stay small
+even with tens of millions of files. Because the file_id is part of the name,
+two files with the same basename can never overwrite each other. A file's
+location is computed from its file_id, so `resolve` probes at most two paths
+per tier instead of listing or searching directories.
+
+Existing trees are converted with migrate_layout.py.
+"""
+import hashlib
+import os
+from urllib.parse import quote
+
+FLAT = 'flat'
+HASHED = 'hashed'
+LAYOUTS = (FLAT, HASHED)
+
+FANOUT_LEVELS = 2
+FANOUT_CHARS = 2  # hex characters per level: 256 entries per directory
+SEPARATOR = '~'
+
+
+def _bucket(file_id):
+    digest = hashlib.blake2b(file_id.encode('utf-8'), digest_size=8).hexdigest()
+    return [digest[i * FANOUT_CHARS:(i + 1) * FANOUT_CHARS] for i in range(FANOUT_LEVELS)]
+
+
+def relative_path(file_id, name, layout=FLAT):
+    """Path of `file_id` (original basename `name`) relative to a tier root."""
+    if layout == FLAT:
+        return name
+    if layout != HASHED:
+        raise ValueError(f"Unknown tier layout: {layout}")
+    return os.path.join(*_bucket(file_id), f"{quote(file_id, safe='')}{SEPARATOR}{name}")
+
+
+def path_for(root, file_id, name, layout=FLAT):
+    return os.path.join(root, relative_path(file_id, name, layout))
+
+
+def original_name(path, file_id):
+    """The basename `path` was stored under before the hashed layout prefixed it."""
+    name = os.path.basename(path)
+    prefix = f"{quote(file_id, safe='')}{SEPARATOR}"
+    return name[len(prefix):] if name.startswith(prefix) else name
+
+
+def resolve(file_id, name, roots):
+    """
+    Finds where `file_id` is stored by probing its hashed and flat paths under
+    each of `roots` ([(tier, root)]). Returns (tier, path) or (None, None).
+    """
+    for tier, root in roots:
+        for layout in (HASHED, FLAT):
+            candidate = path_for(root, file_id, name, layout)
+            if os.path.exists(candidate):
+                return tier, candidate
+    return None, None
+
+
+def iter_files(root):
+    """Yields os.DirEntry objects for every file under `root`, one os.scandir per directory."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    yield entry
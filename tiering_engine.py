@@ -2,9 +2,18 @@ import argparse
 import json
 import time
 from metadata_store import MetadataStore
+import coaccess
+import metrics
+import move_selection
+import profiling
+import compression
+import content_hash
+import throttle
+import tier_layout
+import warm_cache
 import os
 import shutil # For local file movement (mv command equivalent)
-import boto3 # For S3 interaction
+import tempfile
 
 # --- Configuration (UPDATE THIS BLOCK) ---
 # Ensure these paths and AWS settings match your setup!
@@ -53,75 +62,377 @@ HOT_TIER_AGGRESSIVE_DEMOTION_COUNT = 5 # How many "coldest" files to move when f
 
 HOT_TIER_IS_FULL = False # Global flag set by capacity check
 
+# Warm-tier read cache for recalled Cold objects (see warm_cache.py)
+WARM_CACHE_ENABLED = True
+WARM_CACHE_BYTES = warm_cache.DEFAULT_BUDGET_BYTES
+
+# Content-addressed, deduplicated Cold tier and parallel hashing of demotions
+DEDUP_ENABLED = True
+HASH_WORKERS = content_hash.DEFAULT_HASH_WORKERS
+
+# Optional compression of Cold copies, codec chosen per file extension (see compression.py)
+COMPRESSION_ENABLED = False
+COMPRESSION_CODECS = compression.CODECS_BY_EXTENSION
+COMPRESSION_DEFAULT_CODEC = compression.DEFAULT_CODEC
+
+# Placement inside the Hot/Warm/local-cloud directories: 'flat' or 'hashed' (see tier_layout.py)
+TIER_LAYOUT = tier_layout.FLAT
+
+# Staged asyncio move pipeline (see move_pipeline.py); options override its per-tier defaults
+PIPELINE_ENABLED = False
+PIPELINE_OPTIONS = {}
+
+# Mover rate control (see throttle.py): {tier: {'bytes_per_sec', 'ops_per_sec'}} plus adaptive targets
+THROTTLE_LIMITS = {}
+THROTTLE_TARGET_LATENCY = None  # seconds per move
+THROTTLE_TARGET_UTIL = None     # block device utilization, 0-1
+MOVE_THROTTLE = None            # throttle.MoverThrottle for the current engine run
+
+# Per-run transfer budgets and tier prices for cost/benefit move selection (see move_selection.py)
+MOVE_BUDGET_BYTES = None
+MOVE_BUDGET_COST = None
+MOVE_SELECTOR = move_selection.GREEDY
+# Deferred moves listed by name after a budget selection
+BUDGET_REPORT_LIMIT = 20
+TIER_PRICES = {}  # {tier: {'egress_per_gib': price, 'request': price}}
+
+# Predictive prefetch (see coaccess.py)
+PREFETCH_MIN_CONFIDENCE = coaccess.DEFAULT_MIN_CONFIDENCE
+PREFETCH_MAX_PEERS = coaccess.DEFAULT_MAX_PEERS
+
 # --- 2. Data Mover Functions ---
 
+def _s3_client():
+    """
+    Creates the S3 client. boto3 is imported here rather than at module level
+    because it is by far the slowest import and only S3-mode moves need it.
+    """
+    import boto3
+    return boto3.client('s3', region_name=AWS_REGION)
+
+def _s3_object_size(s3, location):
+    """Size of a Cold object on S3 from a HEAD request, or None if it cannot be read."""
+    try:
+        return s3.head_object(Bucket=S3_BUCKET_NAME, Key=_s3_key(location))['ContentLength']
+    except Exception as e:
+        print(f"Warning: Could not read the size of {location}: {e}")
+        return None
+
+def _s3_key(path):
+    """Object key for an `s3://bucket/key` path (legacy flat keys are the basename)."""
+    prefix = f"s3://{S3_BUCKET_NAME}/"
+    return path[len(prefix):] if path.startswith(prefix) else os.path.basename(path)
+
+
+def _cold_object_location(content_hash):
+    """Where a deduplicated Cold object with this hash is stored."""
+    if USE_LOCAL_CLOUD:
+        return os.path.join(LOCAL_CLOUD_PATH, 'objects', content_hash[:2], content_hash)
+    return f"s3://{S3_BUCKET_NAME}/objects/{content_hash}"
+
+
+def _tier_path(root, file_id, file_name):
+    """Destination of `file_id` under a local tier root in the configured layout."""
+    path = tier_layout.path_for(root, file_id, file_name, TIER_LAYOUT)
+    if TIER_LAYOUT != tier_layout.FLAT:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _choose_codec(path):
+    if not COMPRESSION_ENABLED:
+        return None
+    return compression.choose_codec(path, COMPRESSION_CODECS, COMPRESSION_DEFAULT_CODEC)
+
+
+def _write_cold(source_path, location, codec):
+    """
+    Moves `source_path` to `location` (a local-cloud path or s3:// URL),
+    compressing it on the way when `codec` is set. Returns (raw_size, stored_size).
+    """
+    if location.startswith('s3://'):
+        s3 = _s3_client()
+        if codec:
+            # upload_file needs a seekable file for multipart uploads, so compress to a temp file first
+            fd, tmp_path = tempfile.mkstemp(suffix=compression.SUFFIXES[codec])
+            os.close(fd)
+            try:
+                with metrics.span('move_compress'):
+                    raw_size, stored_size = compression.compress_file(source_path, tmp_path, codec)
+                with metrics.span('move_upload'):
+                    s3.upload_file(tmp_path, S3_BUCKET_NAME, _s3_key(location))
+            finally:
+                os.remove(tmp_path)
+        else:
+            raw_size = stored_size = os.path.getsize(source_path)
+            with metrics.span('move_upload'):
+                s3.upload_file(source_path, S3_BUCKET_NAME, _s3_key(location))
+        os.remove(source_path)
+    else:
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        if codec:
+            with metrics.span('move_compress'):
+                raw_size, stored_size = compression.compress_file(source_path, location, codec)
+            os.remove(source_path)
+        else:
+            raw_size = stored_size = os.path.getsize(source_path)
+            with metrics.span('move_copy'):
+                shutil.move(source_path, location)
+    return raw_size, stored_size
+
+
+def _restore_cold(cold_path, dest_path, codec):
+    """Copies a local Cold copy to `dest_path`, decompressing if needed. Returns (hex digest, size)."""
+    if codec:
+        with metrics.span('move_decompress'):
+            return compression.decompress_file(cold_path, dest_path, codec)
+    with metrics.span('move_copy'):
+        return content_hash.copy_with_hash(cold_path, dest_path)
+
+
+def _store_cold_object(store, file_id, source_path, content_hash, size, file_name):
+    """
+    Demotes `source_path` into the deduplicated Cold object store. Identical
+    content already stored on Cold only gains a reference and is not
+    uploaded again. Returns the object location.
+    """
+    # Checking for the object and taking the reference is one transaction, so a
+    # concurrent release cannot delete it in between
+    existing = store.acquire_existing_cold_object(content_hash)
+    if existing:
+        location, codec, stored_size = existing[0], existing[3], existing[4]
+        os.remove(source_path)
+        print(f"  [DEDUP] {file_id} matches stored object {content_hash[:12]}; skipping upload.")
+        metrics.inc('dedup_hits_total')
+        metrics.inc('dedup_bytes_avoided_total', size)
+    else:
+        codec = _choose_codec(source_path)
+        location = _cold_object_location(content_hash) + (compression.SUFFIXES[codec] if codec else '')
+        _, stored_size = _write_cold(source_path, location, codec)
+        metrics.inc('cold_upload_bytes_total', stored_size)
+        store.acquire_cold_object(content_hash, location, size, codec, stored_size)
+
+    # A modified cached copy still held a reference on its old Cold object
+    info = store.get_dedup_info(file_id)
+    if info and info[2] and info[2] != content_hash:
+        _release_cold_object(store, info[2])
+    store.set_cold_ref(file_id, content_hash, file_name)
+    store.set_cold_compression(file_id, codec, stored_size, size)
+    return location
+
+
+def _release_cold_object(store, content_hash):
+    """Drops a reference and deletes the stored object once nothing refers to it."""
+    row = store.release_cold_object(content_hash)
+    if row and row[1] <= 0:
+        _delete_cold_path(row[0])
+
+
+def _delete_cold_path(location):
+    if location.startswith('s3://'):
+        _s3_client().delete_object(Bucket=S3_BUCKET_NAME, Key=_s3_key(location))
+    elif os.path.exists(location):
+        os.remove(location)
+
+
 def execute_move(move_detail, store):
     """
     Executes the physical/logical data movement based on the move plan.
+    During an engine run with throttling configured, waits for the source and
+    destination tiers' rate limits first and reports the move's latency back.
     """
+    if MOVE_THROTTLE is None:
+        return _execute_move(move_detail, store)
+    tiers = (move_detail['from'], move_detail['to'])
+    source = move_detail['path']
+    size = os.path.getsize(source) if os.path.isfile(source) else 0
+    MOVE_THROTTLE.acquire(tiers, size)
+    start = time.perf_counter()
+    try:
+        return _execute_move(move_detail, store)
+    finally:
+        MOVE_THROTTLE.observe(tiers, time.perf_counter() - start)
+
+
+def _execute_move(move_detail, store):
     file_id = move_detail['id']
     from_tier = move_detail['from']
     to_tier = move_detail['to']
     source_path = move_detail['path']
-    file_name = os.path.basename(source_path)
+    file_name = tier_layout.original_name(source_path, file_id)
+
+    # Deduplicated Cold objects are stored under their hash; recalls restore the original name
+    cold_hash = None
+    cold_codec = None
+    if from_tier == 'Cold':
+        info = store.get_dedup_info(file_id)
+        if info and info[2]:
+            cold_hash = info[2]
+            file_name = info[3] or file_name
+        stored = store.get_cold_compression(file_id)
+        cold_codec = stored[0] if stored else None
+        # Compressed non-deduplicated copies carry the codec suffix on their name
+        if cold_codec and not cold_hash and file_name.endswith(compression.SUFFIXES[cold_codec]):
+            file_name = file_name[:-len(compression.SUFFIXES[cold_codec])]
     
     print(f"  [MOVING] {file_id}: {from_tier} -> {to_tier}...")
 
     # Determine the destination path/key
     if to_tier == 'Hot':
-        dest_path = os.path.join(HOT_TIER_PATH, file_name)
+        dest_path = _tier_path(HOT_TIER_PATH, file_id, file_name)
     elif to_tier == 'Warm':
-        dest_path = os.path.join(WARM_TIER_PATH, file_name)
+        dest_path = _tier_path(WARM_TIER_PATH, file_id, file_name)
     elif to_tier == 'Cold':
         # Destination is S3, path is the S3 key
-        dest_key = file_name 
+        dest_key = tier_layout.relative_path(file_id, file_name, TIER_LAYOUT).replace(os.sep, '/')
 
+    # Only stat the source when metrics are on; recalls from S3 have no local source
+    size_bytes = 0
+    if metrics.is_enabled() and os.path.exists(source_path):
+        size_bytes = os.path.getsize(source_path)
+
+    cache_filled = False
     try:
         if to_tier in ['Hot', 'Warm'] and from_tier in ['Hot', 'Warm']:
             # Local-to-Local Move (SSD <-> HDD)
-            shutil.move(source_path, dest_path)
+            with metrics.span('move_copy'):
+                shutil.move(source_path, dest_path)
             new_path = dest_path
+            # A cached copy keeps its cache entry when it moves between local tiers
+            if WARM_CACHE_ENABLED and store.get_cache_entry(file_id):
+                store.update_cache_entry(file_id, cached_path=dest_path)
             
         elif to_tier == 'Cold':
             # Local -> Cold (S3 or Local Cloud)
-            if USE_LOCAL_CLOUD:
-                # Ensure local cloud dir exists
-                os.makedirs(LOCAL_CLOUD_PATH, exist_ok=True)
-                cloud_dest = os.path.join(LOCAL_CLOUD_PATH, file_name)
-                shutil.move(source_path, cloud_dest)
-                new_path = cloud_dest
-            else:
-                # Upload to S3
-                s3 = boto3.client('s3', region_name=AWS_REGION)
-                s3.upload_file(source_path, S3_BUCKET_NAME, dest_key)
+            cache_entry = store.get_cache_entry(file_id) if WARM_CACHE_ENABLED else None
+            cached_cold_path = warm_cache.clean_demotion_target(store, file_id, source_path) if cache_entry else None
+            # Cold copy a modified cached file was recalled from; a flat (pre-dedup) copy is replaced below
+            prior = store.get_dedup_info(file_id) if cache_entry else None
+            stale_flat_copy = cache_entry[0] if cache_entry and not (prior and prior[2]) else None
+            if cached_cold_path:
+                # Unmodified cached copy of a Cold object: metadata-only demotion, no upload
                 os.remove(source_path)
-                new_path = f"s3://{S3_BUCKET_NAME}/{dest_key}" # Update path to S3 URL
+                store.delete_cache_entry(file_id)
+                new_path = cached_cold_path
+                print(f"  [CACHE] {file_id} unchanged since recall; reusing Cold copy without upload.")
+            elif DEDUP_ENABLED:
+                # Hash is normally precomputed in parallel for the whole plan (see _prehash_moves)
+                content_digest, size = move_detail.get('content_hash'), move_detail.get('size')
+                if not content_digest:
+                    with metrics.span('move_hash'):
+                        content_digest, size = content_hash.hash_file(source_path)
+                new_path = _store_cold_object(store, file_id, source_path, content_digest, size, file_name)
+            else:
+                codec = _choose_codec(source_path)
+                suffix = compression.SUFFIXES[codec] if codec else ''
+                if USE_LOCAL_CLOUD:
+                    new_path = _tier_path(LOCAL_CLOUD_PATH, file_id, file_name + suffix)
+                else:
+                    # Upload to S3; the path becomes the S3 URL
+                    new_path = f"s3://{S3_BUCKET_NAME}/{dest_key}{suffix}"
+                raw_size, stored_size = _write_cold(source_path, new_path, codec)
+                store.set_cold_compression(file_id, codec, stored_size, raw_size)
             
+            if stale_flat_copy and not cached_cold_path and stale_flat_copy != new_path:
+                _delete_cold_path(stale_flat_copy)
+
         elif from_tier == 'Cold':
             # Cold -> Local (Retrieval)
             if USE_LOCAL_CLOUD:
-                cloud_source = os.path.join(LOCAL_CLOUD_PATH, file_name)
-                shutil.move(cloud_source, dest_path)
+                # Cold copies live at their recorded path; records that predate local-cloud
+                # paths are resolved from the file_id instead
+                cloud_source = source_path
+                if not (cold_hash or cold_codec or os.path.exists(source_path)):
+                    _, cloud_source = tier_layout.resolve(file_id, file_name, [('Cold', LOCAL_CLOUD_PATH)])
+                    cloud_source = cloud_source or source_path
+                if WARM_CACHE_ENABLED:
+                    # Keep the Cold copy authoritative; the local file is a cached copy
+                    digest, _ = _restore_cold(cloud_source, dest_path, cold_codec)
+                    warm_cache.fill(store, file_id, cloud_source, dest_path, digest)
+                    cache_filled = True
+                elif cold_hash:
+                    # Other files may share the object: copy out, then drop this file's reference
+                    _restore_cold(cloud_source, dest_path, cold_codec)
+                    _release_cold_object(store, cold_hash)
+                    store.set_cold_ref(file_id, None)
+                elif cold_codec:
+                    _restore_cold(cloud_source, dest_path, cold_codec)
+                    os.remove(cloud_source)
+                else:
+                    with metrics.span('move_copy'):
+                        shutil.move(cloud_source, dest_path)
                 new_path = dest_path
             else:
-                s3 = boto3.client('s3', region_name=AWS_REGION)
-                dest_key = file_name
-                s3.download_file(S3_BUCKET_NAME, dest_key, dest_path)
+                s3 = _s3_client()
+                dest_key = _s3_key(source_path)
+                download_path = dest_path + '.part' if cold_codec else dest_path
+                with metrics.span('move_download'):
+                    s3.download_file(S3_BUCKET_NAME, dest_key, download_path)
+                digest = None
+                if cold_codec:
+                    try:
+                        digest, _ = _restore_cold(download_path, dest_path, cold_codec)
+                    finally:
+                        os.remove(download_path)
+                # S3 downloads never delete the object, so the local file is always a cached copy
+                if WARM_CACHE_ENABLED:
+                    warm_cache.fill(store, file_id, f"s3://{S3_BUCKET_NAME}/{dest_key}", dest_path, digest)
+                    cache_filled = True
+                elif cold_hash:
+                    _release_cold_object(store, cold_hash)
+                    store.set_cold_ref(file_id, None)
                 new_path = dest_path 
+            # Without the cache the Cold copy is gone (or no longer this file's), so forget its codec
+            if cold_codec and not WARM_CACHE_ENABLED:
+                store.set_cold_compression(file_id, None, None)
 
         # --- UPDATE DATABASE (Critical Step) ---
-        if store.update_file_location(file_id, new_path, to_tier):
+        with metrics.span('move_db_update'):
+            updated = store.update_file_location(file_id, new_path, to_tier)
+        if updated:
             print(f"  [SUCCESS] Updated DB. New Location: {new_path}")
+            if move_detail.get('prefetch_for'):
+                store.record_prefetch(file_id, move_detail['prefetch_for'])
+                metrics.inc('prefetch_moves_total')
+            metrics.inc('moves_total')
+            metrics.inc(f"moves_{from_tier.lower()}_to_{to_tier.lower()}_total")
+            metrics.inc('bytes_moved_total', size_bytes)
+            if cache_filled:
+                warm_cache.evict_to_budget(store, WARM_CACHE_BYTES)
             return True
         else:
             print(f"  [ERROR] Move success, but DB update failed for {file_id}.")
+            metrics.inc('moves_failed_total')
             return False
 
     except Exception as e:
         print(f"  [FATAL MOVE ERROR] {from_tier} -> {to_tier} failed for {file_id}: {e}")
+        metrics.inc('moves_failed_total')
         return False
 
 
+def _prehash_moves(plan, store):
+    """
+    Hashes the local sources of all demotions to Cold in parallel before the
+    moves run, attaching `content_hash`/`size` to each move and storing the
+    hashes in the catalog. Cached copies are skipped; their hash is already known.
+    """
+    demotions = [m for m in plan if m['to'] == 'Cold' and m['from'] != 'Cold'
+                 and not (WARM_CACHE_ENABLED and store.get_cache_entry(m['id']))]
+    if not demotions:
+        return
+    with metrics.span('engine_prehash'):
+        hashes = content_hash.hash_files_parallel([m['path'] for m in demotions], max_workers=HASH_WORKERS)
+    rows = []
+    for move in demotions:
+        result = hashes.get(move['path'])
+        if result:
+            move['content_hash'], move['size'] = result
+            rows.append((move['id'], result[0], result[1]))
+    store.set_content_hashes_many(rows)
+    print(f"INFO: Hashed {len(rows)} files for Cold-tier deduplication.")
+
+
 def generate_move_plan(store=None):
     """
     Applies tiering rules to all files in the database and generates a move plan.
@@ -131,15 +442,21 @@ def generate_move_plan(store=None):
     if store is None:
         store = MetadataStore()
         created_store = True
+    current_time = time.time()
     all_files = store.get_all_files()
-    if created_store:
-        store.close()
+    # Sliding 7-day access counts from the hourly windows. Only Warm files can be
+    # promoted on their count, so only their windows are read. Files without a
+    # window fall back to the stored access_count_last_7_days column.
+    warm_ids = [f[0] for f in all_files if f[2] == 'Warm']
+    window_counts = store.get_access_counts(now=current_time, file_ids=warm_ids)
+    # Prefetched files stay on Warm until their hit horizon passes, instead of
+    # being demoted straight back on their old last-access time.
+    prefetched = store.get_active_prefetches(coaccess.PREFETCH_HIT_HORIZON_SECONDS, now=current_time)
     
     # Map column indices from your MetadataStore.get_all_files() query
     # Columns: file_id (0), current_path (1), current_tier (2), last_accessed_timestamp (3), access_count_last_7_days (4), access_pattern_score (5), created_timestamp (6)
     
     move_plan = []
-    current_time = time.time()
     
     print(f"--- 1. Applying Tiering Logic to {len(all_files)} Files ---")
 
@@ -155,6 +472,9 @@ def generate_move_plan(store=None):
             print(f"Warning: unexpected DB row shape for record: {file_record}")
             continue
         
+        access_count = window_counts.get(file_id, access_count or 0)
+        tier_at_start = current_tier
+
         # Calculate time difference in seconds
         time_since_last_access = current_time - last_access if last_access else float('inf')
         
@@ -181,7 +501,8 @@ def generate_move_plan(store=None):
                 current_tier = "Warm" # Tentatively update tier for the next check
 
         if current_tier == "Warm":
-            if time_since_last_access > DEMOTE_WARM_TO_COLD_DAYS and (pattern_score < WARM_TO_COLD_PATTERN_BLOCK):
+            if (time_since_last_access > DEMOTE_WARM_TO_COLD_DAYS and (pattern_score < WARM_TO_COLD_PATTERN_BLOCK)
+                    and file_id not in prefetched):
                 # If a Hot->Warm move was already planned, overwrite it with a direct Hot->Cold move.
                 existing_move = next((m for m in move_plan if m['id'] == file_id), None)
                 if existing_move:
@@ -196,19 +517,20 @@ def generate_move_plan(store=None):
                         'reason': f"Unused for > {DEMOTE_WARM_TO_COLD_DAYS / DAYS:.0f} days (low pattern score: {pattern_score:.2f})."
                     })
 
-        # --- PROMOTION LOGIC (Moving Up) ---
-        # This part remains separate as a file can't be demoted and promoted in the same run.
-        elif current_tier == "Warm" and (access_count > PROMOTE_WARM_TO_HOT_COUNT or pattern_score > PROMOTE_PATTERN_THRESHOLD):
-            # Rule: Warm -> Hot (if accessed frequently or pattern indicates hotness)
-            move_plan.append({
-                'id': file_id,
-                'from': 'Warm',
-                'to': 'Hot',
-                'path': current_path,
-                'reason': f"Access count is {access_count} or pattern score {pattern_score:.2f} exceeds promotion thresholds."
-            })
+            # --- PROMOTION LOGIC (Moving Up) ---
+            # A file can't be demoted and promoted in the same run, and a file that was
+            # only tentatively moved Hot->Warm above is never promoted straight back.
+            elif tier_at_start == "Warm" and (access_count > PROMOTE_WARM_TO_HOT_COUNT or pattern_score > PROMOTE_PATTERN_THRESHOLD):
+                # Rule: Warm -> Hot (if accessed frequently in the last 7 days or pattern indicates hotness)
+                move_plan.append({
+                    'id': file_id,
+                    'from': 'Warm',
+                    'to': 'Hot',
+                    'path': current_path,
+                    'reason': f"7-day access count is {access_count} or pattern score {pattern_score:.2f} exceeds promotion thresholds."
+                })
             
-        elif current_tier == "Cold" and time_since_last_access < PROMOTE_COLD_TO_WARM_DAYS:
+        elif current_tier == "Cold" and time_since_last_access < PROMOTE_COLD_TO_WARM_DAYS * DAYS:
             # Rule: Cold -> Warm (if retrieved from archive/accessed recently)
             move_plan.append({
                 'id': file_id,
@@ -244,11 +566,80 @@ def generate_move_plan(store=None):
                     'from': 'Hot',
                     'to': 'Warm',
                     'path': current_path,
+                    'forced': True,  # never deferred by the move budget
                     'reason': f"Forced demotion due to Hot tier capacity pressure (score: {pattern_score:.2f})."
                 })
 
+    # --- Predictive Prefetch ---
+    # Cold peers that are usually read together with a recalled file are queued
+    # as prefetch moves at the end of the plan.
+    recalls = [m for m in move_plan if m['from'] == 'Cold' and m['to'] == 'Warm']
+    if recalls and PREFETCH_MAX_PEERS > 0:
+        file_rows = {f[0]: f for f in all_files}
+        prefetch = coaccess.prefetch_moves(
+            store, recalls, file_rows, {m['id'] for m in move_plan},
+            min_confidence=PREFETCH_MIN_CONFIDENCE, max_peers=PREFETCH_MAX_PEERS)
+        if prefetch:
+            print(f"INFO: Queuing {len(prefetch)} prefetch moves for co-accessed Cold files.")
+            move_plan.extend(prefetch)
+
+    # --- Cost/Benefit Selection ---
+    # Under a byte or cost budget, keep the moves with the best benefit per unit of budget.
+    if move_plan and (MOVE_BUDGET_BYTES or MOVE_BUDGET_COST):
+        move_plan = _apply_budget(move_plan, store, all_files, current_time)
+
+    if created_store:
+        store.close()
+
     return move_plan
 
+def _apply_budget(move_plan, store, all_files, current_time):
+    ids = [m['id'] for m in move_plan]
+    sizes = store.get_sizes(ids)
+    window_counts = store.get_access_counts(now=current_time, file_ids=ids)
+    s3 = None
+    for move in move_plan:
+        # Sizes are recorded when files are hashed or stored on Cold. The rest are stat'ed if
+        # local, or looked up with a HEAD request on S3 and recorded for later runs (legacy
+        # Cold rows never had a size). Moves whose size is still unknown are deferred.
+        if move['id'] in sizes:
+            continue
+        if os.path.isfile(move['path']):
+            sizes[move['id']] = os.path.getsize(move['path'])
+        elif move['path'].startswith('s3://'):
+            s3 = s3 or _s3_client()
+            size = _s3_object_size(s3, move['path'])
+            if size is not None:
+                sizes[move['id']] = size
+                store.set_cold_compression(move['id'], None, size, size)
+    planned = set(ids)
+    scores, counts = {}, {}
+    for row in all_files:
+        if row[0] in planned:
+            scores[row[0]] = row[5] if len(row) == 7 else 0.0
+            counts[row[0]] = window_counts.get(row[0], row[4] or 0)
+
+    selected, summary = move_selection.select(
+        move_plan, sizes, scores, counts, TIER_PRICES, MOVE_BUDGET_BYTES, MOVE_BUDGET_COST,
+        method=MOVE_SELECTOR, count_scale=PROMOTE_WARM_TO_HOT_COUNT)
+    share = summary['benefit'] / summary['total_benefit'] if summary['total_benefit'] else 1.0
+    if summary['method'] != MOVE_SELECTOR:
+        print(f"Warning: move_selector '{MOVE_SELECTOR}' needs numpy and at most "
+              f"{move_selection.OPTIMAL_MAX_ITEMS} budgeted moves; used '{summary['method']}' instead.")
+    print(f"INFO: Budget selection ({summary['method']}) kept {summary['selected']} of {summary['candidates']} moves: "
+          f"{summary['bytes']} bytes (budget {MOVE_BUDGET_BYTES or 'none'}), "
+          f"cost {summary['cost']:.4f} (budget {MOVE_BUDGET_COST or 'none'}), {share:.0%} of the total benefit; "
+          f"{summary['deferred']} deferred to a later run ({summary['unknown_size']} of unknown size).")
+    unsized = [file_id for file_id, reason in summary['deferred_moves'] if reason == 'unknown size']
+    if unsized:
+        # These are never scheduled while a budget is set, until their size becomes known
+        print(f"Warning: {len(unsized)} moves have no known size and are not run under a budget: "
+              f"{', '.join(unsized[:BUDGET_REPORT_LIMIT])}{' ...' if len(unsized) > BUDGET_REPORT_LIMIT else ''}")
+    for file_id, reason in summary['deferred_moves'][:BUDGET_REPORT_LIMIT]:
+        print(f"  [DEFERRED] {file_id}: {reason}")
+    return selected
+
+
 def check_and_adjust_for_capacity():
     """
     Checks Hot tier capacity and sets a global flag if it's nearly full.
@@ -272,13 +663,24 @@ def check_and_adjust_for_capacity():
     except Exception as e:
         print(f"WARNING: An error occurred during capacity check: {e}")
 
-def main(dry_run=False, show_scores=False, use_local_cloud=None, config_path=None):
+def load_config(config_path=None, use_local_cloud=None):
+    """
+    Applies config.json overrides to the module-level tiering settings.
+    Shared by the engine CLI and the recall service.
+    """
     global USE_LOCAL_CLOUD
     global DEMOTE_HOT_TO_WARM_DAYS, DEMOTE_WARM_TO_COLD_DAYS
     global PROMOTE_WARM_TO_HOT_COUNT, PROMOTE_COLD_TO_WARM_DAYS
     global PATTERN_PROTECT_THRESHOLD, WARM_TO_COLD_PATTERN_BLOCK, PROMOTE_PATTERN_THRESHOLD
-    if use_local_cloud is not None:
-        USE_LOCAL_CLOUD = use_local_cloud
+    global PREFETCH_MIN_CONFIDENCE, PREFETCH_MAX_PEERS
+    global LOCAL_CLOUD_PATH
+    global WARM_CACHE_ENABLED, WARM_CACHE_BYTES
+    global DEDUP_ENABLED, HASH_WORKERS
+    global COMPRESSION_ENABLED, COMPRESSION_CODECS, COMPRESSION_DEFAULT_CODEC
+    global TIER_LAYOUT
+    global PIPELINE_ENABLED
+    global THROTTLE_TARGET_LATENCY, THROTTLE_TARGET_UTIL
+    global MOVE_BUDGET_BYTES, MOVE_BUDGET_COST, MOVE_SELECTOR
 
     # Load config file if present; config_path param overrides default
     cfg_path = config_path if config_path else CONFIG_PATH_DEFAULT
@@ -302,6 +704,56 @@ def main(dry_run=False, show_scores=False, use_local_cloud=None, config_path=Non
                 WARM_TO_COLD_PATTERN_BLOCK = float(cfg['warm_to_cold_pattern_block'])
             if 'promote_pattern_threshold' in cfg:
                 PROMOTE_PATTERN_THRESHOLD = float(cfg['promote_pattern_threshold'])
+            if 'prefetch_min_confidence' in cfg:
+                PREFETCH_MIN_CONFIDENCE = float(cfg['prefetch_min_confidence'])
+            if 'prefetch_max_peers' in cfg:
+                PREFETCH_MAX_PEERS = int(cfg['prefetch_max_peers'])
+            if 'warm_cache_enabled' in cfg:
+                WARM_CACHE_ENABLED = bool(cfg['warm_cache_enabled'])
+            if 'warm_cache_bytes' in cfg:
+                WARM_CACHE_BYTES = int(cfg['warm_cache_bytes'])
+            if 'dedup_enabled' in cfg:
+                DEDUP_ENABLED = bool(cfg['dedup_enabled'])
+            if 'hash_workers' in cfg:
+                HASH_WORKERS = int(cfg['hash_workers'])
+            if 'compression_enabled' in cfg:
+                COMPRESSION_ENABLED = bool(cfg['compression_enabled'])
+            if 'compression_codecs' in cfg:
+                COMPRESSION_CODECS = {ext.lower(): codec for ext, codec in cfg['compression_codecs'].items()}
+            if 'compression_default_codec' in cfg:
+                COMPRESSION_DEFAULT_CODEC = cfg['compression_default_codec']
+            if 'tier_layout' in cfg:
+                if cfg['tier_layout'] not in tier_layout.LAYOUTS:
+                    raise ValueError(f"tier_layout must be one of {tier_layout.LAYOUTS}")
+                TIER_LAYOUT = cfg['tier_layout']
+            if 'pipeline_enabled' in cfg:
+                PIPELINE_ENABLED = bool(cfg['pipeline_enabled'])
+            if 'pipeline_tier_workers' in cfg:
+                PIPELINE_OPTIONS['tier_workers'] = {tier: int(n) for tier, n in cfg['pipeline_tier_workers'].items()}
+            if 'pipeline_queue_depth' in cfg:
+                PIPELINE_OPTIONS['queue_depth'] = int(cfg['pipeline_queue_depth'])
+            if 'pipeline_commit_batch' in cfg:
+                PIPELINE_OPTIONS['commit_batch'] = int(cfg['pipeline_commit_batch'])
+            if 'pipeline_fallback_workers' in cfg:
+                PIPELINE_OPTIONS['fallback_workers'] = int(cfg['pipeline_fallback_workers'])
+            if 'throttle_limits' in cfg:
+                THROTTLE_LIMITS.update({tier: {k: float(v) for k, v in limits.items()}
+                                        for tier, limits in cfg['throttle_limits'].items()})
+            if 'throttle_target_latency_seconds' in cfg:
+                THROTTLE_TARGET_LATENCY = float(cfg['throttle_target_latency_seconds'])
+            if 'throttle_target_disk_util' in cfg:
+                THROTTLE_TARGET_UTIL = float(cfg['throttle_target_disk_util'])
+            if 'move_budget_bytes' in cfg:
+                MOVE_BUDGET_BYTES = int(cfg['move_budget_bytes']) if cfg['move_budget_bytes'] else None
+            if 'move_budget_cost' in cfg:
+                MOVE_BUDGET_COST = float(cfg['move_budget_cost']) if cfg['move_budget_cost'] else None
+            if 'move_selector' in cfg:
+                if cfg['move_selector'] not in move_selection.SELECTORS:
+                    raise ValueError(f"move_selector must be one of {move_selection.SELECTORS}")
+                MOVE_SELECTOR = cfg['move_selector']
+            if 'tier_prices' in cfg:
+                TIER_PRICES.update({tier: {k: float(v) for k, v in prices.items()}
+                                    for tier, prices in cfg['tier_prices'].items()})
             if 'use_local_cloud' in cfg:
                 USE_LOCAL_CLOUD = bool(cfg['use_local_cloud'])
             if 'local_cloud_path' in cfg:
@@ -310,11 +762,48 @@ def main(dry_run=False, show_scores=False, use_local_cloud=None, config_path=Non
         except Exception as e:
             print(f"Warning: failed to read config.json: {e}. Using defaults.")
 
+    # An explicit CLI/caller override wins over the config file
+    if use_local_cloud is not None:
+        USE_LOCAL_CLOUD = use_local_cloud
+
+
+def _run_pipeline(plan, store):
+    """Executes `plan` through the staged move pipeline, which opens its own store on its DB thread."""
+    import move_pipeline  # imported lazily: asyncio is only needed when the pipeline runs
+    with profiling.phase('execute'), metrics.span('engine_pipeline'):
+        stats = move_pipeline.execute_plan(plan, lambda: MetadataStore(store.db_name),
+                                           throttle=MOVE_THROTTLE, **PIPELINE_OPTIONS)
+    mib_per_s = stats['bytes'] / stats['seconds'] / (1 << 20) if stats['seconds'] else 0.0
+    print(f"Pipeline: {stats['moved']} moved, {stats['failed']} failed "
+          f"({stats['pipelined']} pipelined, {stats['fallback']} via execute_move); "
+          f"{stats['bytes']} bytes in {stats['seconds']:.2f}s ({mib_per_s:.1f} MiB/s), "
+          f"{stats['commit_batches']} DB commits.")
+
+
+def _make_throttle():
+    """MoverThrottle for this run, or None when no limits or adaptive targets are configured."""
+    if not (THROTTLE_LIMITS or THROTTLE_TARGET_LATENCY is not None or THROTTLE_TARGET_UTIL is not None):
+        return None
+    paths = {'Hot': HOT_TIER_PATH, 'Warm': WARM_TIER_PATH, 'Cold': LOCAL_CLOUD_PATH if USE_LOCAL_CLOUD else None}
+    return throttle.MoverThrottle(THROTTLE_LIMITS, paths, THROTTLE_TARGET_LATENCY, THROTTLE_TARGET_UTIL)
+
+
+def main(dry_run=False, show_scores=False, use_local_cloud=None, config_path=None, pipeline=None):
+    global PIPELINE_ENABLED, MOVE_THROTTLE
+    load_config(config_path, use_local_cloud)
+    if pipeline is not None:
+        PIPELINE_ENABLED = pipeline
+    compression.reset_totals()
+    MOVE_THROTTLE = None if dry_run else _make_throttle()
+
     # Check tier capacity and adjust rules before generating the plan
-    check_and_adjust_for_capacity()
+    with profiling.phase('capacity'), metrics.span('engine_capacity_check'):
+        check_and_adjust_for_capacity()
 
     store = MetadataStore()
-    plan = generate_move_plan()
+    with profiling.phase('plan'), metrics.span('engine_plan'):
+        plan = generate_move_plan(store=store)
+    metrics.inc('planned_moves_total', len(plan))
 
     print("\n--- 2. MOVE PLAN GENERATED ---")
 
@@ -326,14 +815,55 @@ def main(dry_run=False, show_scores=False, use_local_cloud=None, config_path=Non
     if plan:
         print(f"Total Moves Recommended: {len(plan)}\n")
 
-        for move in plan:
-            print(f"- Plan: {move['id']} {move['from']} -> {move['to']} because {move.get('reason')}")
+        # Access capture (access_ingest.py) ignores reads of these paths while the mover runs
+        sources = [m['path'] for m in plan]
+        if not dry_run:
+            store.begin_mover_activity(sources)
+        try:
+            if not dry_run and DEDUP_ENABLED:
+                _prehash_moves(plan, store)
+
+            for move in plan:
+                print(f"- Plan: {move['id']} {move['from']} -> {move['to']} because {move.get('reason')}")
+                if not dry_run and not PIPELINE_ENABLED:
+                    with profiling.phase('execute'), metrics.span('move_total'):
+                        execute_move(move, store)
+
+            if not dry_run and PIPELINE_ENABLED:
+                _run_pipeline(plan, store)
+        finally:
             if not dry_run:
-                execute_move(move, store)
+                store.end_mover_activity(sources)
 
     else:
         print("No moves are currently recommended based on the tiering rules.")
 
+    if MOVE_THROTTLE is not None:
+        mode = 'adaptive' if THROTTLE_TARGET_LATENCY is not None or THROTTLE_TARGET_UTIL is not None else 'fixed'
+        print(f"Mover throttle ({mode}):")
+        for line in throttle.format_summary(MOVE_THROTTLE.summary()):
+            print(line)
+        MOVE_THROTTLE = None
+
+    if DEDUP_ENABLED:
+        objects, stored_bytes, refs, logical_bytes = store.get_dedup_stats()
+        if objects:
+            print(f"Cold tier: {refs} files stored as {objects} unique objects "
+                  f"({stored_bytes} bytes stored for {logical_bytes} bytes of file data).")
+
+    if COMPRESSION_ENABLED:
+        totals = compression.totals()
+        if totals['files_compressed'] or totals['files_skipped']:
+            print(f"Compression: {totals['files_compressed']} files compressed "
+                  f"({totals['raw_bytes']} -> {totals['stored_bytes']} bytes, {totals['bytes_saved']} saved) "
+                  f"using {totals['compress_cpu_seconds']:.2f}s CPU; "
+                  f"{totals['files_skipped']} incompressible files stored raw.")
+        if totals['decompress_cpu_seconds']:
+            print(f"Decompression on recall used {totals['decompress_cpu_seconds']:.2f}s CPU.")
+        files, raw_bytes, stored_bytes = store.get_compression_stats()
+        if files:
+            print(f"Cold tier: {files} compressed files hold {raw_bytes} bytes in {stored_bytes} bytes.")
+
     store.close()
     print("\nTiering Engine execution complete.")
 
@@ -344,6 +874,9 @@ def cli():
     parser.add_argument('--show-scores', action='store_true', help='Show access pattern scores for all files')
     parser.add_argument('--use-local-cloud', type=str, choices=['true','false'], help='Override local cloud usage')
     parser.add_argument('--config', type=str, help='Path to config.json to override defaults')
+    parser.add_argument('--metrics-out', type=str, help='Write timing metrics to this file (.json for JSON, otherwise Prometheus text)')
+    parser.add_argument('--pipeline', action='store_true', help='Execute moves through the staged asyncio pipeline')
+    profiling.add_arguments(parser)
     args = parser.parse_args()
 
     use_local = None
@@ -352,7 +885,15 @@ def cli():
 
     cfg_path = args.config if args.config else None
 
-    main(dry_run=args.dry_run, show_scores=args.show_scores, use_local_cloud=use_local, config_path=cfg_path)
+    if args.metrics_out:
+        metrics.enable()
+
+    with profiling.session(args, 'tiering_engine'):
+        main(dry_run=args.dry_run, show_scores=args.show_scores, use_local_cloud=use_local, config_path=cfg_path,
+             pipeline=True if args.pipeline else None)
+
+    if args.metrics_out:
+        metrics.write(args.metrics_out)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,119 @@
+"""
+Warm-tier read cache for recalled Cold objects.
+
+With the cache enabled, a Cold->Warm recall copies the object instead of
+moving it. The Cold copy stays authoritative, and the Warm file is a cached
+copy tracked in MetadataStore's `warm_cache` table with its content hash,
+size and mtime. Later:
+
+- demoting an unmodified cached file (Warm/Hot -> Cold) only updates
+  metadata: the local copy is deleted and the file points back at its Cold
+  copy, with no re-upload;
+- when cached bytes on the Warm tier exceed the budget, the least recently
+  used clean entries are evicted the same way.
+
+Cache counters (fills, hits, clean/dirty demotions, evictions, bytes) are kept
+in the `cache_stats` table so that they survive across runs.
+"""
+import os
+import time
+
+import metrics
+from content_hash import hash_file
+
+DEFAULT_BUDGET_BYTES = 10 * 1024 ** 3
+# LRU entries fetched per eviction query
+EVICTION_BATCH = 64
+
+
+def fill(store, file_id, cold_path, cached_path, content_hash=None):
+    """Registers `cached_path` as a clean local copy of the Cold object at `cold_path`."""
+    if content_hash is None:
+        content_hash, _ = hash_file(cached_path)
+    st = os.stat(cached_path)
+    store.put_cache_entry(file_id, cold_path, cached_path, content_hash, st.st_size, st.st_mtime_ns)
+    store.bump_cache_stat('fills')
+    metrics.inc('cache_fills_total')
+
+
+def record_hit(store, file_id):
+    """Marks a read served from the cached copy. Returns False if `file_id` is not cached."""
+    if store.get_cache_entry(file_id) is None:
+        return False
+    store.update_cache_entry(file_id, accessed_at=time.time(), hit=True)
+    store.bump_cache_stat('hits')
+    metrics.inc('cache_hits_total')
+    return True
+
+
+def _cold_copy_exists(cold_path):
+    # S3 objects are never deleted by a recall; local-cloud copies can be checked
+    return cold_path.startswith('s3://') or os.path.exists(cold_path)
+
+
+def _is_clean(entry, local_path):
+    """True if `local_path` still holds the cached content and the Cold copy exists."""
+    cold_path, _, content_hash, size, mtime_ns = entry[:5]
+    if not _cold_copy_exists(cold_path):
+        return False
+    try:
+        st = os.stat(local_path)
+    except OSError:
+        return False
+    if st.st_size != size:
+        return False
+    if st.st_mtime_ns == mtime_ns:
+        return True
+    # Touched but possibly identical: fall back to comparing content
+    return hash_file(local_path)[0] == content_hash
+
+
+def clean_demotion_target(store, file_id, local_path):
+    """
+    Returns the Cold path to point `file_id` at if its local copy is an
+    unmodified cached copy (so demotion needs no upload), otherwise None.
+    A modified copy drops its cache entry so the normal upload path runs.
+    """
+    entry = store.get_cache_entry(file_id)
+    if entry is None:
+        return None
+    if _is_clean(entry, local_path):
+        store.bump_cache_stat('clean_demotions')
+        store.bump_cache_stat('upload_bytes_avoided', entry[3])
+        metrics.inc('cache_clean_demotions_total')
+        metrics.inc('upload_bytes_avoided_total', entry[3])
+        return entry[0]
+    store.delete_cache_entry(file_id)
+    store.bump_cache_stat('dirty_demotions')
+    return None
+
+
+def evict_to_budget(store, budget_bytes):
+    """
+    Evicts least recently used clean cached copies on the Warm tier until the
+    cached bytes fit in `budget_bytes`. Evicted files point back at their
+    Cold copy. Returns the number of evicted files.
+    """
+    usage = store.get_cache_usage()
+    evicted = 0
+    while usage > budget_bytes:
+        victims = store.get_cache_lru(EVICTION_BATCH)
+        if not victims:
+            break
+        for file_id, cold_path, cached_path, size in victims:
+            if usage <= budget_bytes:
+                break
+            entry = store.get_cache_entry(file_id)
+            if entry is not None and _is_clean(entry, cached_path):
+                os.remove(cached_path)
+                store.update_file_location(file_id, cold_path, 'Cold')
+                store.bump_cache_stat('evictions')
+                store.bump_cache_stat('bytes_evicted', size)
+                metrics.inc('cache_evictions_total')
+                evicted += 1
+                print(f"  [CACHE EVICT] {file_id}: dropped local copy, now served from {cold_path}")
+            # Either evicted or modified locally (then it is no longer a cache
+            # copy and leaves the cache to be demoted normally)
+            store.delete_cache_entry(file_id)
+            usage -= size
+    return evicted